@@ -0,0 +1,17 @@
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def isolated_caches(tmp_path_factory):
+    # Keep the cache files of the site out of the tests and render static
+    # URLs without collectstatic, see core.runner.
+    from django.test.utils import override_settings
+
+    from core.runner import TEST_STATICFILES_STORAGE, get_isolated_caches
+    cache_settings = override_settings(
+        CACHES=get_isolated_caches(str(tmp_path_factory.mktemp('cache'))),
+        STATICFILES_STORAGE=TEST_STATICFILES_STORAGE,
+    )
+    cache_settings.enable()
+    yield
+    cache_settings.disable()
@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def eager_tasks():
+    # Tests never commit, so tasks queued on commit would never run; see
+    # core.runner.
+    from django.conf import settings
+    settings.TASKS_EAGER = True
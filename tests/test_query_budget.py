@@ -0,0 +1,46 @@
+import pytest
+from django.core.cache import cache
+
+from core.querybudget import page_size, query_budget
+from posts.models import Comment, Post
+
+pytestmark = [pytest.mark.django_db]
+
+PAGE_SIZES = (1, 10, 100)
+
+
+@pytest.fixture
+def many_posts(mixer, user, group):
+    posts = mixer.cycle(100).blend(Post, author=user, group=group, image='')
+    mixer.cycle(10).blend(Comment, post=posts[0], author=user)
+    return posts
+
+
+class TestQueryBudget:
+
+    @pytest.mark.parametrize('size', PAGE_SIZES)
+    @pytest.mark.parametrize('url_name, url', [
+        ('posts:index', '/'),
+        ('posts:group_list', '/group/test-link/'),
+        ('posts:profile', '/profile/TestUser/'),
+    ])
+    def test_list_views_within_budget(self, user_client, many_posts,
+                                      url_name, url, size):
+        cache.clear()
+        with page_size(url, size), query_budget(url_name):
+            response = user_client.get(url)
+        assert response.status_code == 200, (
+            f'Страница `{url}` работает неправильно'
+        )
+        assert len(response.context['page_obj']) == size, (
+            f'Проверьте, что на странице `{url}` выводится {size} постов'
+        )
+
+    def test_post_detail_within_budget(self, user_client, many_posts):
+        cache.clear()
+        url = f'/posts/{many_posts[0].pk}/'
+        with query_budget('posts:post_detail'):
+            response = user_client.get(url)
+        assert response.status_code == 200, (
+            f'Страница `{url}` работает неправильно'
+        )
@@ -0,0 +1,423 @@
+"""Load and latency benchmark of the main views.
+
+Run from the project directory::
+
+    python -m benchmarks --output before.json
+    python -m benchmarks --compare before.json --max-regression 0.1
+
+Every run seeds a fresh SQLite database and media directory with the same
+data for the same options, serves the project with a threaded WSGI server
+and drives it with concurrent clients replaying the same request sequence.
+Latency percentiles, throughput and queries per request, taken from the
+``Server-Timing`` header of ``PerformanceMiddleware``, are reported per
+endpoint as JSON together with the commit they were measured at.
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+
+import django
+import requests
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = ('index', 'group', 'profile', 'detail', 'create', 'comment')
+DEFAULT_MIX = 'index=30,group=15,profile=15,detail=30,create=5,comment=5'
+
+SQL_COUNT_RE = re.compile(r'sql;[^,]*desc="(\d+) queries"')
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f'Unknown endpoint: {name}')
+        mix[name] = int(weight)
+    return mix
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks', description=__doc__.split('\n')[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--groups', type=int, default=5)
+    parser.add_argument('--posts', type=int, default=500)
+    parser.add_argument('--comments', type=int, default=1000)
+    parser.add_argument(
+        '--image-share', type=float, default=0.2,
+        help='Share of posts with an image.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--clients', type=int, default=8,
+        help='Concurrent clients.')
+    parser.add_argument(
+        '--requests', type=int, default=200,
+        help='Measured requests per client.')
+    parser.add_argument(
+        '--warmup', type=int, default=20,
+        help='Requests per client made before measuring.')
+    parser.add_argument(
+        '--mix', type=parse_mix, default=DEFAULT_MIX,
+        help=f'Weights of the endpoints, default {DEFAULT_MIX}.')
+    parser.add_argument(
+        '--workdir',
+        help='Keep the database and media here instead of a temporary '
+             'directory.')
+    parser.add_argument(
+        '--plain-sqlite', action='store_true',
+        help='Use the stock SQLite backend without the tuned pragmas and '
+             'immediate transactions, to measure what they bring.')
+    parser.add_argument(
+        '--locmem-cache', action='store_true',
+        help='Cache in the memory of the process with LocMemCache instead '
+             'of the shared SQLite cache.')
+    parser.add_argument(
+        '--no-rate-limits', action='store_true',
+        help='Drop RATE_LIMITS, to measure what checking them costs. '
+             'Otherwise they are checked with rates no client reaches.')
+    parser.add_argument('--output', help='Write the JSON report here.')
+    parser.add_argument(
+        '--compare', help='Report of an earlier run to compare with.')
+    parser.add_argument(
+        '--max-regression', type=float, default=0.1,
+        help='Fail if the p95 latency or the queries per request of an '
+             'endpoint grew by more than this share.')
+    return parser.parse_args(argv)
+
+
+def setup(workdir, plain_sqlite=False, locmem_cache=False,
+          rate_limits=True):
+    """Point the project at empty storage in ``workdir``."""
+    sys.path.insert(0, PROJECT_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    from django.conf import settings
+    database = settings.DATABASES['default']
+    database['NAME'] = os.path.join(workdir, 'db.sqlite3')
+    if plain_sqlite:
+        database['ENGINE'] = 'django.db.backends.sqlite3'
+        database['OPTIONS'] = {}
+    if locmem_cache:
+        settings.CACHES['default'] = {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    else:
+        settings.CACHES['default']['LOCATION'] = os.path.join(
+            workdir, 'cache.sqlite3')
+    if rate_limits:
+        # Counted and checked as in production, but never refused, so the
+        # endpoints measure the same work.
+        settings.RATE_LIMITS = {
+            name: {**limit, 'rate': '1000000/m'}
+            for name, limit in settings.RATE_LIMITS.items()
+        }
+    else:
+        settings.RATE_LIMITS = {}
+    settings.MEDIA_ROOT = os.path.join(workdir, 'media')
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['127.0.0.1']
+    settings.PERF_SAMPLE_RATE = 1
+    settings.PERF_SERVER_TIMING = True
+    # Thumbnails and the search index are built while seeding; during the
+    # measured run tasks are queued and run by a worker, as in production.
+    settings.TASKS_EAGER = True
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def start_server():
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.core.servers.basehttp import (
+        ThreadedWSGIServer,
+        WSGIRequestHandler,
+    )
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler)
+    server.set_app(WSGIHandler())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def start_worker():
+    """Run queued tasks in a thread; return the function stopping it."""
+    from core.tasks import Worker
+
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=Worker().run, args=(stop, 0.1), daemon=True)
+    thread.start()
+
+    def stop_worker():
+        stop.set()
+        thread.join()
+
+    return stop_worker
+
+
+def create_session(user):
+    """Session key of a logged in ``user``, without a login request."""
+    from django.conf import settings
+    from django.contrib.auth import (
+        BACKEND_SESSION_KEY,
+        HASH_SESSION_KEY,
+        SESSION_KEY,
+    )
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return session.session_key
+
+
+class Client:
+    """One simulated user replaying a seeded sequence of requests.
+
+    Pages are read anonymously, posts and comments are written through a
+    logged in session.
+    """
+
+    def __init__(self, base_url, targets, session_key, mix, seed):
+        from django.conf import settings
+        from django.utils.crypto import get_random_string
+        self.base_url = base_url
+        self.targets = targets
+        self.rng = random.Random(seed)
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.anonymous = requests.Session()
+        self.user = requests.Session()
+        csrf_token = get_random_string(32)
+        self.user.cookies.set(settings.SESSION_COOKIE_NAME, session_key)
+        self.user.cookies.set(settings.CSRF_COOKIE_NAME, csrf_token)
+        self.user.headers['X-CSRFToken'] = csrf_token
+
+    def next_request(self):
+        name = self.rng.choices(self.names, self.weights)[0]
+        targets, rng = self.targets, self.rng
+        if name == 'index':
+            page = rng.randint(1, targets['pages'])
+            return name, 'GET', f'/?page={page}', None
+        if name == 'group':
+            slug = rng.choice(targets['groups'])
+            return name, 'GET', f'/group/{slug}/', None
+        if name == 'profile':
+            username = rng.choice(targets['users'])
+            return name, 'GET', f'/profile/{username}/', None
+        post_id = rng.choice(targets['posts'])
+        if name == 'detail':
+            return name, 'GET', f'/posts/{post_id}/', None
+        if name == 'create':
+            return name, 'POST', '/create/', {'text': 'Benchmark post'}
+        return (name, 'POST', f'/posts/{post_id}/comment/',
+                {'text': 'Benchmark comment'})
+
+    def run(self, count):
+        samples = []
+        for _ in range(count):
+            name, method, path, data = self.next_request()
+            session = self.user if method == 'POST' else self.anonymous
+            started = time.perf_counter()
+            try:
+                response = session.request(
+                    method, self.base_url + path, data=data,
+                    allow_redirects=False)
+            except requests.RequestException:
+                samples.append((name, time.perf_counter() - started, None,
+                                None))
+                continue
+            latency = time.perf_counter() - started
+            match = SQL_COUNT_RE.search(
+                response.headers.get('Server-Timing', ''))
+            samples.append((
+                name,
+                latency,
+                response.status_code,
+                int(match.group(1)) if match else None,
+            ))
+        return samples
+
+
+def run_clients(clients, count):
+    with ThreadPoolExecutor(len(clients)) as executor:
+        started = time.perf_counter()
+        results = list(executor.map(lambda c: c.run(count), clients))
+        elapsed = time.perf_counter() - started
+    return [sample for samples in results for sample in samples], elapsed
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def summarize(samples, elapsed):
+    def stats(group):
+        latencies = sorted(latency * 1000 for _, latency, _, _ in group)
+        queries = [count for _, _, _, count in group if count is not None]
+        errors = sum(
+            1 for _, _, status, _ in group
+            if status is None or status >= 400)
+        return {
+            'requests': len(group),
+            'errors': errors,
+            'throughput_rps': round(len(group) / elapsed, 2),
+            'mean_ms': round(sum(latencies) / len(latencies), 2),
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'queries_per_request': (
+                round(sum(queries) / len(queries), 2) if queries else None),
+        }
+
+    endpoints = {}
+    for name in ENDPOINTS:
+        group = [sample for sample in samples if sample[0] == name]
+        if group:
+            endpoints[name] = stats(group)
+    return {'total': stats(samples), 'endpoints': endpoints}
+
+
+def get_commit():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=PROJECT_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=PROJECT_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f'{commit}-dirty' if dirty else commit
+
+
+def compare(report, baseline, max_regression):
+    """Print the differences to a baseline and return whether they pass."""
+    ok = True
+    if baseline.get('config') != report['config']:
+        print('Warning: the runs used different options')
+    for name, current in report['endpoints'].items():
+        previous = baseline['endpoints'].get(name)
+        if previous is None:
+            continue
+        change = current['p95_ms'] / previous['p95_ms'] - 1
+        # Concurrent writes invalidate cached pages at slightly different
+        # moments on every run, so the query counts vary a little too.
+        queries_grew = (current['queries_per_request'] or 0) > (
+            (previous['queries_per_request'] or 0) * (1 + max_regression))
+        failed = change > max_regression or queries_grew
+        ok = ok and not failed
+        print(
+            f'{name:10} p95 {previous["p95_ms"]:8.2f} -> '
+            f'{current["p95_ms"]:8.2f} ms ({change:+.1%}), queries '
+            f'{previous["queries_per_request"]} -> '
+            f'{current["queries_per_request"]}'
+            f'{"  REGRESSION" if failed else ""}'
+        )
+    return ok
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        workdir = options.workdir or tmp_dir
+        os.makedirs(workdir, exist_ok=True)
+        setup(workdir, options.plain_sqlite, options.locmem_cache,
+              not options.no_rate_limits)
+
+        from django.conf import settings
+
+        from benchmarks.seed import seed_dataset
+        from posts.models import User, Group, Post
+
+        dataset = seed_dataset(
+            users=options.users,
+            groups=options.groups,
+            posts=options.posts,
+            comments=options.comments,
+            image_share=options.image_share,
+            seed=options.seed,
+        )
+        targets = {
+            'users': list(User.objects.values_list('username', flat=True)),
+            'groups': list(Group.objects.values_list('slug', flat=True)),
+            'posts': list(Post.objects.values_list('pk', flat=True)),
+            # The first pages of the index, where most readers stay.
+            'pages': min(5, math.ceil(
+                options.posts / settings.POSTS_PER_PAGE)),
+        }
+        users = list(User.objects.order_by('pk'))
+        settings.TASKS_EAGER = False
+        stop_worker = start_worker()
+        server, base_url = start_server()
+        try:
+            clients = [
+                Client(
+                    base_url,
+                    targets,
+                    create_session(users[number % len(users)]),
+                    options.mix,
+                    seed=options.seed * 1000 + number,
+                )
+                for number in range(options.clients)
+            ]
+            run_clients(clients, options.warmup)
+            samples, elapsed = run_clients(clients, options.requests)
+        finally:
+            server.shutdown()
+            server.server_close()
+            stop_worker()
+
+    report = {
+        'commit': get_commit(),
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'config': {
+            'dataset': dataset,
+            'clients': options.clients,
+            'requests': options.requests,
+            'warmup': options.warmup,
+            'mix': options.mix,
+            'plain_sqlite': options.plain_sqlite,
+            'locmem_cache': options.locmem_cache,
+            'rate_limits': not options.no_rate_limits,
+        },
+        'elapsed_s': round(elapsed, 3),
+        **summarize(samples, elapsed),
+    }
+    output = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+        if not compare(report, baseline, options.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
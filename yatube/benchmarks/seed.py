@@ -0,0 +1,58 @@
+"""Reproducible benchmark dataset built with mixer."""
+import io
+import random
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from faker import Faker
+from mixer.backend.django import mixer
+from PIL import Image
+
+from posts.models import User, Comment, Group, Post
+
+
+def make_image(rng):
+    """JPEG of a random colour, large enough to be cropped and resized."""
+    color = tuple(rng.randrange(256) for _ in range(3))
+    buffer = io.BytesIO()
+    Image.new('RGB', (1200, 800), color).save(buffer, 'JPEG')
+    return SimpleUploadedFile(
+        'benchmark.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+def seed_dataset(users=20, groups=5, posts=500, comments=1000,
+                 image_share=0.2, seed=0):
+    """Fill an empty database with the same data for the same arguments.
+
+    Posts go through the ORM, so the signal handlers keep the counters,
+    timelines and search index as they would be in production.
+    """
+    rng = random.Random(seed)
+    Faker.seed(seed)
+    mixer.faker.seed_instance(seed)
+    authors = mixer.cycle(users).blend(
+        User, username=mixer.sequence('user{0}'))
+    group_list = mixer.cycle(groups).blend(
+        Group, slug=mixer.sequence('group{0}'))
+    post_list = []
+    for _ in range(posts):
+        post_list.append(mixer.blend(
+            Post,
+            author=rng.choice(authors),
+            # A quarter of the posts have no group.
+            group=rng.choice(group_list) if rng.random() < 0.75 else None,
+            image=make_image(rng) if rng.random() < image_share else '',
+        ))
+    for _ in range(comments):
+        mixer.blend(
+            Comment,
+            post=rng.choice(post_list),
+            author=rng.choice(authors),
+        )
+    return {
+        'users': users,
+        'groups': groups,
+        'posts': posts,
+        'comments': comments,
+        'image_share': image_share,
+        'seed': seed,
+    }
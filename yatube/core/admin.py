@@ -0,0 +1,25 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'name',
+        'args',
+        'status',
+        'attempts',
+        'run_at',
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'key')
+    actions = ('retry',)
+
+    def retry(self, request, queryset):
+        queryset.update(
+            status=Task.PENDING, attempts=0, run_at=timezone.now())
+
+    retry.short_description = 'Повторить выбранные задачи'
@@ -0,0 +1,322 @@
+"""Cache shared by all processes of the site through an SQLite file.
+
+Unlike ``LocMemCache``, every worker process sees the same entries, so the
+page cache, the version keys that invalidate it, timelines and sorl's
+thumbnail records are shared, and a bump in one process reaches all
+others. No server is needed, only a file next to the database.
+
+Writes run in ``BEGIN IMMEDIATE`` transactions, so ``add()`` and ``incr()``
+are atomic across processes. The number of entries and their total size
+are kept by triggers; a write that takes them over ``MAX_ENTRIES`` or
+``MAX_SIZE`` bytes evicts the expired entries and then the least recently
+read ones. Read times are only updated once per ``ACCESS_RESOLUTION``
+seconds to spare reads a write.
+
+Hits and misses are counted in memory and added to the file at most once
+per ``STATS_FLUSH_INTERVAL`` seconds when a request finishes; see
+``get_stats()``.
+"""
+import contextlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL,'
+    ' size INTEGER NOT NULL'
+    ')',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE TABLE IF NOT EXISTS cache_stats ('
+    ' id INTEGER PRIMARY KEY CHECK (id = 0),'
+    ' entries INTEGER NOT NULL,'
+    ' size INTEGER NOT NULL,'
+    ' hits INTEGER NOT NULL,'
+    ' misses INTEGER NOT NULL'
+    ')',
+    'INSERT OR IGNORE INTO cache_stats VALUES (0, 0, 0, 0, 0)',
+    'CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN'
+    ' UPDATE cache_stats SET entries = entries + 1, size = size + NEW.size;'
+    ' END',
+    'CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache'
+    ' BEGIN'
+    ' UPDATE cache_stats SET size = size + NEW.size - OLD.size;'
+    ' END',
+    'CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN'
+    ' UPDATE cache_stats SET entries = entries - 1, size = size - OLD.size;'
+    ' END',
+)
+
+# SQLite limits the number of parameters of a statement.
+CHUNK_SIZE = 500
+
+
+def chunks(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = options.get('MAX_SIZE')
+        self._access_resolution = options.get('ACCESS_RESOLUTION', 10)
+        self._stats_flush_interval = options.get('STATS_FLUSH_INTERVAL', 5)
+        self._busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._hits = self._misses = 0
+        self._stats_flushed = time.monotonic()
+
+    def _connect(self):
+        local = self._local
+        # A connection must not be shared with a forked child process.
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(
+                self._path,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.execute('PRAGMA journal_mode = wal')
+            conn.execute('PRAGMA synchronous = normal')
+            with self._transaction(conn):
+                for statement in SCHEMA:
+                    conn.execute(statement)
+            local.conn = conn
+            local.pid = os.getpid()
+        return local.conn
+
+    @contextlib.contextmanager
+    def _transaction(self, conn):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _write(self):
+        return self._transaction(self._connect())
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _encode(value):
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _is_live(expires, now):
+        return expires is None or expires > now
+
+    def _count(self, hits, misses):
+        with self._stats_lock:
+            self._hits += hits
+            self._misses += misses
+
+    def _read(self, keys):
+        """Live values of the keys, refreshing stale read times."""
+        now = time.time()
+        conn = self._connect()
+        found = {}
+        stale = []
+        for chunk in chunks(keys):
+            rows = conn.execute(
+                f'SELECT key, value, expires, accessed FROM cache '
+                f'WHERE key IN ({", ".join("?" * len(chunk))})',
+                chunk,
+            )
+            for key, value, expires, accessed in rows:
+                if self._is_live(expires, now):
+                    found[key] = pickle.loads(value)
+                    if accessed < now - self._access_resolution:
+                        stale.append(key)
+        self._count(len(found), len(keys) - len(found))
+        if stale:
+            with self._write() as conn:
+                for chunk in chunks(stale):
+                    conn.execute(
+                        f'UPDATE cache SET accessed = ? '
+                        f'WHERE key IN ({", ".join("?" * len(chunk))})',
+                        [now, *chunk],
+                    )
+        return found
+
+    def _store(self, conn, key, value, timeout, only_missing=False):
+        blob = self._encode(value)
+        now = time.time()
+        sql = (
+            'INSERT INTO cache (key, value, expires, accessed, size) '
+            'VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+            'expires = excluded.expires, accessed = excluded.accessed, '
+            'size = excluded.size'
+        )
+        params = [key, blob, self.get_backend_timeout(timeout), now, len(blob)]
+        if only_missing:
+            # An expired entry counts as missing.
+            sql += ' WHERE cache.expires IS NOT NULL AND cache.expires <= ?'
+            params.append(now)
+        return conn.execute(sql, params).rowcount > 0
+
+    def _cull(self, conn):
+        def totals():
+            return conn.execute(
+                'SELECT entries, size FROM cache_stats').fetchone()
+
+        def over(entries, size):
+            return entries > self._max_entries or (
+                self._max_size is not None and size > self._max_size)
+
+        if not over(*totals()):
+            return
+        conn.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            (time.time(),))
+        entries, size = totals()
+        while entries and over(entries, size):
+            if not self._cull_frequency:
+                conn.execute('DELETE FROM cache')
+            else:
+                conn.execute(
+                    'DELETE FROM cache WHERE key IN ('
+                    ' SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                    (max(1, entries // self._cull_frequency),),
+                )
+            entries, size = totals()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as conn:
+            added = self._store(conn, key, value, timeout, only_missing=True)
+            if added:
+                self._cull(conn)
+        return added
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._read([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        made_keys = {self._key(key, version): key for key in keys}
+        found = self._read(list(made_keys))
+        return {made_keys[key]: value for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as conn:
+            self._store(conn, key, value, timeout)
+            self._cull(conn)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._write() as conn:
+            for key, value in data.items():
+                self._store(conn, self._key(key, version), value, timeout)
+            self._cull(conn)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as conn:
+            return conn.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, time.time()),
+            ).rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with self._write() as conn:
+            row = conn.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or not self._is_live(row[1], time.time()):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            blob = self._encode(value)
+            conn.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (blob, len(blob), key),
+            )
+        return value
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        row = self._connect().execute(
+            'SELECT expires FROM cache WHERE key = ?', (key,)).fetchone()
+        return row is not None and self._is_live(row[0], time.time())
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        with self._write() as conn:
+            return conn.execute(
+                'DELETE FROM cache WHERE key = ?', (key,)).rowcount > 0
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        with self._write() as conn:
+            for chunk in chunks(keys):
+                conn.execute(
+                    f'DELETE FROM cache '
+                    f'WHERE key IN ({", ".join("?" * len(chunk))})',
+                    chunk,
+                )
+
+    def clear(self):
+        with self._write() as conn:
+            conn.execute('DELETE FROM cache')
+            conn.execute('UPDATE cache_stats SET hits = 0, misses = 0')
+        with self._stats_lock:
+            self._hits = self._misses = 0
+
+    def flush_stats(self):
+        """Add the hits and misses counted by this process to the file."""
+        with self._stats_lock:
+            hits, misses = self._hits, self._misses
+            self._hits = self._misses = 0
+            self._stats_flushed = time.monotonic()
+        if hits or misses:
+            with self._write() as conn:
+                conn.execute(
+                    'UPDATE cache_stats '
+                    'SET hits = hits + ?, misses = misses + ?',
+                    (hits, misses),
+                )
+
+    def get_stats(self):
+        """Entries, size and hits and misses of all processes."""
+        self.flush_stats()
+        entries, size, hits, misses = self._connect().execute(
+            'SELECT entries, size, hits, misses FROM cache_stats'
+        ).fetchone()
+        return {
+            'entries': entries,
+            'size': size,
+            'max_entries': self._max_entries,
+            'max_size': self._max_size,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else None,
+        }
+
+    def close(self, **kwargs):
+        # Called when every request finishes; the connection stays open.
+        if (time.monotonic() - self._stats_flushed
+                >= self._stats_flush_interval):
+            self.flush_stats()
@@ -0,0 +1,54 @@
+"""SQLite backend tuned for concurrent web workers.
+
+Takes two options in ``DATABASES[...]['OPTIONS']`` on top of those of
+``sqlite3.connect()``:
+
+``pragmas``
+    ``{name: value}`` run as ``PRAGMA name = value`` on every new
+    connection, e.g. WAL journaling so readers never wait for the writer.
+
+``immediate_transactions``
+    Let ``core.db.immediate_atomic()`` start its transactions with
+    ``BEGIN IMMEDIATE``. A deferred transaction that reads before it writes
+    fails with "database is locked" at once when another connection wrote
+    in between, without waiting for the busy timeout; an immediate one
+    takes the write lock up front and waits for it.
+"""
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+PRAGMA_NAME_RE = re.compile(r'^[a-z_]+$')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = options.get('pragmas', {})
+        for name in self.pragmas:
+            if not PRAGMA_NAME_RE.match(name):
+                raise ImproperlyConfigured(f'Invalid SQLite pragma: {name}')
+        self.supports_immediate = options.get(
+            'immediate_transactions', False)
+        # Set by core.db.immediate_atomic() for the transaction it opens.
+        self.begin_immediate = False
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('immediate_transactions', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.begin_immediate:
+            self.cursor().execute('BEGIN IMMEDIATE')
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,76 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY_PREFIX = 'version:'
+MODIFIED_KEY_PREFIX = 'modified:'
+
+
+def _initial_version():
+    # Start from the clock rather than 1, so a version lost on eviction or
+    # restart never comes back with a value some old cache entry was
+    # stored under.
+    return int(time.time() * 1000)
+
+
+def get_versions(scopes):
+    """Return the current version of every scope, creating missing ones."""
+    keys = [VERSION_KEY_PREFIX + scope for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            if cache.add(key, _initial_version(), None):
+                # Whatever changed while the version was lost is unknown.
+                scope = key[len(VERSION_KEY_PREFIX):]
+                cache.set(MODIFIED_KEY_PREFIX + scope, time.time(), None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key) for key in keys]
+
+
+def get_last_modified(scopes):
+    """Timestamp of the latest bump of any of the scopes."""
+    keys = [MODIFIED_KEY_PREFIX + scope for scope in scopes]
+    modified = cache.get_many(keys)
+    now = time.time()
+    for key in keys:
+        if key not in modified:
+            cache.add(key, now, None)
+            modified[key] = cache.get(key, now)
+    return max(modified.values(), default=None)
+
+
+def _bump(scopes):
+    for scope in scopes:
+        key = VERSION_KEY_PREFIX + scope
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), None)
+    now = time.time()
+    cache.set_many(
+        {MODIFIED_KEY_PREFIX + scope: now for scope in scopes}, None)
+
+
+def bump_versions(*scopes):
+    """Invalidate everything cached under the given scopes."""
+    scopes = set(scopes)
+    _bump(scopes)
+    if transaction.get_connection().in_atomic_block:
+        # A page rendered between the first bump and the commit would be
+        # cached under the new version with the old data.
+        transaction.on_commit(lambda: _bump(scopes))
+
+
+def get_versioned_digest(parts, scopes):
+    """Hash of ``parts`` that changes whenever one of the scopes is bumped."""
+    versions = get_versions(scopes)
+    raw = '|'.join(str(part) for part in (*parts, *scopes, *versions))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def make_versioned_key(prefix, parts, scopes):
+    """Build a cache key that changes whenever one of the scopes is bumped."""
+    return f'{prefix}:{get_versioned_digest(parts, scopes)}'
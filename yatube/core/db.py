@@ -0,0 +1,26 @@
+import contextlib
+
+from django.db import transaction
+
+
+@contextlib.contextmanager
+def immediate_atomic(using=None):
+    """``transaction.atomic()`` taking the write lock when it starts.
+
+    Only the ``core.backends.sqlite3`` backend with
+    ``immediate_transactions`` enabled does so; elsewhere, and inside an
+    open transaction, this is a plain ``atomic()``.
+    """
+    connection = transaction.get_connection(using)
+    if (not getattr(connection, 'supports_immediate', False)
+            or connection.in_atomic_block):
+        with transaction.atomic(using=using):
+            yield
+        return
+    connection.begin_immediate = True
+    try:
+        with transaction.atomic(using=using):
+            connection.begin_immediate = False
+            yield
+    finally:
+        connection.begin_immediate = False
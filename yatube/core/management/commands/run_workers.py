@@ -0,0 +1,101 @@
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.tasks import Worker
+
+
+def run_worker(stop, batch_size, poll_interval):
+    Worker(batch_size).run(stop, poll_interval)
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет задачи из очереди core.Task в пуле потоков или '
+        'процессов до прерывания.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.TASKS_WORKERS,
+            help='Число обработчиков.',
+        )
+        parser.add_argument(
+            '--processes',
+            action='store_true',
+            help='Запускать обработчики в процессах, а не в потоках.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10,
+            help='Сколько задач обработчик берет за раз.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1,
+            help='Секунд между проверками пустой очереди.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задачи в текущем потоке и завершиться.',
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            worker = Worker(options['batch_size'])
+            done = 0
+            while True:
+                claimed = worker.run_once()
+                if not claimed:
+                    break
+                done += claimed
+            self.stdout.write(f'Выполнено задач: {done}')
+            return
+        worker_args = (options['batch_size'], options['poll_interval'])
+        if options['processes']:
+            self.run_processes(options['workers'], worker_args)
+        else:
+            self.run_threads(options['workers'], worker_args)
+
+    def run_threads(self, workers, worker_args):
+        stop = threading.Event()
+        with ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix='tasks') as executor:
+            for _ in range(workers):
+                executor.submit(run_worker, stop, *worker_args)
+            self.wait(stop)
+
+    def run_processes(self, workers, worker_args):
+        # Forked workers must not share the parent's database connections.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        stop = context.Event()
+        processes = [
+            context.Process(target=run_worker, args=(stop, *worker_args))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            self.wait(stop)
+        finally:
+            for process in processes:
+                process.join()
+
+    def wait(self, stop):
+        self.stdout.write('Обработчики запущены, Ctrl+C для остановки')
+        try:
+            while not stop.wait(1):
+                pass
+        except KeyboardInterrupt:
+            self.stdout.write('Остановка после текущих задач')
+            stop.set()
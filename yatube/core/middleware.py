@@ -0,0 +1,124 @@
+import logging
+import random
+import time
+
+from django.conf import settings
+
+from . import perf, ratelimit, routers
+from .querybudget import get_query_budget
+from .views import too_many_requests
+
+logger = logging.getLogger(__name__)
+
+
+class PerformanceMiddleware:
+    """Records timings of a sample of requests per view name.
+
+    ``PERF_SAMPLE_RATE`` of the requests are measured: wall time, queries,
+    template rendering, cache hits and misses and thumbnail lookups. Their
+    totals go to the histograms served by ``core.views.perf_stats`` and,
+    with ``PERF_SERVER_TIMING``, to the ``Server-Timing`` header. Requests
+    running more queries than their ``QUERY_BUDGETS`` entry are logged.
+    Requests that are not sampled pay for one random number.
+
+    Must come first in ``MIDDLEWARE`` to measure the other middleware and
+    see the template responses right before they are rendered.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.PERF_SAMPLE_RATE
+        if not rate or random.random() >= rate:
+            return self.get_response(request)
+        started = time.perf_counter()
+        with perf.collect() as metrics:
+            response = self.get_response(request)
+        metrics.add('wall_time', (time.perf_counter() - started) * 1000)
+        if request.resolver_match is not None:
+            view_name = request.resolver_match.view_name
+            perf.registry.record(view_name, metrics)
+            budget = get_query_budget(view_name)
+            sql_count = metrics.values['sql_count']
+            if (budget is not None and sql_count > budget
+                    and request.method in ('GET', 'HEAD')):
+                logger.warning(
+                    '%s: %d запросов при бюджете %d',
+                    view_name, sql_count, budget)
+        if settings.PERF_SERVER_TIMING:
+            response['Server-Timing'] = metrics.server_timing()
+        return response
+
+    def process_template_response(self, request, response):
+        metrics = perf.get_metrics()
+        if metrics is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda r: metrics.add(
+                    'template_time',
+                    (time.perf_counter() - started) * 1000))
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """Serves the reads of read-only views from a database replica.
+
+    Only GET and HEAD requests to the views listed in ``REPLICA_READ_VIEWS``
+    are routed. A request that writes to the primary pins the session to it
+    for ``REPLICA_PIN_TIMEOUT`` seconds, so users see their own changes even
+    while the replicas lag behind.
+    """
+
+    session_key = '_db_primary_until'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.reset()
+        try:
+            response = self.get_response(request)
+            if routers.has_written() and hasattr(request, 'session'):
+                request.session[self.session_key] = (
+                    time.time() + settings.REPLICA_PIN_TIMEOUT)
+        finally:
+            routers.reset()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (settings.DATABASE_REPLICAS
+                and request.method in ('GET', 'HEAD')
+                and request.resolver_match.view_name
+                in settings.REPLICA_READ_VIEWS
+                and not self.is_pinned(request)):
+            routers.set_replica(random.choice(settings.DATABASE_REPLICAS))
+
+    def is_pinned(self, request):
+        session = getattr(request, 'session', None)
+        if session is None:
+            return False
+        return session.get(self.session_key, 0) > time.time()
+
+
+class RateLimitMiddleware:
+    """Refuses requests over the ``RATE_LIMITS`` of their view with 429.
+
+    Limits are counted per URL name and user, or address for anonymous
+    users, in the shared cache; see ``core.ratelimit``. Requests to views
+    without a limit pay for a dictionary lookup. Must come after
+    ``AuthenticationMiddleware``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_name = request.resolver_match.view_name
+        retry_after = ratelimit.check_request(request, view_name)
+        if retry_after is not None:
+            return too_many_requests(request, retry_after)
+        return None
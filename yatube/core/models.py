@@ -1,3 +1,5 @@
+import json
+
 from django.db import models
 
 
@@ -9,3 +11,87 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class Task(models.Model):
+    """Call of a function queued by ``core.tasks.enqueue()``.
+
+    Rows are deleted once the call succeeds; those left are waiting, being
+    run, or failed after their last attempt.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Ожидает'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(
+        verbose_name='Функция',
+        max_length=200,
+    )
+    args = models.TextField(
+        verbose_name='Аргументы',
+        help_text='Аргументы функции в JSON',
+        default='[]',
+    )
+    key = models.CharField(
+        verbose_name='Ключ идемпотентности',
+        max_length=200,
+        blank=True,
+        db_index=True,
+    )
+    status = models.CharField(
+        verbose_name='Состояние',
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+    )
+    attempts = models.PositiveIntegerField(
+        verbose_name='Попыток',
+        default=0,
+    )
+    max_attempts = models.PositiveIntegerField(
+        verbose_name='Наибольшее число попыток',
+    )
+    run_at = models.DateTimeField(
+        verbose_name='Выполнить после',
+    )
+    locked_by = models.CharField(
+        verbose_name='Обработчик',
+        max_length=100,
+        blank=True,
+    )
+    locked_until = models.DateTimeField(
+        verbose_name='Занята до',
+        null=True,
+        blank=True,
+    )
+    last_error = models.TextField(
+        verbose_name='Последняя ошибка',
+        blank=True,
+    )
+    created = models.DateTimeField(
+        verbose_name='Дата создания',
+        auto_now_add=True,
+    )
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        indexes = (
+            models.Index(
+                fields=('status', 'run_at'),
+                name='task_status_run_at_idx',
+            ),
+        )
+
+    def __str__(self):
+        args = ', '.join(map(repr, self.get_args()))
+        return f'{self.name}({args})'
+
+    def get_args(self):
+        return json.loads(self.args)
@@ -0,0 +1,188 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import (
+    EmptyPage, InvalidPage, Page, PageNotAnInteger, Paginator)
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CountedPaginator(Paginator):
+    """Paginator that trusts a count known in advance.
+
+    Lets views pass a maintained counter instead of running ``COUNT(*)``
+    over the whole list; without ``count`` it behaves like ``Paginator``.
+    """
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            self.count = count
+
+
+class KeyRangePaginator:
+    """Splits a queryset into pages of fixed primary key ranges.
+
+    Page ``n`` holds the objects with keys in ``((n - 1) * per_page,
+    n * per_page]``: it is read by an index range scan, and only the last
+    page changes when objects are added, so earlier pages can stay cached.
+    Pages hold fewer objects where some were deleted. Only the parts of
+    ``Paginator`` used by sitemaps are provided.
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+
+    @cached_property
+    def num_pages(self):
+        max_pk = self.queryset.aggregate(max_pk=Max('pk'))['max_pk'] or 0
+        return max(1, -(-max_pk // self.per_page))
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы не является целым числом')
+        if not 1 <= number <= self.num_pages:
+            raise EmptyPage('Страница не содержит результатов')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        object_list = self.queryset.filter(
+            pk__gt=(number - 1) * self.per_page,
+            pk__lte=number * self.per_page,
+        ).order_by('pk')
+        return Page(object_list, number, self)
+
+
+class CursorPage:
+    """Page of a keyset paginated list.
+
+    Mimics the parts of ``django.core.paginator.Page`` used by the templates,
+    but links to neighbouring pages with opaque cursors instead of numbers.
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<Cursor page of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset paginator for querysets.
+
+    Pages are addressed by a cursor holding the ordering values of the
+    boundary object, so every page is served by an index range scan with no
+    ``OFFSET`` and no ``COUNT(*)``. The ordering must be unique, that is why
+    it ends with the primary key.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-created', '-pk')):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = tuple(name.lstrip('-') for name in self.ordering)
+
+    def page(self, cursor=None):
+        values, reverse = self.decode_cursor(cursor)
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(self._reverse(name) for name in ordering)
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(values, reverse))
+        objects = list(queryset[:self.per_page + 1])
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if reverse:
+            objects.reverse()
+        next_cursor = previous_cursor = None
+        if objects:
+            if has_more or reverse:
+                next_cursor = self.encode_cursor(objects[-1])
+            if (has_more and reverse) or (values is not None and not reverse):
+                previous_cursor = self.encode_cursor(objects[0], reverse=True)
+        return CursorPage(objects, self, next_cursor, previous_cursor)
+
+    def get_page(self, cursor=None):
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+    def encode_cursor(self, obj, reverse=False):
+        values = [
+            self._field(name).value_to_string(obj) for name in self.fields
+        ]
+        payload = json.dumps({'v': values, 'r': reverse}).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None, False
+        try:
+            payload = base64.urlsafe_b64decode(
+                cursor.encode() + b'=' * (-len(cursor) % 4))
+            data = json.loads(payload.decode())
+            values = [
+                self._field(name).to_python(value)
+                for name, value in zip(self.fields, data['v'])
+            ]
+            reverse = bool(data.get('r'))
+        except (binascii.Error, ValueError, TypeError, KeyError,
+                AttributeError, ValidationError):
+            raise InvalidCursor('Некорректный курсор')
+        if len(values) != len(self.fields) or None in values:
+            raise InvalidCursor('Некорректный курсор')
+        return values, reverse
+
+    def _field(self, name):
+        opts = self.queryset.model._meta
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    def _keyset_filter(self, values, reverse):
+        condition = Q()
+        equal = {}
+        for name, field, value in zip(self.ordering, self.fields, values):
+            descending = name.startswith('-') != reverse
+            lookup = f'{field}__lt' if descending else f'{field}__gt'
+            condition |= Q(**equal, **{lookup: value})
+            equal[field] = value
+        return condition
+
+    @staticmethod
+    def _reverse(name):
+        return name[1:] if name.startswith('-') else f'-{name}'
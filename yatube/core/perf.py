@@ -0,0 +1,182 @@
+"""Sampled per-view request metrics.
+
+``PerformanceMiddleware`` samples ``PERF_SAMPLE_RATE`` of the requests and
+collects their metrics in a ``RequestMetrics`` bound to the thread. Code on
+the request path reports into it with ``count()`` and ``measure()``, which
+do nothing for requests that are not sampled. Finished requests go into
+histograms per view name, kept in memory of the worker process.
+"""
+import contextlib
+import threading
+import time
+
+from django.db import connections
+
+TIME_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# Times are in milliseconds.
+METRICS = {
+    'wall_time': TIME_BUCKETS,
+    'sql_count': COUNT_BUCKETS,
+    'sql_time': TIME_BUCKETS,
+    'template_time': TIME_BUCKETS,
+    'cache_hits': COUNT_BUCKETS,
+    'cache_misses': COUNT_BUCKETS,
+    'thumbnail_count': COUNT_BUCKETS,
+    'thumbnail_time': TIME_BUCKETS,
+}
+
+_local = threading.local()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.values = dict.fromkeys(METRICS, 0)
+
+    def add(self, metric, value=1):
+        self.values[metric] += value
+
+    def __call__(self, execute, sql, params, many, context):
+        """Execute wrapper timing the queries of the request."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add('sql_count')
+            self.add('sql_time', (time.perf_counter() - started) * 1000)
+
+    def server_timing(self):
+        values = self.values
+        return ', '.join((
+            f'total;dur={values["wall_time"]:.1f}',
+            f'sql;dur={values["sql_time"]:.1f};'
+            f'desc="{values["sql_count"]} queries"',
+            f'tpl;dur={values["template_time"]:.1f}',
+            f'cache;desc="{values["cache_hits"]} hits '
+            f'{values["cache_misses"]} misses"',
+            f'thumb;dur={values["thumbnail_time"]:.1f};'
+            f'desc="{values["thumbnail_count"]} lookups"',
+        ))
+
+
+def get_metrics():
+    """Metrics of the current request, None if it is not sampled."""
+    return getattr(_local, 'metrics', None)
+
+
+def count(metric, value=1):
+    metrics = getattr(_local, 'metrics', None)
+    if metrics is not None:
+        metrics.add(metric, value)
+
+
+@contextlib.contextmanager
+def measure(metric):
+    """Add the time spent in the block to a time metric."""
+    metrics = getattr(_local, 'metrics', None)
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(metric, (time.perf_counter() - started) * 1000)
+
+
+@contextlib.contextmanager
+def collect():
+    """Bind new metrics to the thread and time the queries of the block."""
+    metrics = _local.metrics = RequestMetrics()
+    try:
+        with contextlib.ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(metrics))
+            yield metrics
+    finally:
+        _local.metrics = None
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # The last bucket takes everything above the largest bound.
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        index = 0
+        while index < len(self.bounds) and value > self.bounds[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of values."""
+        if not self.count:
+            return None
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= fraction * self.count:
+                if index < len(self.bounds):
+                    return self.bounds[index]
+                return self.max
+        return self.max
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'max': self.max,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'buckets': {
+                **{f'le_{bound}': bucket
+                   for bound, bucket in zip(self.bounds, self.buckets)},
+                'inf': self.buckets[-1],
+            },
+        }
+
+
+class Registry:
+    """Histograms of every metric per view name."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def record(self, view_name, metrics):
+        with self.lock:
+            histograms = self.views.get(view_name)
+            if histograms is None:
+                histograms = self.views[view_name] = {
+                    metric: Histogram(bounds)
+                    for metric, bounds in METRICS.items()
+                }
+            for metric, value in metrics.values.items():
+                histograms[metric].add(value)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                view_name: {
+                    metric: histogram.as_dict()
+                    for metric, histogram in histograms.items()
+                }
+                for view_name, histograms in sorted(self.views.items())
+            }
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+
+registry = Registry()
@@ -0,0 +1,52 @@
+"""Maximum number of queries a view may run.
+
+``QUERY_BUDGETS`` maps URL names to the most queries a GET request to them
+may run, counting the session and user lookups of an authenticated request on
+a cold cache. The budget does not depend on the page size: a view whose
+queries grow with the number of posts on a page has an N+1 problem.
+
+The tests check the views against their budgets with ``query_budget()``
+at several page sizes set with ``page_size()``; sampled requests over
+budget are logged by ``core.middleware.PerformanceMiddleware``.
+"""
+import contextlib
+from unittest import mock
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def get_query_budget(url_name):
+    """Budget of a URL name, None if it has none."""
+    return settings.QUERY_BUDGETS.get(url_name)
+
+
+@contextlib.contextmanager
+def query_budget(url_name, using=DEFAULT_DB_ALIAS):
+    """Fail if the block runs more queries than the budget of ``url_name``."""
+    budget = get_query_budget(url_name)
+    if budget is None:
+        raise QueryBudgetExceeded(f'{url_name}: бюджет запросов не задан')
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+    if len(context) > budget:
+        queries = '\n'.join(
+            f'{number}. {query["sql"]}'
+            for number, query in enumerate(context.captured_queries, 1)
+        )
+        raise QueryBudgetExceeded(
+            f'{url_name}: {len(context)} запросов при бюджете {budget}\n'
+            f'{queries}'
+        )
+
+
+def page_size(path, size):
+    """Make the view serving ``path`` show ``size`` objects per page."""
+    view_class = resolve(path).func.view_class
+    return mock.patch.object(view_class, 'paginate_by', size)
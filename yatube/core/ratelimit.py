@@ -0,0 +1,101 @@
+"""Sliding window rate limits kept in the shared cache.
+
+A client may make ``count`` requests to a view per ``period`` seconds.
+Requests are counted per fixed window under a cache key, and the count of
+the previous window is weighted by the share of it still inside the
+sliding window: two counters per client approximate a log of every
+request. A refused request is not counted, so a client flooding a view
+costs one cache read per request and no write.
+
+Concurrent requests may all pass the check before any of them is counted,
+so a limit can be overshot by the number of concurrent requests of one
+client.
+"""
+import functools
+import logging
+import math
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+RATE_RE = re.compile(r'^([1-9]\d*)/([1-9]\d*)?([smhd])$')
+
+
+@functools.lru_cache(maxsize=None)
+def parse_rate(rate):
+    """``'10/m'`` or ``'100/5m'`` as the count and the period in seconds."""
+    match = RATE_RE.match(rate)
+    if match is None:
+        raise ImproperlyConfigured(f'Некорректная частота запросов: {rate}')
+    count, multiplier, unit = match.groups()
+    return int(count), int(multiplier or 1) * PERIODS[unit]
+
+
+def get_client_key(request, key='user'):
+    """The user making the request, or its address for ``key='ip'``.
+
+    The address is read from ``RATE_LIMIT_IP_HEADER``, which behind a
+    proxy must be a header the proxy sets itself.
+    """
+    user = getattr(request, 'user', None)
+    if key == 'user' and user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return f'ip:{request.META.get(settings.RATE_LIMIT_IP_HEADER, "")}'
+
+
+def get_retry_after(count, period, previous, current, elapsed):
+    """Seconds until a request fits into the limit again."""
+    if current + 1 > count:
+        # Only the next window, with this one weighted, can let it in.
+        wait = period - elapsed + period * (1 - (count - 1) / current)
+    else:
+        wait = period * (1 - (count - 1 - current) / previous) - elapsed
+    return max(1, math.ceil(wait))
+
+
+def hit(scope, count, period, now=None):
+    """Count a request in ``scope`` unless it is over the limit.
+
+    Return None if the request is allowed, otherwise the seconds to wait.
+    """
+    if now is None:
+        now = time.time()
+    window = int(now // period)
+    elapsed = now - window * period
+    previous_key = f'ratelimit:{scope}:{window - 1}'
+    current_key = f'ratelimit:{scope}:{window}'
+    counts = cache.get_many([previous_key, current_key])
+    previous = counts.get(previous_key, 0)
+    current = counts.get(current_key, 0)
+    if previous * (1 - elapsed / period) + current + 1 > count:
+        return get_retry_after(count, period, previous, current, elapsed)
+    try:
+        cache.incr(current_key)
+    except ValueError:
+        # The counter is read as the previous one during the next window.
+        if not cache.add(current_key, 1, period * 2):
+            cache.incr(current_key)
+    return None
+
+
+def check_request(request, view_name):
+    """Apply the ``RATE_LIMITS`` entry of a view to a request.
+
+    Return None if the request is allowed, otherwise the seconds to wait.
+    """
+    limit = settings.RATE_LIMITS.get(view_name)
+    if limit is None or request.method not in limit.get(
+            'methods', settings.RATE_LIMIT_METHODS):
+        return None
+    count, period = parse_rate(limit['rate'])
+    client = get_client_key(request, limit.get('key', 'user'))
+    retry_after = hit(f'{view_name}:{client}', count, period)
+    if retry_after is not None:
+        logger.info('%s: превышен лимит запросов %s', view_name, client)
+    return retry_after
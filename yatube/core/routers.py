@@ -0,0 +1,52 @@
+"""Database routing between the primary and its read-only replicas.
+
+All writes go to the ``default`` database. Reads go there as well unless
+the current request was marked read-only by ``ReplicaRoutingMiddleware``,
+in which case every read of the request uses the one replica it picked.
+"""
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Sessions hold the pin to the primary, so they must never be read stale.
+PRIMARY_ONLY_APPS = ('sessions',)
+
+_state = threading.local()
+
+
+def get_replica():
+    """Alias of the replica serving the current request, if any."""
+    return getattr(_state, 'replica', None)
+
+
+def set_replica(alias):
+    _state.replica = alias
+
+
+def has_written():
+    """Whether anything was written since the last ``reset()``."""
+    return getattr(_state, 'written', False)
+
+
+def reset():
+    _state.replica = None
+    _state.written = False
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = get_replica()
+        if replica and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            return replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _state.written = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import runner
+from django.test.utils import override_settings
+
+# Pages are rendered without collectstatic having run, so static URLs are
+# not looked up in a manifest; StaticFilesTest covers the site's storage.
+TEST_STATICFILES_STORAGE = (
+    'django.contrib.staticfiles.storage.StaticFilesStorage')
+
+
+def get_isolated_caches(directory):
+    """``CACHES`` with the cache files moved into ``directory``.
+
+    The cache files outlive the run and are shared with a running site,
+    and the fresh test database reuses ids, so tests must neither see the
+    pages and version keys stored there nor change them.
+    """
+    caches = {}
+    for alias, params in settings.CACHES.items():
+        params = dict(params)
+        if params['BACKEND'] == 'core.backends.cache.SQLiteCache':
+            params['LOCATION'] = os.path.join(
+                directory, f'{alias}-{os.path.basename(params["LOCATION"])}')
+        caches[alias] = params
+    return caches
+
+
+class DiscoverRunner(runner.DiscoverRunner):
+    """Runs the tests with their own empty caches, plain static files
+    storage and eager tasks.
+
+    See ``get_isolated_caches()`` and ``TEST_STATICFILES_STORAGE``.
+
+    Test cases never commit, so tasks queued on commit would never run; they
+    run as soon as they are queued instead, see ``core.tasks``.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.TASKS_EAGER = True
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache_settings = override_settings(
+            CACHES=get_isolated_caches(self.cache_dir),
+            STATICFILES_STORAGE=TEST_STATICFILES_STORAGE,
+        )
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
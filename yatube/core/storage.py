@@ -0,0 +1,64 @@
+"""Static files storage hashing names and precompressing contents.
+
+``collectstatic`` writes ``name.<hash>.ext`` copies listed in a manifest,
+so their URLs change with their contents and can be cached for good, and
+next to each text file a ``.gz`` and a ``.br`` variant served by
+``core.wsgi.StaticFilesApplication``.
+"""
+import gzip
+import os
+
+import brotli
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+COMPRESSED_EXTENSIONS = ('.css', '.js', '.svg', '.ico', '.txt', '.json')
+
+# Variants saving less than this share of the size are not kept.
+MIN_SAVING = 0.05
+
+
+def gzip_compress(data):
+    # A fixed mtime keeps the output identical for identical input.
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def brotli_compress(data):
+    return brotli.compress(data, quality=11)
+
+
+COMPRESSORS = {
+    '.gz': gzip_compress,
+    '.br': brotli_compress,
+}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # A file missing from the manifest is hashed from its collected copy
+    # instead of failing the whole page.
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(
+                paths, dry_run=dry_run, **options):
+            yield name, hashed_name, processed
+            if not isinstance(hashed_name, Exception):
+                names.update((name, hashed_name))
+        if not dry_run:
+            self.compress(name for name in names if name)
+
+    def compress(self, names):
+        for name in names:
+            if not name.lower().endswith(COMPRESSED_EXTENSIONS):
+                continue
+            with self.open(name) as file:
+                data = file.read()
+            for suffix, compress in COMPRESSORS.items():
+                compressed = compress(data)
+                path = self.path(name + suffix)
+                if len(compressed) > len(data) * (1 - MIN_SAVING):
+                    if os.path.exists(path):
+                        os.remove(path)
+                    continue
+                with open(path, 'wb') as file:
+                    file.write(compressed)
@@ -0,0 +1,148 @@
+"""Durable queue of work done after a write, out of the request.
+
+``enqueue_on_commit(func, *args)`` adds a row to the ``core.Task`` table
+once the current transaction commits, and ``manage.py run_workers`` calls
+``func(*args)`` later from a pool of threads or processes. The arguments
+must be JSON serializable; tasks receive ids and load fresh objects.
+
+A task that raises is retried up to ``TASKS_MAX_ATTEMPTS`` times, waiting
+``TASKS_RETRY_DELAY`` seconds doubled on every attempt, up to
+``TASKS_RETRY_MAX_DELAY``. A worker that dies mid-task loses its claim after
+``TASKS_LEASE`` seconds and the task runs again, so tasks must be safe to
+repeat.
+
+Tasks given the same ``key`` are coalesced: no new row is added while one
+with that key still waits to start, as it will see the latest state
+anyway.
+
+With ``TASKS_EAGER`` the function is called at once in the calling thread,
+as the tests do.
+"""
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .db import immediate_atomic
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+
+def get_task_name(func):
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def enqueue(func, *args, key='', delay=0, max_attempts=None):
+    """Queue ``func(*args)``; return the new task, None if coalesced."""
+    if settings.TASKS_EAGER:
+        func(*args)
+        return None
+    with immediate_atomic():
+        if key and Task.objects.filter(key=key, status=Task.PENDING).exists():
+            return None
+        return Task.objects.create(
+            name=get_task_name(func),
+            args=json.dumps(args),
+            key=key,
+            max_attempts=max_attempts or settings.TASKS_MAX_ATTEMPTS,
+            run_at=timezone.now() + timedelta(seconds=delay),
+        )
+
+
+def enqueue_on_commit(func, *args, **kwargs):
+    """``enqueue()`` once the current transaction commits."""
+    if settings.TASKS_EAGER:
+        enqueue(func, *args, **kwargs)
+    else:
+        transaction.on_commit(lambda: enqueue(func, *args, **kwargs))
+
+
+def get_retry_delay(attempts):
+    """Seconds before the next attempt, with jitter spreading retries."""
+    delay = min(
+        settings.TASKS_RETRY_DELAY * 2 ** (attempts - 1),
+        settings.TASKS_RETRY_MAX_DELAY,
+    )
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class Worker:
+    """Claims due tasks in batches and runs them in the current thread."""
+
+    def __init__(self, batch_size=10):
+        self.batch_size = batch_size
+        self.name = (
+            f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}')
+
+    def claim(self):
+        now = timezone.now()
+        due = (
+            Q(status=Task.PENDING, run_at__lte=now)
+            # Claims of workers that died mid-task.
+            | Q(status=Task.RUNNING, locked_until__lt=now)
+        )
+        with immediate_atomic():
+            ids = list(
+                Task.objects.filter(due).order_by('run_at')
+                .values_list('pk', flat=True)[:self.batch_size]
+            )
+            Task.objects.filter(pk__in=ids).update(
+                status=Task.RUNNING,
+                locked_by=self.name,
+                locked_until=now + timedelta(seconds=settings.TASKS_LEASE),
+                attempts=F('attempts') + 1,
+            )
+        return list(
+            Task.objects.filter(pk__in=ids, locked_by=self.name)
+            .order_by('run_at')
+        )
+
+    def run_task(self, task):
+        """Run a claimed task; return whether it succeeded."""
+        claimed = Task.objects.filter(pk=task.pk, locked_by=self.name)
+        try:
+            if task.attempts > task.max_attempts:
+                raise RuntimeError('Обработчик не завершил задачу')
+            import_string(task.name)(*task.get_args())
+        except Exception:
+            logger.exception('Задача %s завершилась с ошибкой', task)
+            error = traceback.format_exc()
+            if task.attempts >= task.max_attempts:
+                claimed.update(status=Task.FAILED, last_error=error)
+            else:
+                claimed.update(
+                    status=Task.PENDING,
+                    run_at=timezone.now() + timedelta(
+                        seconds=get_retry_delay(task.attempts)),
+                    last_error=error,
+                )
+            return False
+        claimed.delete()
+        return True
+
+    def run_once(self):
+        """Run one batch of due tasks; return how many were claimed."""
+        tasks = self.claim()
+        for task in tasks:
+            self.run_task(task)
+        return len(tasks)
+
+    def run(self, stop, poll_interval=1):
+        """Run tasks until ``stop`` is set, polling when none are due."""
+        try:
+            while not stop.is_set():
+                if not self.run_once():
+                    stop.wait(poll_interval)
+        finally:
+            connections.close_all()
@@ -1,6 +1,43 @@
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import timedelta
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock
+from wsgiref.util import setup_testing_defaults
 
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.test import (
+    Client,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+)
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import perf
+from core.backends.cache import SQLiteCache
+from core.cache import bump_versions
+from core.db import immediate_atomic
+from core.models import Task
+from core.querybudget import QueryBudgetExceeded, query_budget
+from core.ratelimit import hit, parse_rate
+from core.tasks import Worker, enqueue
+from core.wsgi import StaticFilesApplication
+from posts import timeline
+from posts.models import User, Comment, Post
+from posts.search import search_posts
 
 
 class ViewTestClass(TestCase):
@@ -8,3 +45,544 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class PerformanceMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='author')
+        Post.objects.create(text='Пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        perf.registry.reset()
+        self.addCleanup(perf.registry.reset)
+
+    @override_settings(PERF_SAMPLE_RATE=1)
+    def test_sampled_requests_are_measured(self):
+        """Измеренные запросы попадают в гистограммы и Server-Timing."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertIn('sql;dur=', response['Server-Timing'])
+        self.assertIn('misses', response['Server-Timing'])
+        self.client.get(reverse('posts:index'))
+        stats = perf.registry.snapshot()['posts:index']
+        self.assertEqual(stats['wall_time']['count'], 2)
+        self.assertGreater(stats['sql_count']['max'], 0)
+        self.assertGreater(stats['template_time']['max'], 0)
+        self.assertGreater(stats['cache_hits']['max'], 0)
+
+    def test_requests_are_not_measured_when_sampling_is_off(self):
+        """Без выборки запросы не измеряются."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(perf.registry.snapshot(), {})
+
+    @override_settings(PERF_SAMPLE_RATE=1)
+    def test_stats_are_available_to_staff_only(self):
+        """Гистограммы доступны только персоналу."""
+        url = reverse('perf_stats')
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.FOUND)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn('posts:index', response.json()['views'])
+        self.assertIn('hits', response.json()['cache'])
+
+
+class QueryBudgetTest(TestCase):
+    @override_settings(QUERY_BUDGETS={'posts:index': 2})
+    def test_exceeded_budget_fails(self):
+        """Превышение бюджета запросов проваливает тест."""
+        with query_budget('posts:index'):
+            User.objects.count()
+            User.objects.count()
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget('posts:index'):
+                for _ in range(3):
+                    User.objects.count()
+
+    def test_url_without_budget_fails(self):
+        """Проверка страницы без бюджета запросов проваливает тест."""
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget('posts:missing'):
+                pass
+
+
+class TunedSQLiteBackendTest(SimpleTestCase):
+    """Настройки соединений SQLite на отдельном файле базы."""
+
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.path = os.path.join(tmp_dir, 'tuned.sqlite3')
+        connections.databases['tuned'] = {
+            'ENGINE': 'core.backends.sqlite3',
+            'NAME': self.path,
+            'OPTIONS': {
+                'pragmas': {'journal_mode': 'wal', 'busy_timeout': 1000},
+                'immediate_transactions': True,
+            },
+        }
+        self.addCleanup(connections.databases.pop, 'tuned')
+        self.connection = connections['tuned']
+        self.addCleanup(connections.__delitem__, 'tuned')
+        self.addCleanup(self.connection.close)
+        with self.connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id integer)')
+
+    def is_locked(self):
+        other = sqlite3.connect(self.path, timeout=0)
+        try:
+            other.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError:
+            return True
+        finally:
+            other.close()
+        return False
+
+    def test_pragmas_are_applied(self):
+        """Прагмы из OPTIONS применяются к новому соединению."""
+        with self.connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone(), ('wal',))
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone(), (1000,))
+
+    def test_immediate_atomic_takes_write_lock(self):
+        """immediate_atomic берет блокировку записи в начале транзакции."""
+        with immediate_atomic(using='tuned'):
+            self.assertTrue(self.is_locked())
+        self.assertFalse(self.is_locked())
+        with transaction.atomic(using='tuned'):
+            with self.connection.cursor() as cursor:
+                cursor.execute('SELECT * FROM item')
+            self.assertFalse(self.is_locked())
+
+
+class StaticFilesTest(SimpleTestCase):
+    """Собранная статика с хешами в именах и сжатыми копиями."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(
+            STATIC_ROOT=cls.static_root,
+            STATICFILES_STORAGE=(
+                'core.storage.CompressedManifestStaticFilesStorage'),
+        )
+        cls.settings_override.enable()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.static_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.application = StaticFilesApplication(self.django_application)
+
+    @staticmethod
+    def django_application(environ, start_response):
+        start_response('404 Not Found', [])
+        return [b'django']
+
+    def get(self, path, **headers):
+        environ = {'PATH_INFO': path, **headers}
+        setup_testing_defaults(environ)
+        response = {}
+
+        def start_response(status, headers):
+            response['status'] = status
+            response['headers'] = dict(headers)
+
+        body = self.application(environ, start_response)
+        response['body'] = b''.join(body)
+        if hasattr(body, 'close'):
+            body.close()
+        return response
+
+    def test_names_are_hashed(self):
+        """Ссылки ведут на файлы с хешем, и без записи в манифесте."""
+        url = staticfiles_storage.url('css/bootstrap.min.css')
+        self.assertRegex(url, r'^/static/css/bootstrap\.min\.\w{12}\.css$')
+        with open(os.path.join(self.static_root, 'css', 'extra.css'),
+                  'w') as file:
+            file.write('body {}')
+        self.assertRegex(
+            staticfiles_storage.url('css/extra.css'),
+            r'^/static/css/extra\.\w{12}\.css$')
+
+    def test_hashed_files_are_immutable(self):
+        """Файлы с хешем кэшируются навсегда, сжатые отдаются по запросу."""
+        url = staticfiles_storage.url('css/bootstrap.min.css')
+        response = self.get(url, HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response['status'], '200 OK')
+        headers = response['headers']
+        self.assertIn('immutable', headers['Cache-Control'])
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        with staticfiles_storage.open('css/bootstrap.min.css') as file:
+            original = file.read()
+        self.assertLess(len(response['body']), len(original))
+        response = self.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['headers']['Content-Encoding'], 'br')
+        plain = self.get(url)
+        self.assertNotIn('Content-Encoding', plain['headers'])
+        self.assertEqual(plain['body'], original)
+        cached = self.get(url, HTTP_IF_NONE_MATCH=plain['headers']['ETag'])
+        self.assertEqual(cached['status'], '304 Not Modified')
+        self.assertEqual(cached['body'], b'')
+
+    def test_unhashed_and_unknown_paths(self):
+        """Файлы без хеша кэшируются ненадолго, прочее уходит в Django."""
+        response = self.get('/static/img/logo.png')
+        self.assertEqual(response['headers']['Cache-Control'],
+                         f'public, max-age={settings.STATIC_MAX_AGE}')
+        self.assertNotIn('Vary', response['headers'])
+        self.assertEqual(self.get('/static/missing.css')['body'], b'django')
+        self.assertEqual(self.get('/')['body'], b'django')
+
+
+def increment(path, times):
+    cache = SQLiteCache(path, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    """Общий кэш в отдельном файле SQLite."""
+
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.path = os.path.join(tmp_dir, 'cache.sqlite3')
+
+    def make_cache(self, **options):
+        options.setdefault('ACCESS_RESOLUTION', 0)
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_entries_are_shared(self):
+        """Записи видны всем экземплярам кэша на одном файле."""
+        cache, other = self.make_cache(), self.make_cache()
+        cache.set('post', {'text': 'Пост'})
+        cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(other.get('post'), {'text': 'Пост'})
+        self.assertEqual(other.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        other.delete('post')
+        self.assertIsNone(cache.get('post'))
+        self.assertTrue(cache.has_key('a'))
+
+    def test_add_and_expiry(self):
+        """add() не перезаписывает живую запись, истекшие не видны."""
+        cache = self.make_cache()
+        self.assertTrue(cache.add('key', 1))
+        self.assertFalse(cache.add('key', 2))
+        self.assertEqual(cache.get('key'), 1)
+        cache.set('key', 3, timeout=-1)
+        self.assertIsNone(cache.get('key'))
+        self.assertFalse(cache.has_key('key'))
+        self.assertFalse(cache.touch('key'))
+        self.assertTrue(cache.add('key', 4))
+        self.assertEqual(cache.get('key'), 4)
+
+    def test_incr_is_atomic_across_processes(self):
+        """incr() из нескольких процессов не теряет увеличений."""
+        cache = self.make_cache()
+        with self.assertRaises(ValueError):
+            cache.incr('counter')
+        cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=increment, args=(self.path, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(cache.get('counter'), 200)
+        self.assertEqual(cache.decr('counter', 10), 190)
+
+    def test_least_recently_read_are_evicted(self):
+        """Сверх MAX_ENTRIES вытесняются давно прочитанные записи."""
+        cache = self.make_cache(MAX_ENTRIES=4, CULL_FREQUENCY=2)
+        for key in 'abcd':
+            cache.set(key, key)
+            time.sleep(0.01)
+        cache.get('a')
+        cache.set('e', 'e')
+        self.assertEqual(sorted(cache.get_many('abcde')), ['a', 'd', 'e'])
+        self.assertEqual(cache.get_stats()['entries'], 3)
+
+    def test_size_is_capped(self):
+        """Сверх MAX_SIZE записи вытесняются до размера под пределом."""
+        cache = self.make_cache(MAX_SIZE=10000)
+        for key in range(10):
+            cache.set(key, b'x' * 2000)
+            time.sleep(0.01)
+        stats = cache.get_stats()
+        self.assertLessEqual(stats['size'], 10000)
+        self.assertTrue(cache.has_key(9))
+        self.assertFalse(cache.has_key(0))
+
+    def test_stats(self):
+        """Попадания и промахи всех экземпляров собираются в файле."""
+        cache, other = self.make_cache(), self.make_cache()
+        cache.set('key', 'value')
+        cache.get('key')
+        other.get_many(['key', 'missing'])
+        other.flush_stats()
+        stats = cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+        self.assertEqual(stats['entries'], 1)
+        cache.clear()
+        stats = cache.get_stats()
+        self.assertEqual((stats['entries'], stats['size']), (0, 0))
+        self.assertIsNone(stats['hit_rate'])
+
+
+def failing_task(message):
+    raise ValueError(message)
+
+
+@override_settings(TASKS_EAGER=False)
+class TaskQueueTest(TransactionTestCase):
+    """Очередь задач, выполняемых после записи."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='author')
+
+    def test_writes_queue_tasks_on_commit(self):
+        """Индексация постов и комментариев выполняется обработчиком."""
+        post = Post.objects.create(text='Уникальный пост', author=self.user)
+        post.text = 'Уникальный пост после правки'
+        post.save()
+        with transaction.atomic():
+            Comment.objects.create(
+                post=post, author=self.user, text='Особый комментарий')
+            self.assertFalse(Task.objects.filter(
+                name='posts.tasks.index_comment').exists())
+        self.assertEqual(
+            sorted(Task.objects.values_list('name', flat=True)),
+            ['posts.tasks.fan_out_post', 'posts.tasks.index_comment',
+             'posts.tasks.index_post'])
+        self.assertEqual(len(search_posts('уникальный', 10)), 0)
+        Worker().run_once()
+        self.assertFalse(Task.objects.exists())
+        for query in ('правки', 'особый'):
+            with self.subTest(query=query):
+                self.assertEqual(
+                    [hit.post for hit in search_posts(query, 10)], [post])
+
+    def test_failed_task_is_retried_with_backoff(self):
+        """Задача с ошибкой повторяется позже, затем помечается ошибочной."""
+        task = enqueue(failing_task, 'Сбой', max_attempts=2)
+        worker = Worker()
+        with self.assertLogs('core.tasks', 'ERROR'):
+            self.assertEqual(worker.run_once(), 1)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (Task.PENDING, 1))
+        self.assertGreater(task.run_at, timezone.now())
+        self.assertIn('ValueError: Сбой', task.last_error)
+        self.assertEqual(worker.run_once(), 0)
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs('core.tasks', 'ERROR'):
+            worker.run_once()
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (Task.FAILED, 2))
+
+    def test_same_key_is_queued_once(self):
+        """Задача с ключом не дублируется, пока ожидает выполнения."""
+        first = enqueue(failing_task, 'Сбой', key='key')
+        self.assertIsNone(enqueue(failing_task, 'Сбой', key='key'))
+        Task.objects.filter(pk=first.pk).update(status=Task.RUNNING)
+        self.assertIsNotNone(enqueue(failing_task, 'Сбой', key='key'))
+
+    def test_expired_claims_run_again(self):
+        """Задачу упавшего обработчика забирает другой."""
+        enqueue(failing_task, 'Сбой')
+        self.assertEqual(len(Worker().claim()), 1)
+        self.assertEqual(Worker().claim(), [])
+        Task.objects.update(locked_until=timezone.now() - timedelta(1))
+        self.assertEqual(len(Worker().claim()), 1)
+
+    def test_run_workers_once(self):
+        """run_workers --once выполняет готовые задачи и завершается."""
+        Post.objects.create(text='Пост', author=self.user)
+        out = StringIO()
+        call_command('run_workers', once=True, stdout=out)
+        # Индексация и рассылка подписчикам.
+        self.assertIn('Выполнено задач: 2', out.getvalue())
+        self.assertFalse(Task.objects.exists())
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(TransactionTestCase):
+    """Чтение страниц из реплики в отдельном файле SQLite."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.databases['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.replica_dir, 'replica.sqlite3'),
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections.databases['replica']
+        if hasattr(connections._connections, 'replica'):
+            delattr(connections._connections, 'replica')
+        shutil.rmtree(cls.replica_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='author')
+        self.replicated_post = Post.objects.create(
+            text='Пост из реплики', author=self.user)
+        self.replicate()
+        self.fresh_post = Post.objects.create(
+            text='Свежий пост', author=self.user)
+        self.auth_client = Client()
+        self.auth_client.force_login(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def replicate(self):
+        """Копирует основную базу в реплику."""
+        primary = connections['default']
+        primary.ensure_connection()
+        replica = connections['replica']
+        replica.close()
+        target = sqlite3.connect(replica.settings_dict['NAME'])
+        try:
+            primary.connection.backup(target)
+        finally:
+            target.close()
+
+    def test_read_views_use_replica(self):
+        """Страницы только для чтения берут данные из реплики."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Пост из реплики')
+        self.assertNotContains(response, 'Свежий пост')
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.fresh_post.pk,)))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_lagging_replica_keeps_timeline(self):
+        """Отставание реплики не сбрасывает ленту главной страницы."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        backend = timeline.get_backend()
+        self.assertEqual(backend.get_total(timeline.GLOBAL_TIMELINE), 2)
+        bump_versions('posts')
+        response = self.client.get(url)
+        self.assertContains(response, 'Пост из реплики')
+        self.assertNotContains(response, 'Свежий пост')
+        self.assertEqual(backend.get_total(timeline.GLOBAL_TIMELINE), 2)
+
+    def test_write_views_use_primary(self):
+        """Страницы с формами читают и пишут в основную базу."""
+        response = self.auth_client.get(
+            reverse('posts:post_edit', args=(self.fresh_post.pk,)))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.auth_client.post(
+            reverse('posts:add_comment', args=(self.fresh_post.pk,)),
+            data={'text': 'Комментарий'},
+        )
+        self.assertTrue(
+            Comment.objects.using('default').filter(
+                post=self.fresh_post).exists())
+        self.assertFalse(
+            Comment.objects.using('replica').exists())
+
+    def test_reads_pinned_to_primary_after_write(self):
+        """После записи пользователь какое-то время читает основную базу."""
+        url = reverse('posts:post_detail', args=(self.fresh_post.pk,))
+        self.assertEqual(
+            self.auth_client.get(url).status_code, HTTPStatus.NOT_FOUND)
+        self.auth_client.post(
+            reverse('posts:add_comment', args=(self.replicated_post.pk,)),
+            data={'text': 'Комментарий'},
+        )
+        self.assertEqual(self.auth_client.get(url).status_code, HTTPStatus.OK)
+        self.assertEqual(
+            self.client.get(url).status_code, HTTPStatus.NOT_FOUND)
+        expired = time.time() + settings.REPLICA_PIN_TIMEOUT + 1
+        with mock.patch('core.middleware.time.time', return_value=expired):
+            cache.clear()
+            self.assertEqual(
+                self.auth_client.get(url).status_code, HTTPStatus.NOT_FOUND)
+
+
+@override_settings(RATE_LIMITS={
+    'posts:post_create': {'rate': '2/m'},
+    'users:login': {'rate': '1/m', 'key': 'ip'},
+})
+class RateLimitTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='author')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('10/m'), (10, 60))
+        self.assertEqual(parse_rate('100/5m'), (100, 300))
+        for rate in ('10', '0/m', '10/0s', '10/w'):
+            with self.subTest(rate=rate):
+                with self.assertRaises(ImproperlyConfigured):
+                    parse_rate(rate)
+
+    def test_sliding_window(self):
+        """Запросы прошлого окна учитываются пропорционально."""
+        self.assertIsNone(hit('scope', 2, 60, now=60))
+        self.assertIsNone(hit('scope', 2, 60, now=61))
+        self.assertEqual(hit('scope', 2, 60, now=62), 88)
+        # Половина прошлого окна еще внутри скользящего.
+        self.assertIsNone(hit('scope', 2, 60, now=150))
+        self.assertEqual(hit('scope', 2, 60, now=151), 29)
+        self.assertIsNone(hit('scope', 2, 60, now=180))
+        self.assertIsNone(hit('other', 2, 60, now=62))
+
+    def test_writes_over_limit_get_429(self):
+        """Лишние запросы отклоняются с заголовком Retry-After."""
+        url = reverse('posts:post_create')
+        for text in ('Первый', 'Второй', 'Третий'):
+            response = self.client.post(url, {'text': text})
+        self.assertEqual(response.status_code, HTTPStatus.TOO_MANY_REQUESTS)
+        self.assertTemplateUsed(response, 'core/429.html')
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(Post.objects.count(), 2)
+        # Чтение не ограничено, другой пользователь считается отдельно.
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.OK)
+        other = Client()
+        other.force_login(User.objects.create(username='other'))
+        response = other.post(url, {'text': 'Четвертый'})
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_anonymous_limits_are_per_address(self):
+        """Анонимные запросы ограничиваются по адресу клиента."""
+        url = reverse('users:login')
+        data = {'username': 'author', 'password': 'wrong'}
+        client = Client()
+        self.assertEqual(
+            client.post(url, data).status_code, HTTPStatus.OK)
+        self.assertEqual(
+            client.post(url, data).status_code,
+            HTTPStatus.TOO_MANY_REQUESTS)
+        response = client.post(url, data, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
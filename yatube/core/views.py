@@ -1,8 +1,22 @@
+import time
+
 from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import Http404, JsonResponse
 from django.shortcuts import render
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.views.generic.list import ListView
 from django.views.generic.detail import SingleObjectMixin
 
+from . import perf
+from .db import immediate_atomic
+from .cache import get_last_modified, get_versioned_digest
+from .pagination import CountedPaginator, CursorPaginator, InvalidCursor
+from .routers import get_replica
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -16,20 +30,198 @@ def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
 
 
+def too_many_requests(request, retry_after):
+    response = render(
+        request, 'core/429.html', {'retry_after': retry_after}, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
 
 
-class DetailListView(SingleObjectMixin, ListView):
+@staff_member_required
+def perf_stats(request):
+    """Histograms of the sampled requests served by this process.
+
+    A POST starts them over. The cache statistics are added when the
+    backend keeps them, as ``core.backends.cache.SQLiteCache`` does.
+    """
+    if request.method == 'POST':
+        perf.registry.reset()
+    stats = {
+        'sample_rate': settings.PERF_SAMPLE_RATE,
+        'views': perf.registry.snapshot(),
+    }
+    if hasattr(cache, 'get_stats'):
+        stats['cache'] = cache.get_stats()
+    return JsonResponse(stats)
+
+
+class VersionedCacheMixin:
+    """Caches rendered GET responses until one of their scopes is bumped.
+
+    Views list the version scopes their content depends on in
+    ``get_cache_scopes()``; signal handlers bump those scopes on writes, so
+    pages can be cached for long and are never served stale. Anonymous and
+    authenticated responses are cached separately, the latter per session
+    because the header and forms differ per user.
+
+    The same versions give every response an ``ETag`` and the time of the
+    latest bump its ``Last-Modified`` once that second is over, so
+    conditional requests are answered with 304 before any query runs or
+    anything is rendered.
+    """
+
+    cache_timeout = settings.PAGE_CACHE_TIMEOUT
+    cache_key_prefix = 'page'
+
+    def get_cache_scopes(self):
+        return ()
+
+    def get_cache_timeout(self):
+        if get_replica():
+            # Versions are bumped on write, a lagging replica may still
+            # render the old data under the new version.
+            return min(
+                self.cache_timeout, settings.REPLICA_PAGE_CACHE_TIMEOUT)
+        return self.cache_timeout
+
+    def get_cache_variant(self):
+        user = self.request.user
+        if not user.is_authenticated:
+            return 'anonymous'
+        return f'user:{user.pk}:{self.request.session.session_key}'
+
+    def get_page_digest(self):
+        return get_versioned_digest(
+            (
+                self.request.resolver_match.view_name,
+                self.request.get_full_path(),
+                self.get_cache_variant(),
+            ),
+            self.get_cache_scopes(),
+        )
+
+    def is_etag_weak(self):
+        # Forms rendered for authenticated users carry a CSRF token masked
+        # differently on every render, so their pages are only equivalent.
+        return self.request.user.is_authenticated
+
+    def get_validators(self, digest):
+        etag = f'"{digest}"'
+        if self.is_etag_weak():
+            etag = f'W/{etag}'
+        last_modified = get_last_modified(self.get_cache_scopes())
+        # HTTP dates are whole seconds, so a write later within the second
+        # of the latest one would keep the date. Until that second is over
+        # only the ETag tells the versions apart.
+        if last_modified is None or int(last_modified) >= int(time.time()):
+            return etag, None
+        return etag, int(last_modified)
+
+    def set_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        digest = self.get_page_digest()
+        key = f'{self.cache_key_prefix}:{digest}'
+        # A lagging replica may render old data under the current versions,
+        # clients must not be told it is unchanged.
+        validate = not get_replica()
+        if validate:
+            etag, last_modified = self.get_validators(digest)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                return self.set_validators(response, etag, last_modified)
+        response = cache.get(key)
+        perf.count('cache_misses' if response is None else 'cache_hits')
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                timeout = self.get_cache_timeout()
+                if hasattr(response, 'render') and callable(response.render):
+                    response.add_post_render_callback(
+                        lambda r: cache.set(key, r, timeout))
+                else:
+                    cache.set(key, response, timeout)
+        if validate and response.status_code == 200:
+            self.set_validators(response, etag, last_modified)
+        return response
+
+
+class ImmediateTransactionMixin:
+    """Handles POST requests in a transaction taking the write lock first.
+
+    Under SQLite concurrent writers then queue for the lock up to the busy
+    timeout instead of failing when they upgrade a read transaction.
+    """
+
+    def post(self, request, *args, **kwargs):
+        with immediate_atomic():
+            return super().post(request, *args, **kwargs)
+
+
+class CursorPaginationMixin:
+    """Switches a list view to keyset pagination when enabled."""
+
+    cursor_pagination = False
+    cursor_kwarg = 'cursor'
+    cursor_ordering = ('-created', '-pk')
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.cursor_pagination:
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size, self.cursor_ordering)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+
+class DetailListView(CursorPaginationMixin, SingleObjectMixin, ListView):
     paginate_by = settings.POSTS_PER_PAGE
+    paginator_class = CountedPaginator
     general_object_model = None
     general_object_context_name = None
     relate_objects_name = None
+    # Dotted path to a counter on the general object that the paginator
+    # uses instead of running COUNT(*) over the related objects.
+    relate_objects_count_name = None
 
     def get(self, request, *args, **kwargs):
-        self.object = self.get_object(self.general_object_model.objects.all())
+        self.object = self.get_object(self.get_general_queryset())
         return super().get(request, *args, **kwargs)
 
+    def get_general_queryset(self):
+        return self.general_object_model.objects.all()
+
+    def get_relate_objects_count(self):
+        if self.relate_objects_count_name is None:
+            return None
+        value = self.object
+        try:
+            for name in self.relate_objects_count_name.split('.'):
+                value = getattr(value, name)
+        except ObjectDoesNotExist:
+            return None
+        return value
+
+    def get_paginator(self, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True, **kwargs):
+        kwargs.setdefault('count', self.get_relate_objects_count())
+        return super().get_paginator(
+            queryset, per_page, orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page, **kwargs)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context[self.general_object_context_name] = self.object
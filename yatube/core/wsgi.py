@@ -0,0 +1,135 @@
+"""WSGI application serving the collected static files itself.
+
+Files under ``STATIC_ROOT`` are indexed once at startup and answered
+before Django sees the request: the ``.br`` or ``.gz`` variant written by
+``core.storage`` when the client accepts it, and ``Cache-Control:
+immutable`` for a year on the hashed names listed in the manifest, whose
+URLs change with their contents. Other names are cached for
+``STATIC_MAX_AGE`` seconds. Anything else goes to the wrapped application.
+"""
+import mimetypes
+import os
+from email.utils import formatdate
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+# Preferred first.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def accepted_encodings(header):
+    """Content codings of an ``Accept-Encoding`` header, minus ``q=0``."""
+    encodings = set()
+    for part in header.split(','):
+        coding, *params = part.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            encodings.add(coding.strip().lower())
+    return encodings
+
+
+class StaticFile:
+    def __init__(self, path, immutable, max_age):
+        self.content_type = (
+            mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        if self.content_type.startswith('text/'):
+            self.content_type += '; charset=utf-8'
+        self.cache_control = (
+            f'public, max-age={IMMUTABLE_MAX_AGE}, immutable' if immutable
+            else f'public, max-age={max_age}')
+        self.variants = {None: self.stat(path)}
+        for encoding, suffix in ENCODINGS:
+            if os.path.isfile(path + suffix):
+                self.variants[encoding] = self.stat(path + suffix)
+
+    @staticmethod
+    def stat(path):
+        stat = os.stat(path)
+        return {
+            'path': path,
+            'size': stat.st_size,
+            'etag': f'"{int(stat.st_mtime):x}-{stat.st_size:x}"',
+            'last_modified': formatdate(stat.st_mtime, usegmt=True),
+        }
+
+    def get_variant(self, accept_encoding):
+        """Encoding and file to send for an ``Accept-Encoding`` header."""
+        if len(self.variants) > 1:
+            accepted = accepted_encodings(accept_encoding)
+            for encoding, _ in ENCODINGS:
+                if encoding in accepted and encoding in self.variants:
+                    return encoding, self.variants[encoding]
+        return None, self.variants[None]
+
+
+class StaticFilesApplication:
+    def __init__(self, application, root=None, prefix=None, max_age=None):
+        self.application = application
+        self.root = root or settings.STATIC_ROOT
+        self.prefix = prefix or settings.STATIC_URL
+        if max_age is None:
+            max_age = getattr(settings, 'STATIC_MAX_AGE', 60)
+        self.files = self.find_files(max_age)
+
+    def find_files(self, max_age):
+        if not self.root or not os.path.isdir(self.root):
+            return {}
+        hashed_names = set(getattr(staticfiles_storage, 'hashed_files', {})
+                           .values())
+        suffixes = tuple(suffix for _, suffix in ENCODINGS)
+        files = {}
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                if filename.endswith(suffixes) and os.path.isfile(
+                        os.path.splitext(path)[0]):
+                    continue
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                files[self.prefix + name] = StaticFile(
+                    path, name in hashed_names, max_age)
+        return files
+
+    def __call__(self, environ, start_response):
+        static_file = self.files.get(environ.get('PATH_INFO', ''))
+        if static_file is None:
+            return self.application(environ, start_response)
+        method = environ['REQUEST_METHOD']
+        if method not in ('GET', 'HEAD'):
+            start_response('405 Method Not Allowed', [('Allow', 'GET, HEAD')])
+            return []
+        encoding, variant = static_file.get_variant(
+            environ.get('HTTP_ACCEPT_ENCODING', ''))
+        headers = [
+            ('Cache-Control', static_file.cache_control),
+            ('ETag', variant['etag']),
+            ('Last-Modified', variant['last_modified']),
+        ]
+        if len(static_file.variants) > 1:
+            headers.append(('Vary', 'Accept-Encoding'))
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and (if_none_match.strip() == '*'
+                              or variant['etag'] in if_none_match):
+            start_response('304 Not Modified', headers)
+            return []
+        headers += [
+            ('Content-Type', static_file.content_type),
+            ('Content-Length', str(variant['size'])),
+        ]
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        start_response('200 OK', headers)
+        if method == 'HEAD':
+            return []
+        file_wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+        return file_wrapper(open(variant['path'], 'rb'))
@@ -1,6 +1,21 @@
 from django.contrib import admin
+from django.http import StreamingHttpResponse
 
-from .models import Group, Post, Comment
+from .export import FORMATS, get_export_querysets, iter_records
+from .models import Group, Post, Comment, Follow
+from .search import get_backend
+
+
+def export_response(posts, export_format):
+    """Selected posts with their comments, groups and authors as a stream."""
+    serialize, content_type = FORMATS[export_format]
+    response = StreamingHttpResponse(
+        serialize(iter_records(get_export_querysets(posts=posts))),
+        content_type=content_type,
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="posts.{export_format}"')
+    return response
 
 
 @admin.register(Post)
@@ -16,6 +31,24 @@ class PostAdmin(admin.ModelAdmin):
     search_fields = ('text',)
     list_filter = ('created',)
     empty_value_display = '-пусто-'
+    actions = ('export_ndjson', 'export_csv')
+
+    def export_ndjson(self, request, queryset):
+        return export_response(queryset, 'ndjson')
+
+    export_ndjson.short_description = 'Выгрузить выбранные посты в NDJSON'
+
+    def export_csv(self, request, queryset):
+        return export_response(queryset, 'csv')
+
+    export_csv.short_description = 'Выгрузить выбранные посты в CSV'
+
+    def get_search_results(self, request, queryset, search_term):
+        # The full-text index covers the text, no LIKE scan over it. Words
+        # match from their start, not anywhere inside as with LIKE.
+        if not search_term:
+            return queryset, False
+        return get_backend().filter_queryset(queryset, search_term), False
 
 
 admin.site.register(Group)
@@ -30,3 +63,9 @@ class CommentAdmin(admin.ModelAdmin):
         'author',
         'created',
     )
+
+
+@admin.register(Follow)
+class FollowAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'author')
+    search_fields = ('user__username', 'author__username')
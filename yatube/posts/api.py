@@ -0,0 +1,175 @@
+"""Read-only JSON API, versioned by its URL prefix.
+
+The API views are the HTML views rendering their context as JSON, so they
+share the querysets, pagination, page cache and conditional GET.
+"""
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views import View
+from django.views.generic.list import ListView
+
+from core.views import VersionedCacheMixin
+from .models import Group, Post
+from .views import (
+    CommentListView,
+    GroupView,
+    IndexView,
+    PostDetailView,
+    ProfileView,
+    SearchMixin,
+)
+
+
+def serialize_post(post):
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'created': post.created.isoformat(),
+        'updated': post.updated.isoformat(),
+        'author': post.author.username,
+        'group': post.group.slug if post.group_id else None,
+        'image': post.image.url if post.image else None,
+        'comments_count': post.comments_count,
+        'url': str(post.get_absolute_url()),
+    }
+
+
+def serialize_group(group):
+    return {
+        'slug': group.slug,
+        'title': group.title,
+        'description': group.description,
+        'posts_count': group.posts_count,
+    }
+
+
+def serialize_author(author):
+    stats = getattr(author, 'stats', None)
+    return {
+        'username': author.username,
+        'full_name': author.get_full_name(),
+        'posts_count': stats.posts_count if stats else None,
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+        'author': comment.author.username,
+    }
+
+
+def get_page_url(request, **params):
+    query = request.GET.copy()
+    for name, value in params.items():
+        query[name] = value
+    return f'{request.path}?{query.urlencode()}'
+
+
+def serialize_page(request, page, serialize):
+    """Objects of a numbered or cursor page with links to its neighbours."""
+    data = {'results': [serialize(obj) for obj in page]}
+    if getattr(page, 'is_cursor', False):
+        data['next'] = (get_page_url(request, cursor=page.next_cursor)
+                        if page.has_next() else None)
+        data['previous'] = (get_page_url(request, cursor=page.previous_cursor)
+                            if page.has_previous() else None)
+        return data
+    data['count'] = page.paginator.count
+    data['next'] = (get_page_url(request, page=page.next_page_number())
+                    if page.has_next() else None)
+    data['previous'] = (
+        get_page_url(request, page=page.previous_page_number())
+        if page.has_previous() else None)
+    return data
+
+
+class JsonResponseMixin:
+    """Renders the view context with ``get_data()`` instead of a template."""
+
+    json_dumps_params = {'ensure_ascii': False}
+
+    def get_data(self, context):
+        raise NotImplementedError
+
+    def render_to_response(self, context, **response_kwargs):
+        return JsonResponse(
+            self.get_data(context), json_dumps_params=self.json_dumps_params)
+
+    def is_etag_weak(self):
+        return False
+
+
+class PostListApiView(JsonResponseMixin, IndexView):
+    def get_data(self, context):
+        return serialize_page(
+            self.request, context['page_obj'], serialize_post)
+
+
+class PostApiView(JsonResponseMixin, PostDetailView):
+    embed_comments = False
+
+    def get_queryset(self):
+        return Post.objects.for_listing()
+
+    def get_data(self, context):
+        return {
+            **serialize_post(self.object),
+            'comments': reverse('posts:api_comments', args=(self.object.pk,)),
+        }
+
+
+class CommentListApiView(JsonResponseMixin, CommentListView):
+    def get_data(self, context):
+        return serialize_page(
+            self.request, context['page_obj'], serialize_comment)
+
+
+class GroupListApiView(JsonResponseMixin, VersionedCacheMixin, ListView):
+    queryset = Group.objects.order_by('title')
+
+    def get_cache_scopes(self):
+        # Post counts change with every post.
+        return ('groups', 'posts')
+
+    def get_data(self, context):
+        return {'results': [serialize_group(group)
+                            for group in context['object_list']]}
+
+
+class GroupApiView(JsonResponseMixin, GroupView):
+    def get_data(self, context):
+        return {
+            'group': serialize_group(context['group']),
+            **serialize_page(
+                self.request, context['page_obj'], serialize_post),
+        }
+
+
+class ProfileApiView(JsonResponseMixin, ProfileView):
+    show_following = False
+
+    def get_data(self, context):
+        return {
+            'author': serialize_author(context['author']),
+            **serialize_page(
+                self.request, context['page_obj'], serialize_post),
+        }
+
+
+class SearchApiView(SearchMixin, View):
+    def get(self, request, *args, **kwargs):
+        page = self.get_search_page()
+        next_url = None
+        if page.has_next():
+            next_url = get_page_url(request, cursor=page.next_cursor)
+        return JsonResponse({
+            'query': self.get_search_query(),
+            'results': [
+                {**serialize_post(hit.post), 'snippet': hit.snippet}
+                for hit in page
+            ],
+            'next': next_url,
+        })
@@ -0,0 +1,108 @@
+"""Streaming export of posts, comments, authors and groups.
+
+Rows are read with ``values()`` and ``iterator()``, so neither model
+instances nor whole tables are kept in memory. Every record carries its
+``type``; groups and authors come first, so a reader meets every object
+before the records pointing at it.
+"""
+import csv
+import datetime
+import json
+
+from django.db.models import Q
+
+from .models import User, Comment, Group, Post
+
+CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = {
+    'group': ('id', 'slug', 'title', 'description'),
+    'author': ('id', 'username', 'first_name', 'last_name'),
+    'post': ('id', 'created', 'author_id', 'group_id', 'text', 'image'),
+    'comment': ('id', 'created', 'post_id', 'author_id', 'text'),
+}
+EXPORT_TYPES = tuple(EXPORT_FIELDS)
+
+# A CSV export shares one header between all record types.
+CSV_FIELDS = ('type',) + tuple(dict.fromkeys(
+    field for fields in EXPORT_FIELDS.values() for field in fields))
+
+
+def get_export_querysets(types=EXPORT_TYPES, since=None, after_post_id=None,
+                         after_comment_id=None, posts=None):
+    """Querysets of the exported records as ``(type, queryset)`` pairs.
+
+    ``since`` restricts posts and comments by their creation date, and
+    ``after_post_id`` and ``after_comment_id`` by their ids, which come
+    from separate sequences, to resume an interrupted export. ``posts``
+    restricts the export to these posts, their comments and the groups
+    and authors they refer to.
+    """
+    post_filter = Q()
+    comment_filter = Q()
+    if since is not None:
+        post_filter &= Q(created__gte=since)
+        comment_filter &= Q(created__gte=since)
+    if after_post_id is not None:
+        post_filter &= Q(pk__gt=after_post_id)
+    if after_comment_id is not None:
+        comment_filter &= Q(pk__gt=after_comment_id)
+    querysets = {
+        'group': Group.objects.all(),
+        'author': User.objects.all(),
+        'post': Post.objects.filter(post_filter),
+        'comment': Comment.objects.filter(comment_filter),
+    }
+    if posts is not None:
+        post_ids = posts.values('pk')
+        querysets['group'] = querysets['group'].filter(
+            pk__in=posts.values('group_id'))
+        querysets['author'] = querysets['author'].filter(
+            Q(pk__in=posts.values('author_id'))
+            | Q(pk__in=Comment.objects.filter(
+                post__in=post_ids).values('author_id'))
+        )
+        querysets['post'] = querysets['post'].filter(pk__in=post_ids)
+        querysets['comment'] = querysets['comment'].filter(
+            post__in=post_ids)
+    return [(record_type, querysets[record_type]) for record_type in types]
+
+
+def iter_records(querysets, chunk_size=CHUNK_SIZE):
+    """Records of the querysets as plain dicts, read in chunks by id."""
+    for record_type, queryset in querysets:
+        rows = (
+            queryset.order_by('pk')
+            .values(*EXPORT_FIELDS[record_type])
+            .iterator(chunk_size=chunk_size)
+        )
+        for row in rows:
+            for name, value in row.items():
+                if isinstance(value, datetime.datetime):
+                    row[name] = value.isoformat()
+            yield {'type': record_type, **row}
+
+
+def iter_ndjson(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    """File-like object handing back what ``csv.writer`` writes."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(records):
+    writer = csv.DictWriter(_Echo(), CSV_FIELDS, lineterminator='\n')
+    yield writer.writeheader()
+    for record in records:
+        yield writer.writerow(record)
+
+
+FORMATS = {
+    'ndjson': (iter_ndjson, 'application/x-ndjson'),
+    'csv': (iter_csv, 'text/csv'),
+}
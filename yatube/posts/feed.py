@@ -0,0 +1,128 @@
+"""Personal feeds of the posts of followed authors.
+
+A new post is pushed into an inbox timeline of every follower of its
+author (fan-out on write), so reading a feed takes a page of ids from the
+timeline backend. Authors followed by more than
+``FEED_FANOUT_MAX_FOLLOWERS`` users would make every post cost a write per
+follower; their posts are pulled when a feed is read instead (fan-out on
+read) and merged with the inbox. Either way a feed page runs a fixed
+number of queries, however many authors the user follows.
+
+Inboxes are only updated while they are stored: a missing one is rebuilt
+from the database when read, and follows and authors becoming popular or
+not simply delete the inboxes they affect.
+"""
+from django.conf import settings
+from django.db.models import Sum
+
+from . import timeline
+from .models import AuthorStats, Follow
+
+
+def inbox_timeline(user_id):
+    return f'feed:{user_id}'
+
+
+def is_popular(followers_count):
+    """Whether the posts of an author are fanned out on read."""
+    return followers_count > settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def followed_authors(user_id, popular):
+    """Subquery of the popular or the other authors a user follows."""
+    follows = Follow.objects.filter(user_id=user_id)
+    lookup = {
+        'author__stats__followers_count__gt':
+            settings.FEED_FANOUT_MAX_FOLLOWERS,
+    }
+    if popular:
+        follows = follows.filter(**lookup)
+    else:
+        follows = follows.exclude(**lookup)
+    return follows.values('author_id')
+
+
+def push_post(post):
+    """Add a new post to the stored inboxes of its author's followers."""
+    followers_count = AuthorStats.objects.filter(
+        user_id=post.author_id).values_list('followers_count', flat=True)
+    if is_popular(followers_count.first() or 0):
+        return
+    backend = timeline.get_backend()
+    score = timeline.get_score(post)
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True)
+    for user_id in followers.iterator():
+        backend.add(inbox_timeline(user_id), post.pk, score)
+
+
+def reset_inboxes(author_id):
+    """Drop the inboxes of the followers of an author."""
+    backend = timeline.get_backend()
+    followers = Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True)
+    for user_id in followers.iterator():
+        backend.delete(inbox_timeline(user_id))
+
+
+class FeedSequence:
+    """Lazy post list for ``Paginator`` merging an inbox and popular posts.
+
+    Pages past the inbox cap and inboxes pointing at vanished posts fall
+    back to a scan of the posts of all the followed authors.
+    """
+
+    def __init__(self, user_id, queryset):
+        self.user_id = user_id
+        self.queryset = queryset
+        self.backend = timeline.get_backend()
+        self.inbox = timeline.TimelineSequence(
+            inbox_timeline(user_id),
+            queryset.filter(
+                author_id__in=followed_authors(user_id, popular=False)),
+        )
+        self.popular_posts = queryset.filter(
+            author_id__in=followed_authors(user_id, popular=True))
+
+    def get_fallback_queryset(self):
+        authors = Follow.objects.filter(user_id=self.user_id).values(
+            'author_id')
+        return self.queryset.filter(author_id__in=authors).order_by(
+            '-created', '-pk')
+
+    def count(self):
+        popular = AuthorStats.objects.filter(
+            user_id__in=followed_authors(self.user_id, popular=True),
+        ).aggregate(total=Sum('posts_count'))['total']
+        return self.inbox.count() + (popular or 0)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        stop = index.stop if index.stop is not None else self.count()
+        # The first ``stop`` posts of the feed are among the first ``stop``
+        # of the inbox and of the popular authors.
+        entries = self.backend.get_entries(self.inbox.name, 0, stop)
+        if entries is None and (
+                self.backend.get_total(self.inbox.name) is None):
+            self.inbox.rebuild()
+            entries = self.backend.get_entries(self.inbox.name, 0, stop)
+        if entries is None:
+            return list(self.get_fallback_queryset()[start:stop])
+        popular = self.popular_posts.order_by(
+            '-created', '-pk').values_list('created', 'pk')[:stop]
+        entries = set(entries)
+        entries.update(
+            (created.timestamp(), pk) for created, pk in popular)
+        ids = [
+            post_id for _, post_id in sorted(entries, reverse=True)
+        ][start:stop]
+        posts = self.queryset.in_bulk(ids)
+        if len(posts) != len(ids):
+            self.backend.delete(self.inbox.name)
+            return list(self.get_fallback_queryset()[start:stop])
+        return [posts[post_id] for post_id in ids]
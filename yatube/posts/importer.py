@@ -0,0 +1,371 @@
+"""Bulk import of records in the format written by ``posts.export``.
+
+Records are inserted with ``bulk_create`` in batches, one transaction per
+batch, and refer to each other by their ids in the source. Groups and
+authors are matched by slug and username and their local ids are kept in
+memory, so posts and comments resolve them without queries. The input must
+list groups and authors before the posts and comments pointing at them, as
+an export does. Comments on posts imported earlier point at them with a
+``local_post_id`` instead of a ``post_id``.
+
+Bulk inserts send no signals, so author stats, counters, the search index,
+timelines and cached pages are brought up to date by the importer.
+Thumbnails of imported images are created on first view or by
+``warm_thumbnails``.
+"""
+import csv
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connections, router, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.cache import bump_versions
+from . import feed, search, timeline
+from .export import EXPORT_TYPES
+from .forms import CommentForm, PostForm
+from .models import User, AuthorStats, Comment, Group, Post
+from .sitemaps import post_chunk_scope
+from .signals import (
+    change_author_posts_count,
+    change_counter,
+    change_group_posts_count,
+)
+
+BATCH_SIZE = 1000
+IMAGE_WORKERS = 8
+
+
+def read_records(stream, import_format):
+    """Records of an NDJSON or CSV stream as dicts."""
+    if import_format == 'csv':
+        for row in csv.DictReader(stream):
+            # CSV has no nulls, the columns of other types are left empty.
+            yield {name: value or None for name, value in row.items()}
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def bulk_insert(model, objs):
+    """Insert objects in one statement per chunk and set their ids.
+
+    Rows are inserted raw, as ``loaddata`` saves them: the values set on the
+    objects are kept, ``auto_now_add`` and ``auto_now`` fields included.
+    Must run in a transaction.
+    """
+    if not objs:
+        return
+    connection = connections[router.db_for_write(model)]
+    fields = [
+        field for field in model._meta.concrete_fields
+        if field is not model._meta.auto_field
+    ]
+    batch_size = max(connection.ops.bulk_batch_size(fields, objs), 1)
+    returns_ids = connection.features.can_return_ids_from_bulk_insert
+    queryset = model._base_manager.using(connection.alias)
+    ids = []
+    for start in range(0, len(objs), batch_size):
+        inserted = queryset._insert(
+            objs[start:start + batch_size], fields=fields,
+            return_id=returns_ids, raw=True)
+        if returns_ids:
+            ids.extend(inserted if isinstance(inserted, list) else [inserted])
+    if returns_ids:
+        for obj, pk in zip(objs, ids):
+            obj.pk = pk
+    elif model._meta.auto_field:
+        # SQLite holds the write lock until the commit and hands out
+        # AUTOINCREMENT keys in insertion order, so the batch owns the
+        # largest ids.
+        ids = list(
+            model.objects.using(connection.alias)
+            .order_by('-pk')
+            .values_list('pk', flat=True)[:len(objs)]
+        )
+        for obj, pk in zip(objs, reversed(ids)):
+            obj.pk = pk
+
+
+def parse_created(value):
+    if not value:
+        return timezone.now()
+    created = parse_datetime(value)
+    if created is None:
+        raise ValidationError(f'Некорректная дата: {value}')
+    if timezone.is_naive(created):
+        created = timezone.make_aware(created)
+    return created
+
+
+class Importer:
+    def __init__(self, batch_size=BATCH_SIZE, media_root=None,
+                 workers=IMAGE_WORKERS, log=None):
+        self.batch_size = batch_size
+        self.media_root = media_root
+        self.workers = workers
+        self.log = log or (lambda message: None)
+        # Local ids of the imported objects by their ids in the source.
+        self.ids = {record_type: {} for record_type in EXPORT_TYPES}
+        self.pending = {record_type: [] for record_type in EXPORT_TYPES}
+        self.usernames = {}
+        self.local_posts = set()
+        self.touched_groups = set()
+        self.touched_authors = set()
+        self.touched_posts = set()
+        self.touched_chunks = set()
+        self.counts = Counter()
+        self.errors = Counter()
+        self.elapsed = 0
+
+    @property
+    def rows_per_second(self):
+        total = sum(self.counts.values())
+        return total / self.elapsed if self.elapsed else 0
+
+    def run(self, records):
+        started = time.monotonic()
+        with ThreadPoolExecutor(self.workers) as executor:
+            self.executor = executor
+            for number, record in enumerate(records, 1):
+                self.add(number, record)
+            for record_type in EXPORT_TYPES:
+                self.flush(record_type)
+        self.finish()
+        self.elapsed = time.monotonic() - started
+
+    def error(self, record_type, number, message):
+        self.errors[record_type] += 1
+        self.log(f'Запись {number}: {message}')
+
+    def add(self, number, record):
+        record_type = record.get('type')
+        if record_type not in EXPORT_TYPES:
+            self.error(record_type, number, f'Неизвестный тип {record_type}')
+            return
+        # Everything a record may point at has to be in the database.
+        for earlier_type in EXPORT_TYPES[:EXPORT_TYPES.index(record_type)]:
+            self.flush(earlier_type)
+        build = getattr(self, f'build_{record_type}')
+        try:
+            obj = build(record)
+        except ValidationError as e:
+            self.error(record_type, number, '; '.join(e.messages))
+            return
+        except (KeyError, TypeError, ValueError) as e:
+            self.error(record_type, number, f'Некорректная запись: {e!r}')
+            return
+        pending = self.pending[record_type]
+        pending.append((number, record.get('id'), obj))
+        if len(pending) >= self.batch_size:
+            self.flush(record_type)
+
+    def resolve(self, record_type, record, field):
+        """Local id of an imported object the record points at."""
+        source_id = record[field]
+        try:
+            return self.ids[record_type][int(source_id)]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError(f'{field}: неизвестный id {source_id}')
+
+    def resolve_local_post(self, record):
+        """Id of a post already in the database the record points at."""
+        post_id = record['local_post_id']
+        try:
+            post_id = int(post_id)
+        except (TypeError, ValueError):
+            post_id = None
+        if post_id not in self.local_posts:
+            if (post_id is None
+                    or not Post.objects.filter(pk=post_id).exists()):
+                raise ValidationError(
+                    f'local_post_id: неизвестный id {record["local_post_id"]}')
+            self.local_posts.add(post_id)
+        return post_id
+
+    def build_group(self, record):
+        group = Group(
+            slug=record['slug'],
+            title=record['title'],
+            description=record['description'] or '',
+        )
+        group.clean_fields()
+        return group
+
+    def build_author(self, record):
+        user = User(
+            username=record['username'],
+            first_name=record.get('first_name') or '',
+            last_name=record.get('last_name') or '',
+            password='!',
+        )
+        user.clean_fields()
+        return user
+
+    def build_post(self, record):
+        group_id = None
+        if record.get('group_id') is not None:
+            group_id = self.resolve('group', record, 'group_id')
+        return Post(
+            text=PostForm.base_fields['text'].clean(record['text']),
+            author_id=self.resolve('author', record, 'author_id'),
+            group_id=group_id,
+            image=record.get('image') or '',
+            created=parse_created(record.get('created')),
+            updated=timezone.now(),
+        )
+
+    def build_comment(self, record):
+        if record.get('local_post_id') is not None:
+            post_id = self.resolve_local_post(record)
+        else:
+            post_id = self.resolve('post', record, 'post_id')
+        return Comment(
+            text=CommentForm.base_fields['text'].clean(record['text']),
+            post_id=post_id,
+            author_id=self.resolve('author', record, 'author_id'),
+            created=parse_created(record.get('created')),
+        )
+
+    def flush(self, record_type):
+        batch = self.pending[record_type]
+        if not batch:
+            return
+        self.pending[record_type] = []
+        getattr(self, f'flush_{record_type}')(batch)
+
+    def remember(self, record_type, batch):
+        ids = self.ids[record_type]
+        for _, source_id, obj in batch:
+            if source_id is not None:
+                ids[int(source_id)] = obj.pk
+        self.counts[record_type] += len(batch)
+
+    def insert_missing(self, model, field, batch):
+        """Insert the objects whose ``field`` is not taken yet.
+
+        Objects matching an existing row take over its id. Return the
+        inserted objects.
+        """
+        keys = [getattr(obj, field) for _, _, obj in batch]
+        existing = dict(
+            model.objects.filter(**{f'{field}__in': keys})
+            .values_list(field, 'pk')
+        )
+        new = {}
+        for _, _, obj in batch:
+            key = getattr(obj, field)
+            obj.pk = existing.get(key)
+            if obj.pk is None:
+                new.setdefault(key, obj)
+        with transaction.atomic():
+            bulk_insert(model, list(new.values()))
+        for _, _, obj in batch:
+            if obj.pk is None:
+                # A duplicate within the batch.
+                obj.pk = new[getattr(obj, field)].pk
+        return list(new.values())
+
+    def flush_group(self, batch):
+        self.insert_missing(Group, 'slug', batch)
+        self.remember('group', batch)
+
+    def flush_author(self, batch):
+        with transaction.atomic():
+            users = self.insert_missing(User, 'username', batch)
+            # Bulk inserts skip create_author_stats.
+            bulk_insert(
+                AuthorStats, [AuthorStats(user_id=user.pk) for user in users])
+        for _, _, user in batch:
+            self.usernames[user.pk] = user.username
+        self.remember('author', batch)
+
+    def flush_post(self, batch):
+        if self.media_root:
+            batch = self.copy_images(batch)
+        authors = Counter(post.author_id for _, _, post in batch)
+        groups = Counter(
+            post.group_id for _, _, post in batch if post.group_id is not None)
+        with transaction.atomic():
+            bulk_insert(Post, [post for _, _, post in batch])
+            for author_id, count in authors.items():
+                change_author_posts_count(author_id, count)
+            for group_id, count in groups.items():
+                change_group_posts_count(group_id, count)
+        self.touched_authors.update(authors)
+        self.touched_groups.update(groups)
+        self.touched_chunks.update(
+            post_chunk_scope(post.pk) for _, _, post in batch)
+        self.remember('post', batch)
+
+    def flush_comment(self, batch):
+        posts = Counter(comment.post_id for _, _, comment in batch)
+        with transaction.atomic():
+            bulk_insert(Comment, [comment for _, _, comment in batch])
+            for post_id, count in posts.items():
+                change_counter(
+                    Post.objects.filter(pk=post_id), 'comments_count', count)
+        self.touched_posts.update(posts)
+        self.counts['comment'] += len(batch)
+
+    def copy_image(self, name):
+        """Validate an image like ``PostForm`` and copy it to the storage."""
+        with open(os.path.join(self.media_root, name), 'rb') as f:
+            image = File(f, name=os.path.basename(name))
+            PostForm.base_fields['image'].clean(image)
+            f.seek(0)
+            return default_storage.save(
+                Post._meta.get_field('image').generate_filename(
+                    None, image.name),
+                image,
+            )
+
+    def copy_images(self, batch):
+        with_images = [item for item in batch if item[2].image]
+        futures = [
+            self.executor.submit(self.copy_image, post.image.name)
+            for _, _, post in with_images
+        ]
+        failed = set()
+        for (number, _, post), future in zip(with_images, futures):
+            try:
+                post.image = future.result()
+            except ValidationError as e:
+                failed.add(number)
+                self.error('post', number, '; '.join(e.messages))
+            except OSError as e:
+                failed.add(number)
+                self.error('post', number, f'Изображение недоступно: {e}')
+        return [item for item in batch if item[0] not in failed]
+
+    def finish(self):
+        """Do the work of the signal handlers the bulk inserts skipped."""
+        if not self.counts['post'] and not self.counts['comment']:
+            return
+        with transaction.atomic():
+            search.get_backend().rebuild()
+        backend = timeline.get_backend()
+        backend.delete(timeline.GLOBAL_TIMELINE)
+        for group_id in self.touched_groups:
+            backend.delete(timeline.group_timeline(group_id))
+        for author_id in self.touched_authors:
+            feed.reset_inboxes(author_id)
+        group_slugs = Group.objects.filter(
+            pk__in=self.touched_groups).values_list('slug', flat=True)
+        bump_versions(
+            'posts',
+            'groups',
+            *(f'group:{slug}' for slug in group_slugs),
+            *(f'author:{pk}' for pk in self.touched_authors),
+            *(f'profile:{self.usernames[pk]}' for pk in self.touched_authors),
+            *(f'post:{pk}' for pk in self.touched_posts),
+            *self.touched_chunks,
+        )
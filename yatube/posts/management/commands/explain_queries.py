@@ -0,0 +1,95 @@
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+
+from posts.models import User, Group, Post
+from posts.views import IndexView, GroupView, ProfileView, PostDetailView
+
+# Plan lines that mean the database reads a whole table or sorts the
+# filtered rows itself instead of walking an index in the required order.
+FULL_SCAN_PATTERNS = {
+    'sqlite': (
+        re.compile(r'\bSCAN (TABLE )?\w+$'),
+        re.compile(r'USE TEMP B-TREE FOR (ORDER|GROUP) BY'),
+    ),
+    'postgresql': (
+        re.compile(r'Seq Scan'),
+        re.compile(r'(?<!Incremental )Sort\b'),
+    ),
+    'mysql': (
+        re.compile(r'\bALL\b'),
+        re.compile(r'Using filesort'),
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN для запросов страниц со списками постов '
+        'и сообщает о полных просмотрах таблиц и сортировках без индекса.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Выводить полный план каждого запроса.',
+        )
+
+    def handle(self, *args, **options):
+        patterns = FULL_SCAN_PATTERNS.get(connection.vendor)
+        if patterns is None:
+            raise CommandError(
+                f'EXPLAIN для {connection.vendor} не поддерживается.')
+        problems = []
+        for name, queryset in self.get_querysets():
+            plan = queryset.explain()
+            flagged = [
+                line for line in plan.splitlines()
+                if any(pattern.search(line) for pattern in patterns)
+            ]
+            if options['verbose_plans']:
+                self.stdout.write(plan)
+            if flagged:
+                problems.append(name)
+                self.stdout.write(
+                    self.style.WARNING(f'{name}: полный просмотр'))
+                for line in flagged:
+                    self.stdout.write(f'    {line}')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: OK'))
+        if problems:
+            raise CommandError(
+                'Запросы без подходящего индекса: ' + ', '.join(problems))
+
+    def get_querysets(self):
+        """Yield the page querysets exactly as the views build them.
+
+        The plan does not depend on the looked up values, so unsaved
+        objects stand in for the group, author and post.
+        """
+        per_page = settings.POSTS_PER_PAGE
+        group = Group(pk=0, slug='explain')
+        author = User(pk=0, username='explain')
+        post = Post(pk=0)
+
+        yield 'posts:index', self.get_view(IndexView).get_queryset()[
+            :per_page]
+        yield 'posts:group_list', self.get_view(
+            GroupView, group).get_queryset()[:per_page]
+        yield 'posts:profile', self.get_view(
+            ProfileView, author).get_queryset()[:per_page]
+        yield 'posts:post_detail', self.get_view(
+            PostDetailView).get_queryset().filter(pk=post.pk)
+        yield 'posts:post_detail comments', post.comments.select_related(
+            'author')
+
+    def get_view(self, view_class, general_object=None):
+        view = view_class()
+        view.setup(RequestFactory().get('/'))
+        if general_object is not None:
+            view.object = general_object
+        return view
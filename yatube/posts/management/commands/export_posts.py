@@ -0,0 +1,131 @@
+import argparse
+import contextlib
+import datetime
+import functools
+import gzip
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from posts.export import (
+    CHUNK_SIZE,
+    EXPORT_TYPES,
+    FORMATS,
+    get_export_querysets,
+    iter_records,
+)
+
+
+def since_type(value):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise argparse.ArgumentTypeError(
+                f'Некорректная дата: {value}')
+        moment = datetime.datetime.combine(day, datetime.time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает группы, авторов, посты и комментарии потоком в NDJSON '
+        'или CSV, не загружая таблицы в память.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            default='ndjson',
+        )
+        parser.add_argument(
+            '--output', '-o',
+            default='-',
+            help='Файл выгрузки, по умолчанию стандартный вывод.',
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Сжимать выгрузку; включается для файлов с суффиксом .gz.',
+        )
+        parser.add_argument(
+            '--type',
+            dest='types',
+            action='append',
+            choices=EXPORT_TYPES,
+            help='Выгружать только записи этого типа, можно повторять.',
+        )
+        parser.add_argument(
+            '--since',
+            type=since_type,
+            help='Выгружать посты и комментарии, созданные с этого момента.',
+        )
+        parser.add_argument(
+            '--after-post-id',
+            type=int,
+            help='Выгружать посты с id больше заданного.',
+        )
+        parser.add_argument(
+            '--after-comment-id',
+            type=int,
+            help='Выгружать комментарии с id больше заданного.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        querysets = get_export_querysets(
+            options['types'] or EXPORT_TYPES,
+            since=options['since'],
+            after_post_id=options['after_post_id'],
+            after_comment_id=options['after_comment_id'],
+        )
+        serialize, _ = FORMATS[options['format']]
+        counts = Counter()
+        last_ids = {}
+
+        def records():
+            for record in iter_records(querysets, options['chunk_size']):
+                counts[record['type']] += 1
+                last_ids[record['type']] = record['id']
+                yield record
+
+        output = options['output']
+        compress = options['gzip'] or output.endswith('.gz')
+        with self.open_output(output, compress) as write:
+            for chunk in serialize(records()):
+                write(chunk)
+        # The report must not end up inside the exported data.
+        report = self.stderr if output == '-' else self.stdout
+        for record_type in EXPORT_TYPES:
+            if record_type in counts:
+                report.write(
+                    f'{record_type}: {counts[record_type]}, '
+                    f'последний id {last_ids[record_type]}'
+                )
+
+    @contextlib.contextmanager
+    def open_output(self, path, compress):
+        """Yield a function writing text to the output."""
+        if path == '-' and not compress:
+            yield functools.partial(self.stdout.write, ending='')
+            return
+        if path == '-':
+            # Compressed data goes to the binary stream under the text one.
+            stream = gzip.open(
+                getattr(self.stdout, 'buffer', self.stdout._out), 'wt',
+                encoding='utf-8')
+        elif compress:
+            stream = gzip.open(path, 'wt', encoding='utf-8')
+        else:
+            stream = open(path, 'w', encoding='utf-8', newline='')
+        with stream:
+            yield stream.write
@@ -0,0 +1,78 @@
+import contextlib
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import EXPORT_TYPES, FORMATS
+from posts.importer import BATCH_SIZE, IMAGE_WORKERS, Importer, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает группы, авторов, посты и комментарии из выгрузки '
+        'export_posts пачками в обход сигналов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input',
+            help='Файл NDJSON или CSV, возможно сжатый; - для stdin.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Формат файла, по умолчанию определяется по его суффиксу.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Число записей в одной транзакции.',
+        )
+        parser.add_argument(
+            '--media-root',
+            help=(
+                'Каталог медиафайлов источника, из которого копируются '
+                'изображения; без него имена файлов сохраняются как есть.'
+            ),
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=IMAGE_WORKERS,
+            help='Число потоков, копирующих изображения.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['input']
+        name = path[:-3] if path.endswith('.gz') else path
+        import_format = options['format'] or (
+            'csv' if name.endswith('.csv') else 'ndjson')
+        importer = Importer(
+            batch_size=options['batch_size'],
+            media_root=options['media_root'],
+            workers=options['workers'],
+            log=self.stderr.write,
+        )
+        try:
+            with self.open_input(path) as stream:
+                importer.run(read_records(stream, import_format))
+        except OSError as e:
+            raise CommandError(e)
+        for record_type in EXPORT_TYPES:
+            self.stdout.write(
+                f'{record_type}: загружено {importer.counts[record_type]}, '
+                f'ошибок {importer.errors[record_type]}'
+            )
+        self.stdout.write(
+            f'Записей в секунду: {importer.rows_per_second:.0f} '
+            f'за {importer.elapsed:.1f} с'
+        )
+
+    def open_input(self, path):
+        if path == '-':
+            return contextlib.nullcontext(sys.stdin)
+        if path.endswith('.gz'):
+            return gzip.open(path, 'rt', encoding='utf-8')
+        return open(path, encoding='utf-8', newline='')
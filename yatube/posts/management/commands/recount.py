@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import User, AuthorStats, Comment, Follow, Group, Post
+
+
+def count_related(model, field):
+    """Subquery counting ``model`` rows pointing at the outer row."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает денормализованные счетчики постов и подписчиков '
+        'авторов, постов групп и комментариев постов, исправляя '
+        'расхождения.'
+    )
+
+    counters = (
+        ('авторы', AuthorStats, 'posts_count', Post, 'author'),
+        ('подписчики', AuthorStats, 'followers_count', Follow, 'author'),
+        ('группы', Group, 'posts_count', Post, 'group'),
+        ('посты', Post, 'comments_count', Comment, 'post'),
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created = self.create_missing_stats()
+            if created:
+                self.stdout.write(f'Создана статистика авторов: {created}')
+            for label, model, field, related_model, related_field in (
+                    self.counters):
+                fixed = self.repair(
+                    model, field, count_related(related_model, related_field))
+                self.stdout.write(f'{label}: исправлено {fixed}')
+
+    def create_missing_stats(self):
+        missing = User.objects.filter(stats__isnull=True).values_list(
+            'pk', flat=True)
+        stats = [AuthorStats(user_id=pk) for pk in missing]
+        AuthorStats.objects.bulk_create(stats)
+        return len(stats)
+
+    def repair(self, model, field, actual):
+        drifted = model.objects.annotate(actual=actual).exclude(
+            **{field: F('actual')})
+        count = drifted.count()
+        if count:
+            model.objects.filter(pk__in=drifted.values('pk')).update(
+                **{field: actual})
+        return count
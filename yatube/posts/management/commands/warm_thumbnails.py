@@ -0,0 +1,67 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails
+
+
+def init_worker():
+    # Worker processes started with spawn import nothing of the parent.
+    django.setup()
+
+
+def warm(name):
+    try:
+        return name, generate_thumbnails(name), None
+    except Exception as e:
+        return name, 0, str(e)
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает недостающие миниатюры изображений постов, '
+        'распределяя работу по процессам.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help=(
+                'Число процессов, по умолчанию по числу ядер; '
+                'при 1 миниатюры создаются в текущем процессе.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        names = list(
+            Post.objects.exclude(image='')
+            .order_by()
+            .values_list('image', flat=True)
+            .distinct()
+        )
+        thumbnails = errors = 0
+        for name, count, error in self.map(warm, names, options['workers']):
+            thumbnails += count
+            if error:
+                errors += 1
+                self.stderr.write(f'{name}: {error}')
+        self.stdout.write(
+            f'Изображений: {len(names)}, миниатюр: {thumbnails}, '
+            f'ошибок: {errors}'
+        )
+
+    def map(self, func, items, workers):
+        if workers <= 1:
+            yield from map(func, items)
+            return
+        # Forked workers must not share the parent's database connections.
+        connections.close_all()
+        with ProcessPoolExecutor(
+                max_workers=workers, initializer=init_worker) as executor:
+            yield from executor.map(func, items, chunksize=16)
@@ -1,5 +1,5 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse_lazy
 
 from core.models import CreatedModel
@@ -21,6 +21,11 @@ class Group(models.Model):
     description = models.TextField(
         verbose_name='Описание',
     )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество постов',
+    )
 
     class Meta:
         verbose_name = 'Группа'
@@ -30,6 +35,19 @@ class Group(models.Model):
         return f'{self.title}'
 
 
+class PostQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Posts with everything a post card renders loaded in one query."""
+        return self.select_related('author', 'group')
+
+    def for_detail(self):
+        """Post page data: the card relations plus the author's counters.
+
+        Comments are paginated separately, see ``posts.views.CommentsMixin``.
+        """
+        return self.for_listing().select_related('author__stats')
+
+
 class Post(CreatedModel):
     """Model for posts."""
 
@@ -57,14 +75,42 @@ class Post(CreatedModel):
         upload_to='posts/',
         blank=True,
     )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев',
+    )
+    updated = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     def get_absolute_url(self):
         return reverse_lazy('posts:post_detail', args=(self.pk,))
 
+    def save(self, *args, **kwargs):
+        # Counters are updated by signal handlers, keep them in one
+        # transaction with the row itself.
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
         ordering = ('-created',)
+        indexes = (
+            models.Index(fields=('-created',), name='post_created_idx'),
+            models.Index(
+                fields=('author', '-created'),
+                name='post_author_created_idx',
+            ),
+            models.Index(
+                fields=('group', '-created'),
+                name='post_group_created_idx',
+            ),
+        )
 
     def __str__(self):
         return f'{self.text[:15]}'
@@ -89,9 +135,88 @@ class Comment(CreatedModel):
         help_text='Текст нового комментария',
     )
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        ordering = ('created',)
+        indexes = (
+            models.Index(
+                fields=('post', 'created'),
+                name='comment_post_created_idx',
+            ),
+        )
 
     def __str__(self):
         return f'{self.text}'
+
+
+class AuthorStats(models.Model):
+    """Denormalized counters of an author."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Автор',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество постов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков',
+    )
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+
+    def __str__(self):
+        return f'{self.user}'
+
+
+class Follow(models.Model):
+    """Subscription of a user to the posts of an author."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='follower',
+        verbose_name='Подписчик',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='following',
+        verbose_name='Автор',
+    )
+
+    class Meta:
+        verbose_name = 'Подписка'
+        verbose_name_plural = 'Подписки'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='follow_unique_user_author',
+            ),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('author')),
+                name='follow_not_self',
+            ),
+        )
+        indexes = (
+            # Followers of an author, read when fanning out a new post.
+            models.Index(
+                fields=('author', 'user'),
+                name='follow_author_user_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user} -> {self.author}'
@@ -0,0 +1,241 @@
+"""Full-text search over posts and their comments.
+
+Posts and comments are indexed by a pluggable backend chosen with the
+``POSTS_SEARCH_BACKEND`` setting and kept in sync by the tasks the signal
+handlers in ``posts.signals`` queue. Bulk updates bypassing signals need the
+``rebuild_search_index`` command afterwards.
+"""
+import base64
+import binascii
+import json
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections, router
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+from core.pagination import CursorPage, InvalidCursor
+from .models import Comment, Post
+
+# Private use characters wrap the matches in snippets, so the text can be
+# escaped before the markers become <mark> tags.
+HIGHLIGHT_START = '\ue000'
+HIGHLIGHT_END = '\ue001'
+
+MAX_TERMS = 10
+
+
+class SearchHit:
+    def __init__(self, post_id, score, snippet):
+        self.post_id = post_id
+        self.score = score
+        self.snippet = snippet
+        self.post = None
+
+    def __repr__(self):
+        return f'<SearchHit post={self.post_id} score={self.score}>'
+
+
+def highlight(snippet):
+    """Escape a snippet and turn the match markers into ``<mark>`` tags."""
+    return mark_safe(
+        escape(snippet)
+        .replace(HIGHLIGHT_START, '<mark>')
+        .replace(HIGHLIGHT_END, '</mark>')
+    )
+
+
+def get_terms(query):
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def encode_cursor(hit):
+    payload = json.dumps([hit.score, hit.post_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        payload = base64.urlsafe_b64decode(
+            cursor.encode() + b'=' * (-len(cursor) % 4))
+        score, post_id = json.loads(payload.decode())
+        return float(score), int(post_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor('Некорректный курсор')
+
+
+class BaseSearchBackend:
+    """Interface of a search index of posts and comments."""
+
+    def index_post(self, post):
+        raise NotImplementedError
+
+    def remove_post(self, post_id):
+        raise NotImplementedError
+
+    def index_comment(self, comment):
+        raise NotImplementedError
+
+    def remove_comment(self, comment_id):
+        raise NotImplementedError
+
+    def rebuild(self):
+        """Index every post and comment from scratch."""
+        raise NotImplementedError
+
+    def search(self, query, limit, after=None):
+        """Best matching posts for ``query`` as a list of ``SearchHit``.
+
+        Hits are ordered by ``(score, post_id)``, lower scores first, and
+        ``after`` is such a pair to continue from.
+        """
+        raise NotImplementedError
+
+    def filter_queryset(self, queryset, query):
+        """Restrict a queryset of posts to those whose text matches."""
+        raise NotImplementedError
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """Index in an FTS5 virtual table ranked with BM25.
+
+    Posts are stored under their id as rowid and comments under their
+    negated id, so both live in one table and every row knows its post.
+    """
+
+    table = 'posts_search'
+    # Matches in comments count less than matches in the post itself.
+    comment_weight = 0.5
+    snippet_tokens = 16
+
+    def get_connection(self, write=False):
+        if write:
+            return connections[router.db_for_write(Post)]
+        return connections[router.db_for_read(Post)]
+
+    def _replace(self, rowid, post_id, body):
+        with self.get_connection(write=True).cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s', (rowid,))
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, post_id, body) '
+                f'VALUES (%s, %s, %s)',
+                (rowid, post_id, body),
+            )
+
+    def _delete(self, rowid):
+        with self.get_connection(write=True).cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s', (rowid,))
+
+    def index_post(self, post):
+        self._replace(post.pk, post.pk, post.text)
+
+    def remove_post(self, post_id):
+        self._delete(post_id)
+
+    def index_comment(self, comment):
+        self._replace(-comment.pk, comment.post_id, comment.text)
+
+    def remove_comment(self, comment_id):
+        self._delete(-comment_id)
+
+    def rebuild(self):
+        with self.get_connection(write=True).cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, post_id, body) '
+                f'SELECT id, id, text FROM {Post._meta.db_table}'
+            )
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, post_id, body) '
+                f'SELECT -id, post_id, text FROM {Comment._meta.db_table}'
+            )
+
+    def get_match(self, query):
+        # Every word is quoted, so user input never reaches the FTS5 query
+        # syntax, and matched as a prefix.
+        return ' '.join(f'"{term}"*' for term in get_terms(query))
+
+    def search(self, query, limit, after=None):
+        match = self.get_match(query)
+        if not match:
+            return []
+        params = [self.comment_weight, match]
+        keyset = ''
+        if after is not None:
+            keyset = 'WHERE score > %s OR (score = %s AND post_id > %s)'
+            params.extend([after[0], after[0], after[1]])
+        params.append(limit)
+        connection = self.get_connection()
+        with connection.cursor() as cursor:
+            # The best matching row of every post is found first, snippets
+            # are built only for the page as FTS5 cannot build them in an
+            # aggregate query.
+            cursor.execute(
+                f'SELECT post_id, score, best_rowid FROM ('
+                f'  SELECT post_id, rowid AS best_rowid,'
+                f'    MIN(CASE WHEN rowid < 0 THEN rank * %s'
+                f'      ELSE rank END) AS score'
+                f'  FROM {self.table} WHERE {self.table} MATCH %s'
+                f'  GROUP BY post_id'
+                f') {keyset} ORDER BY score, post_id LIMIT %s',
+                params,
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                return []
+            rowids = [rowid for _, _, rowid in rows]
+            cursor.execute(
+                f'SELECT rowid, snippet({self.table}, 1, %s, %s, %s, %s) '
+                f'FROM {self.table} WHERE {self.table} MATCH %s '
+                f'AND rowid IN ({", ".join(["%s"] * len(rowids))})',
+                [HIGHLIGHT_START, HIGHLIGHT_END, '…', self.snippet_tokens,
+                 match, *rowids],
+            )
+            snippets = dict(cursor.fetchall())
+        return [
+            SearchHit(post_id, score, highlight(snippets.get(rowid, '')))
+            for post_id, score, rowid in rows
+        ]
+
+    def filter_queryset(self, queryset, query):
+        match = self.get_match(query)
+        if not match:
+            return queryset.none()
+        opts = queryset.model._meta
+        # A RawSQL in a pk__in lookup gets wrapped into a scalar subquery.
+        # Comment rows are left out, a post is found by its own text only.
+        return queryset.extra(
+            where=[
+                f'"{opts.db_table}"."{opts.pk.column}" IN ('
+                f'SELECT post_id FROM {self.table} '
+                f'WHERE {self.table} MATCH %s AND rowid > 0)'
+            ],
+            params=[match],
+        )
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    return import_string(settings.POSTS_SEARCH_BACKEND)()
+
+
+def search_posts(query, limit, cursor=None):
+    """Page of ranked hits with their posts loaded for the post cards."""
+    backend = get_backend()
+    hits = backend.search(query, limit + 1, decode_cursor(cursor))
+    has_next = len(hits) > limit
+    hits = hits[:limit]
+    posts = Post.objects.for_listing().in_bulk(
+        [hit.post_id for hit in hits])
+    for hit in hits:
+        hit.post = posts.get(hit.post_id)
+    next_cursor = encode_cursor(hits[-1]) if has_next else None
+    return CursorPage(
+        [hit for hit in hits if hit.post is not None], None, next_cursor)
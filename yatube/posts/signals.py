@@ -0,0 +1,187 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.cache import bump_versions
+from core.tasks import enqueue_on_commit
+from . import feed, search, tasks, timeline
+from .models import User, AuthorStats, Comment, Follow, Group, Post
+from .sitemaps import post_chunk_scope
+
+
+def change_counter(queryset, field, delta):
+    """Atomically shift a counter column, never letting it go negative."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def change_author_posts_count(author_id, delta):
+    stats = AuthorStats.objects.filter(user_id=author_id)
+    if not change_counter(stats, 'posts_count', delta):
+        AuthorStats.objects.get_or_create(
+            user_id=author_id,
+            defaults={
+                'posts_count': Post.objects.filter(author_id=author_id).count()
+            },
+        )
+
+
+def change_group_posts_count(group_id, delta):
+    if group_id is not None:
+        change_counter(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+@receiver(post_save, sender=User)
+def create_author_stats(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+def bump_post_versions(post, *group_slugs):
+    """Invalidate the cached pages a post is shown on."""
+    scopes = [
+        'posts',
+        f'post:{post.pk}',
+        f'author:{post.author_id}',
+        f'profile:{post.author.username}',
+        post_chunk_scope(post.pk),
+    ]
+    scopes.extend(f'group:{slug}' for slug in group_slugs if slug)
+    bump_versions(*scopes)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_post(sender, instance, raw, **kwargs):
+    instance._previous_group_id = None
+    instance._previous_group_slug = None
+    instance._previous_image = None
+    if not raw and not instance._state.adding:
+        (
+            instance._previous_group_id,
+            instance._previous_group_slug,
+            instance._previous_image,
+        ) = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'group__slug', 'image')
+            .first()
+        ) or (None, None, None)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        change_author_posts_count(instance.author_id, 1)
+        change_group_posts_count(instance.group_id, 1)
+        timeline.add_post(instance)
+        enqueue_on_commit(tasks.fan_out_post, instance.pk)
+    elif instance._previous_group_id != instance.group_id:
+        change_group_posts_count(instance._previous_group_id, -1)
+        change_group_posts_count(instance.group_id, 1)
+        timeline.move_post(instance, instance._previous_group_id)
+    if instance.image and instance.image.name != instance._previous_image:
+        enqueue_on_commit(
+            tasks.build_thumbnails, instance.image.name,
+            key=f'thumbnails:{instance.image.name}')
+    enqueue_on_commit(
+        tasks.index_post, instance.pk, key=f'index_post:{instance.pk}')
+    bump_post_versions(
+        instance,
+        instance._previous_group_slug,
+        instance.group.slug if instance.group_id else None,
+    )
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    change_counter(
+        AuthorStats.objects.filter(user_id=instance.author_id),
+        'posts_count',
+        -1,
+    )
+    change_group_posts_count(instance.group_id, -1)
+    timeline.remove_post(instance)
+    search.get_backend().remove_post(instance.pk)
+    bump_post_versions(
+        instance, instance.group.slug if instance.group_id else None)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        change_counter(
+            Post.objects.filter(pk=instance.post_id), 'comments_count', 1)
+    enqueue_on_commit(
+        tasks.index_comment, instance.pk,
+        key=f'index_comment:{instance.pk}')
+    bump_versions(f'post:{instance.post_id}')
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    change_counter(
+        Post.objects.filter(pk=instance.post_id), 'comments_count', -1)
+    search.get_backend().remove_comment(instance.pk)
+    bump_versions(f'post:{instance.post_id}')
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, raw, **kwargs):
+    instance._previous_slug = None
+    if not raw and not instance._state.adding:
+        instance._previous_slug = (
+            Group.objects.filter(pk=instance.pk)
+            .values_list('slug', flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Group)
+def bump_saved_group(sender, instance, raw, **kwargs):
+    scopes = ['groups', f'group:{instance.slug}']
+    if instance._previous_slug:
+        scopes.append(f'group:{instance._previous_slug}')
+    bump_versions(*scopes)
+
+
+@receiver(post_delete, sender=Group)
+def bump_deleted_group(sender, instance, **kwargs):
+    timeline.get_backend().delete(timeline.group_timeline(instance.pk))
+    bump_versions('groups', 'posts', f'group:{instance.slug}')
+
+
+def change_followers_count(follow, delta):
+    stats = AuthorStats.objects.filter(user_id=follow.author_id)
+    if not change_counter(stats, 'followers_count', delta):
+        AuthorStats.objects.get_or_create(
+            user_id=follow.author_id,
+            defaults={
+                'followers_count': Follow.objects.filter(
+                    author_id=follow.author_id).count()
+            },
+        )
+    # The follower's inbox is rebuilt with or without the author.
+    timeline.get_backend().delete(feed.inbox_timeline(follow.user_id))
+    followers_count = stats.values_list('followers_count', flat=True).first()
+    if followers_count is not None and feed.is_popular(
+            followers_count) != feed.is_popular(followers_count - delta):
+        # The author's posts move between the inboxes and the read path.
+        enqueue_on_commit(
+            tasks.reset_inboxes, follow.author_id,
+            key=f'reset_inboxes:{follow.author_id}')
+    bump_versions(f'profile:{follow.author.username}')
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        change_followers_count(instance, 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    change_followers_count(instance, -1)
@@ -0,0 +1,98 @@
+"""Sitemaps of posts, groups and profiles for search engines.
+
+Crawlers find every post here instead of walking deep pages of the lists.
+Sections are split into chunks of ``SITEMAP_CHUNK_SIZE`` primary keys, see
+``core.pagination.KeyRangePaginator``: a new post only adds to the last
+chunk of the posts section, and every chunk is cached under its own
+version scope, so the older ones are rendered once.
+"""
+from django.conf import settings
+from django.contrib.sitemaps import Sitemap
+from django.contrib.sitemaps import views as sitemap_views
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.views.generic.base import View
+
+from core.pagination import KeyRangePaginator
+from core.views import VersionedCacheMixin
+from .models import User, Group, Post
+
+
+def post_chunk_scope(post_id):
+    """Version scope of the sitemap chunk listing a post."""
+    return f'sitemap:posts:{(post_id - 1) // PostSitemap.limit + 1}'
+
+
+class ChunkedSitemap(Sitemap):
+    limit = settings.SITEMAP_CHUNK_SIZE
+
+    @cached_property
+    def paginator(self):
+        return KeyRangePaginator(self.items(), self.limit)
+
+
+class PostSitemap(ChunkedSitemap):
+    changefreq = 'weekly'
+
+    def items(self):
+        return Post.objects.only('pk', 'updated')
+
+    def lastmod(self, post):
+        return post.updated
+
+
+class GroupSitemap(ChunkedSitemap):
+    changefreq = 'daily'
+
+    def items(self):
+        return Group.objects.filter(posts_count__gt=0).only('pk', 'slug')
+
+    def location(self, group):
+        return reverse('posts:group_list', args=(group.slug,))
+
+
+class ProfileSitemap(ChunkedSitemap):
+    changefreq = 'daily'
+
+    def items(self):
+        return User.objects.filter(stats__posts_count__gt=0).only(
+            'pk', 'username')
+
+    def location(self, user):
+        return reverse('posts:profile', args=(user.username,))
+
+
+SITEMAPS = {
+    'posts': PostSitemap,
+    'groups': GroupSitemap,
+    'profiles': ProfileSitemap,
+}
+
+
+class SitemapIndexView(VersionedCacheMixin, View):
+    cache_key_prefix = 'sitemap'
+
+    def get_cache_scopes(self):
+        # The number of chunks grows with new posts, groups and users.
+        return ('posts', 'groups')
+
+    def get(self, request, *args, **kwargs):
+        return sitemap_views.index(
+            request, SITEMAPS, sitemap_url_name='posts:sitemap_section')
+
+
+class SitemapSectionView(VersionedCacheMixin, View):
+    cache_key_prefix = 'sitemap'
+
+    def get_cache_scopes(self):
+        try:
+            page = int(self.request.GET.get('p', 1))
+        except ValueError:
+            page = None
+        if self.kwargs['section'] == 'posts' and page is not None:
+            return (f'sitemap:posts:{page}',)
+        return ('posts', 'groups')
+
+    def get(self, request, *args, **kwargs):
+        return sitemap_views.sitemap(
+            request, SITEMAPS, section=kwargs['section'])
@@ -0,0 +1,132 @@
+"""RSS and Atom feeds of the newest posts of the site, a group or an author.
+
+Feed readers poll these instead of the HTML lists. Items of the site and
+group feeds come from the precomputed timelines, the author's from an
+index range scan, so a feed costs no more than the first page of its list;
+``FeedView`` caches it under the same version scopes as that page and
+answers conditional requests with 304.
+"""
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.text import Truncator
+from django.views.generic.base import View
+
+from core.views import VersionedCacheMixin
+from .models import User, Group, Post
+from .timeline import GLOBAL_TIMELINE, TimelineSequence, group_timeline
+
+
+class PostsFeed(Feed):
+    """Newest posts of the site."""
+
+    def title(self, obj):
+        return 'Yatube: новые записи'
+
+    def link(self, obj):
+        return reverse('posts:index')
+
+    def description(self, obj):
+        return 'Последние записи всех пользователей Yatube'
+
+    def get_posts(self, obj):
+        return TimelineSequence(GLOBAL_TIMELINE, Post.objects.for_listing())
+
+    def items(self, obj):
+        return self.get_posts(obj)[:settings.FEED_ITEMS]
+
+    def item_title(self, post):
+        return Truncator(post.text).chars(50)
+
+    def item_description(self, post):
+        return post.text
+
+    def item_link(self, post):
+        return reverse('posts:post_detail', args=(post.pk,))
+
+    def item_author_name(self, post):
+        return post.author.get_full_name() or post.author.username
+
+    def item_pubdate(self, post):
+        return post.created
+
+    def item_updateddate(self, post):
+        return post.updated
+
+
+class GroupPostsFeed(PostsFeed):
+    """Newest posts of a group."""
+
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, group):
+        return f'Yatube: {group.title}'
+
+    def link(self, group):
+        return reverse('posts:group_list', args=(group.slug,))
+
+    def description(self, group):
+        return group.description
+
+    def get_posts(self, group):
+        return TimelineSequence(
+            group_timeline(group.pk), group.posts.for_listing())
+
+
+class AuthorPostsFeed(PostsFeed):
+    """Newest posts of an author."""
+
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, author):
+        return f'Yatube: {author.get_full_name() or author.username}'
+
+    def link(self, author):
+        return reverse('posts:profile', args=(author.username,))
+
+    def description(self, author):
+        return f'Последние записи пользователя {author.username}'
+
+    def get_posts(self, author):
+        return author.posts.for_listing().order_by('-created', '-pk')
+
+
+class AtomFeedMixin:
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+class PostsAtomFeed(AtomFeedMixin, PostsFeed):
+    pass
+
+
+class GroupPostsAtomFeed(AtomFeedMixin, GroupPostsFeed):
+    pass
+
+
+class AuthorPostsAtomFeed(AtomFeedMixin, AuthorPostsFeed):
+    pass
+
+
+class FeedView(VersionedCacheMixin, View):
+    """Serves a feed cached until one of ``cache_scopes`` is bumped.
+
+    The scopes are formatted with the URL keyword arguments.
+    """
+
+    feed_class = None
+    cache_scopes = ()
+    cache_key_prefix = 'feed'
+
+    def get_cache_scopes(self):
+        return tuple(
+            scope.format(**self.kwargs) for scope in self.cache_scopes)
+
+    def get(self, request, *args, **kwargs):
+        return self.feed_class()(request, *args, **kwargs)
@@ -0,0 +1,34 @@
+"""Side effects of post and comment writes run by ``core.tasks`` workers.
+
+The signal handlers in ``posts.signals`` queue them when the write
+commits; they load the objects anew, so they index what is saved when they
+run and do nothing for what has been deleted since.
+"""
+from . import feed, search, thumbnails
+from .models import Comment, Post
+
+
+def index_post(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        search.get_backend().index_post(post)
+
+
+def index_comment(comment_id):
+    comment = Comment.objects.filter(pk=comment_id).first()
+    if comment is not None:
+        search.get_backend().index_comment(comment)
+
+
+def build_thumbnails(name):
+    thumbnails.generate_thumbnails(name)
+
+
+def fan_out_post(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        feed.push_post(post)
+
+
+def reset_inboxes(author_id):
+    feed.reset_inboxes(author_id)
@@ -0,0 +1,166 @@
+import time
+from http import HTTPStatus
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from posts.models import User, Comment, Group, Post
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(
+            username='author', first_name='Имя', last_name='Фамилия')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            description='Описание группы',
+        )
+        cls.post = Post.objects.create(
+            text='Пост в группе', author=cls.user, group=cls.group)
+        Post.objects.create(text='Пост без группы', author=cls.user)
+        Comment.objects.create(
+            post=cls.post, author=cls.user, text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def age_versions(self, url):
+        """Move the latest changes of a page into a past second."""
+        with mock.patch('core.views.time.time',
+                        return_value=time.time() - 1):
+            self.client.get(url)
+
+    def test_api_pages_return_json(self):
+        """API отдает ленты, посты, комментарии, группы и профили."""
+        cases = [
+            (
+                reverse('posts:api_posts'),
+                lambda data: (data['count'], data['results'][-1]['id']),
+                (2, self.post.pk),
+            ),
+            (
+                reverse('posts:api_post', args=(self.post.pk,)),
+                lambda data: (data['text'], data['comments_count']),
+                ('Пост в группе', 1),
+            ),
+            (
+                reverse('posts:api_comments', args=(self.post.pk,)),
+                lambda data: [comment['text'] for comment in data['results']],
+                ['Комментарий'],
+            ),
+            (
+                reverse('posts:api_groups'),
+                lambda data: [(group['slug'], group['posts_count'])
+                              for group in data['results']],
+                [('group', 1)],
+            ),
+            (
+                reverse('posts:api_group', args=(self.group.slug,)),
+                lambda data: (data['group']['title'], data['count']),
+                ('Группа', 1),
+            ),
+            (
+                reverse('posts:api_profile', args=(self.user.username,)),
+                lambda data: (data['author']['full_name'], data['count']),
+                ('Имя Фамилия', 2),
+            ),
+        ]
+        for url, extract, expected in cases:
+            with self.subTest(value=url):
+                response = self.client.get(url)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                self.assertEqual(extract(response.json()), expected)
+
+    def test_missing_objects_return_404(self):
+        """API отвечает 404 для несуществующих объектов."""
+        urls = [
+            reverse('posts:api_post', args=(0,)),
+            reverse('posts:api_comments', args=(0,)),
+            reverse('posts:api_group', args=('missing',)),
+            reverse('posts:api_profile', args=('missing',)),
+        ]
+        for url in urls:
+            with self.subTest(value=url):
+                self.assertEqual(
+                    self.client.get(url).status_code, HTTPStatus.NOT_FOUND)
+
+    def test_not_modified_skips_queries_and_serializer(self):
+        """Повторный запрос с ETag получает 304 без запросов к базе."""
+        urls = [
+            reverse('posts:api_posts'),
+            reverse('posts:api_post', args=(self.post.pk,)),
+            reverse('posts:api_comments', args=(self.post.pk,)),
+            reverse('posts:api_group', args=(self.group.slug,)),
+            reverse('posts:api_profile', args=(self.user.username,)),
+            reverse('posts:index'),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        ]
+        for url in urls:
+            with self.subTest(value=url):
+                self.age_versions(url)
+                response = self.client.get(url)
+                etag = response['ETag']
+                self.assertFalse(etag.startswith('W/'))
+                self.assertIn('Last-Modified', response)
+                with self.assertNumQueries(0), \
+                        mock.patch('posts.api.serialize_post') as serialize:
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+                self.assertEqual(response['ETag'], etag)
+                serialize.assert_not_called()
+
+    def test_if_modified_since(self):
+        """Запрос с If-Modified-Since получает 304, пока нет изменений."""
+        url = reverse('posts:api_post', args=(self.post.pk,))
+        self.age_versions(url)
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_last_modified_waits_for_second_to_end(self):
+        """Last-Modified не отдается, пока не прошла секунда изменения."""
+        url = reverse('posts:api_post', args=(self.post.pk,))
+        now = time.time()
+        with mock.patch('core.views.time.time', return_value=now):
+            Comment.objects.create(
+                post=self.post, author=self.user, text='Комментарий')
+            self.assertNotIn('Last-Modified', self.client.get(url))
+        with mock.patch('core.views.time.time', return_value=now + 1):
+            self.assertIn('Last-Modified', self.client.get(url))
+
+    def test_comment_changes_etag(self):
+        """Новый комментарий меняет ETag поста и его комментариев."""
+        urls = [
+            reverse('posts:api_post', args=(self.post.pk,)),
+            reverse('posts:api_comments', args=(self.post.pk,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        ]
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Еще комментарий')
+        for url, etag in etags.items():
+            with self.subTest(value=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_authorized_html_pages_get_weak_etag(self):
+        """Страницы с формами для пользователя получают слабый ETag."""
+        client = Client()
+        client.force_login(self.user)
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        etag = client.get(url)['ETag']
+        self.assertTrue(etag.startswith('W/'))
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        api_etag = client.get(
+            reverse('posts:api_post', args=(self.post.pk,)))['ETag']
+        self.assertFalse(api_etag.startswith('W/'))
@@ -0,0 +1,336 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail import default, get_thumbnail
+
+from posts.models import User, AuthorStats, Comment, Follow, Group, Post
+from posts.search import get_backend
+from posts.thumbnails import get_thumbnail_options
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class ExplainQueriesCommandTest(TestCase):
+    def test_list_queries_use_indexes(self):
+        """Запросы страниц со списками постов используют индексы."""
+        out = StringIO()
+        call_command('explain_queries', stdout=out)
+        self.assertNotIn('полный просмотр', out.getvalue())
+
+
+class RecountCommandTest(TestCase):
+    def test_recount_repairs_drift(self):
+        """Команда recount исправляет расхождения счетчиков."""
+        author = User.objects.create(username='author')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        post = Post.objects.create(text='Пост', author=author, group=group)
+        Comment.objects.create(post=post, author=author, text='Комментарий')
+        AuthorStats.objects.filter(user=author).delete()
+        Group.objects.update(posts_count=10)
+        Post.objects.update(comments_count=0)
+        call_command('recount', stdout=StringIO())
+        group.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(AuthorStats.objects.get(user=author).posts_count, 1)
+        self.assertEqual(group.posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
+
+
+class RebuildSearchIndexCommandTest(TestCase):
+    def test_rebuild_indexes_bulk_changes(self):
+        """Команда rebuild_search_index индексирует изменения без сигналов."""
+        author = User.objects.create(username='author')
+        post = Post.objects.create(text='Старый текст', author=author)
+        Post.objects.filter(pk=post.pk).update(text='Новый текст')
+        backend = get_backend()
+        self.assertEqual(backend.search('новый', 10), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(
+            [hit.post_id for hit in backend.search('новый', 10)], [post.pk])
+        self.assertEqual(backend.search('старый', 10), [])
+
+
+class ExportPostsCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(
+            text='Первый пост', author=cls.author, group=cls.group)
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.author, text='Комментарий')
+        cls.last_post = Post.objects.create(
+            text='Второй пост', author=cls.author)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def export(self, file_name, **options):
+        path = os.path.join(self.tmp_dir, file_name)
+        call_command('export_posts', output=path, stdout=StringIO(),
+                     **options)
+        return path
+
+    def test_ndjson_gzip_export(self):
+        """Команда export_posts выгружает все записи в сжатый NDJSON."""
+        path = self.export('posts.ndjson.gz')
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(
+            [(record['type'], record['id']) for record in records],
+            [
+                ('group', self.group.pk),
+                ('author', self.author.pk),
+                ('post', self.post.pk),
+                ('post', self.last_post.pk),
+                ('comment', self.comment.pk),
+            ],
+        )
+        self.assertEqual(records[2]['text'], 'Первый пост')
+        self.assertEqual(records[2]['group_id'], self.group.pk)
+
+    def test_export_to_stdout(self):
+        """Выгрузка в стандартный вывод перехватывается call_command."""
+        out, err = StringIO(), StringIO()
+        call_command('export_posts', types=['group'], stdout=out, stderr=err)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(records[0]['slug'], self.group.slug)
+        self.assertIn('group: 1', err.getvalue())
+        out = BytesIO()
+        call_command('export_posts', '--gzip', types=['group'], stdout=out,
+                     stderr=StringIO())
+        records = gzip.decompress(out.getvalue()).decode().splitlines()
+        self.assertEqual(json.loads(records[0])['slug'], self.group.slug)
+
+    def test_after_ids_resume_export(self):
+        """Выгрузка продолжается после заданных поста и комментария."""
+        path = self.export(
+            'posts.csv', format='csv', types=['post', 'comment'],
+            after_post_id=self.post.pk)
+        with open(path, encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(
+            [(row['type'], row['id'], row['text']) for row in rows],
+            [
+                ('post', str(self.last_post.pk), 'Второй пост'),
+                ('comment', str(self.comment.pk), self.comment.text),
+            ],
+        )
+        path = self.export(
+            'comments.csv', format='csv', types=['post', 'comment'],
+            after_post_id=self.last_post.pk,
+            after_comment_id=self.comment.pk)
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual(list(csv.DictReader(f)), [])
+
+    def test_admin_action_streams_selected_posts(self):
+        """Действие админки выгружает выбранные посты с комментариями."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        response = self.client.post(
+            reverse('admin:posts_post_changelist'),
+            {'action': 'export_ndjson', '_selected_action': [self.post.pk]},
+        )
+        content = b''.join(response.streaming_content).decode()
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(
+            [(record['type'], record['id']) for record in records],
+            [
+                ('group', self.group.pk),
+                ('author', self.author.pk),
+                ('post', self.post.pk),
+                ('comment', self.comment.pk),
+            ],
+        )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImportPostsCommandTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.author = User.objects.create(username='author')
+
+    def import_records(self, records, **options):
+        path = os.path.join(self.tmp_dir, 'posts.ndjson')
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+        out, err = StringIO(), StringIO()
+        call_command('import_posts', path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_resolves_references_and_updates_counters(self):
+        """Импорт связывает записи по id источника и обновляет счетчики."""
+        out, err = self.import_records([
+            {'type': 'group', 'id': 7, 'slug': 'group', 'title': 'Группа',
+             'description': 'Описание'},
+            {'type': 'group', 'id': 8, 'slug': 'не слаг', 'title': 'Группа',
+             'description': 'Описание'},
+            {'type': 'author', 'id': 3, 'username': 'author'},
+            {'type': 'author', 'id': 4, 'username': 'new_author'},
+            {'type': 'author', 'id': 6, 'username': 'bad name'},
+            {'type': 'post', 'id': 10, 'author_id': 3, 'group_id': 7,
+             'text': 'Импортированный пост',
+             'created': '2020-01-02T03:04:05+00:00'},
+            {'type': 'post', 'id': 11, 'author_id': 4, 'text': ''},
+            {'type': 'post', 'id': 12, 'author_id': 5, 'text': 'Пост'},
+            {'type': 'comment', 'id': 1, 'post_id': 10, 'author_id': 4,
+             'text': 'Комментарий'},
+            {'type': 'comment', 'id': 2, 'post_id': 11, 'author_id': 4,
+             'text': 'Комментарий к отклоненному посту'},
+        ], batch_size=2)
+        self.assertIn('group: загружено 1, ошибок 1', out)
+        self.assertIn('author: загружено 2, ошибок 1', out)
+        self.assertIn('post: загружено 1, ошибок 2', out)
+        self.assertIn('comment: загружено 1, ошибок 1', out)
+        self.assertIn('post_id: неизвестный id 11', err)
+        self.assertIn('Записей в секунду', out)
+        self.assertIn('author_id: неизвестный id 5', err)
+        self.assertEqual(User.objects.filter(username='author').count(), 1)
+        post = Post.objects.get(text='Импортированный пост')
+        self.assertEqual(post.author, self.author)
+        self.assertEqual(post.group.slug, 'group')
+        self.assertEqual(post.created.year, 2020)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.comments.get().author.username, 'new_author')
+        self.assertEqual(post.group.posts_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).posts_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(user__username='new_author').posts_count,
+            0)
+        hits = get_backend().search('импортированный', 10)
+        self.assertEqual([hit.post_id for hit in hits], [post.pk])
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.context['page_obj'][0], post)
+
+    def test_imported_posts_reach_followers_feeds(self):
+        """Импортированные посты появляются в лентах подписчиков."""
+        reader = User.objects.create(username='reader')
+        Follow.objects.create(user=reader, author=self.author)
+        self.client.force_login(reader)
+        url = reverse('posts:follow_index')
+        self.assertEqual(len(self.client.get(url).context['page_obj']), 0)
+        self.import_records([
+            {'type': 'author', 'id': 1, 'username': 'author'},
+            {'type': 'post', 'id': 1, 'author_id': 1, 'text': 'Новый пост'},
+        ])
+        response = self.client.get(url)
+        self.assertEqual(
+            list(response.context['page_obj']), list(Post.objects.all()))
+
+    def test_imported_posts_are_added_to_sitemap(self):
+        """Импортированные посты появляются в закешированной карте сайта."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        url = reverse('posts:sitemap_section', args=('posts',))
+        self.client.get(url)
+        self.import_records([
+            {'type': 'author', 'id': 1, 'username': 'author'},
+            {'type': 'post', 'id': 1, 'author_id': 1, 'text': 'Новый пост'},
+        ])
+        imported = Post.objects.exclude(pk=post.pk).get()
+        self.assertContains(self.client.get(url), imported.get_absolute_url())
+
+    def test_comments_of_existing_posts_are_imported(self):
+        """Комментарии импортируются к постам, загруженным ранее."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        url = reverse('posts:comments', args=(post.pk,))
+        self.client.get(url)
+        out, err = self.import_records([
+            {'type': 'author', 'id': 1, 'username': 'author'},
+            {'type': 'comment', 'id': 1, 'local_post_id': post.pk,
+             'author_id': 1, 'text': 'Импортированный комментарий',
+             'created': '2020-01-02T03:04:05+00:00'},
+            {'type': 'comment', 'id': 2, 'post_id': post.pk, 'author_id': 1,
+             'text': 'Комментарий к посту источника'},
+            {'type': 'comment', 'id': 3, 'local_post_id': post.pk + 1,
+             'author_id': 1, 'text': 'Комментарий к несуществующему посту'},
+        ])
+        self.assertIn('comment: загружено 1, ошибок 2', out)
+        self.assertIn(f'post_id: неизвестный id {post.pk}', err)
+        self.assertIn(f'local_post_id: неизвестный id {post.pk + 1}', err)
+        comment = Comment.objects.get()
+        self.assertEqual(comment.post, post)
+        self.assertEqual(comment.created.year, 2020)
+        self.assertContains(
+            self.client.get(url), 'Импортированный комментарий')
+
+    def test_images_are_validated_and_copied(self):
+        """Импорт копирует изображения и отклоняет файлы не-изображения."""
+        source = os.path.join(self.tmp_dir, 'media')
+        os.makedirs(os.path.join(source, 'posts'))
+        with open(os.path.join(source, 'posts', 'small.gif'), 'wb') as f:
+            f.write(SMALL_GIF)
+        with open(os.path.join(source, 'posts', 'bad.gif'), 'wb') as f:
+            f.write(b'not an image')
+        out, err = self.import_records([
+            {'type': 'author', 'id': 1, 'username': 'author'},
+            {'type': 'post', 'id': 1, 'author_id': 1, 'text': 'Картинка',
+             'image': 'posts/small.gif'},
+            {'type': 'post', 'id': 2, 'author_id': 1, 'text': 'Не картинка',
+             'image': 'posts/bad.gif'},
+        ], media_root=source)
+        self.assertIn('post: загружено 1, ошибок 1', out)
+        post = Post.objects.get()
+        self.assertTrue(post.image.storage.exists(post.image.name))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class WarmThumbnailsCommandTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=User.objects.create(username='author'),
+            image=SimpleUploadedFile(
+                name='small.gif', content=SMALL_GIF, content_type='image/gif'),
+        )
+
+    def test_missing_thumbnails_are_created(self):
+        """Команда warm_thumbnails создает недостающие миниатюры."""
+        out = StringIO()
+        call_command('warm_thumbnails', workers=1, stdout=out)
+        thumbnails = get_thumbnail_options(self.post.image.name)
+        self.assertIn(f'миниатюр: {len(thumbnails)}', out.getvalue())
+        geometry, options = thumbnails[-1]
+        self.assertEqual(options['format'], 'GIF')
+        thumbnail = get_thumbnail(self.post.image.name, geometry, **options)
+        self.assertTrue(thumbnail.exists())
+        default.storage.delete(thumbnail.name)
+        call_command('warm_thumbnails', workers=1, stdout=StringIO())
+        self.assertTrue(thumbnail.exists())
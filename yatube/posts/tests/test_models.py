@@ -1,6 +1,14 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from unittest import mock
 
-from posts.models import User, Group, Post
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from posts.models import User, Comment, Group, Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
 class PostModelTest(TestCase):
@@ -52,3 +60,80 @@ class PostModelTest(TestCase):
             with self.subTest(value=field):
                 self.assertEqual(
                     self.post._meta.get_field(field).help_text, exptected)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='gruppa',
+            description='Описание группы',
+        )
+        cls.new_group = Group.objects.create(
+            title='Новая группа',
+            slug='new_gruppa',
+            description='Описание новой группы',
+        )
+
+    def assertCounters(self, author_posts, group_posts, new_group_posts):
+        self.author.stats.refresh_from_db()
+        self.group.refresh_from_db()
+        self.new_group.refresh_from_db()
+        self.assertEqual(self.author.stats.posts_count, author_posts)
+        self.assertEqual(self.group.posts_count, group_posts)
+        self.assertEqual(self.new_group.posts_count, new_group_posts)
+
+    def test_post_counters_follow_create_move_delete(self):
+        """Счетчики постов автора и групп обновляются при изменениях."""
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group)
+        Post.objects.create(text='Пост без группы', author=self.author)
+        self.assertCounters(2, 1, 0)
+        post.group = self.new_group
+        post.save()
+        self.assertCounters(2, 0, 1)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertCounters(2, 0, 1)
+        post.delete()
+        self.assertCounters(1, 0, 0)
+
+    def test_comment_counter_follows_create_delete(self):
+        """Счетчик комментариев поста обновляется при изменениях."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.author, text='Комментарий')
+        Comment.objects.create(
+            post=post, author=self.author, text='Комментарий')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@mock.patch('posts.thumbnails.generate_thumbnails')
+class ThumbnailQueueTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_thumbnails_queued_when_image_changes(self, generate):
+        """Миниатюры создаются при сохранении поста с новой картинкой."""
+        post = Post.objects.create(
+            text='Пост',
+            author=User.objects.create(username='author'),
+            image=SimpleUploadedFile(
+                name='small.gif', content=b'GIF89a', content_type='image/gif'),
+        )
+        generate.assert_called_once_with(post.image.name)
+        post.text = 'Новый текст'
+        post.save()
+        generate.assert_called_once()
+        Post.objects.create(text='Без картинки', author=post.author)
+        generate.assert_called_once()
@@ -0,0 +1,175 @@
+from http import HTTPStatus
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import User, Group, Post
+from posts.sitemaps import PostSitemap
+
+
+class SitemapTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Group.objects.create(title='Пустая', slug='empty', description='-')
+        User.objects.create(username='reader')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.user, group=cls.group)
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(PostSitemap, 'limit', 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        cache.clear()
+
+    def get_chunk(self, post):
+        return (post.pk - 1) // PostSitemap.limit + 1
+
+    def get_section(self, section, page=1):
+        return self.client.get(
+            reverse('posts:sitemap_section', args=(section,)), {'p': page})
+
+    def test_index_lists_chunks_of_sections(self):
+        """Индекс карты сайта ссылается на все части разделов."""
+        response = self.client.get(reverse('posts:sitemap'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        url = 'http://testserver' + reverse(
+            'posts:sitemap_section', args=('posts',))
+        for page in range(2, self.get_chunk(self.posts[-1]) + 1):
+            self.assertContains(response, f'{url}?p={page}')
+        self.assertNotContains(
+            response, f'{url}?p={self.get_chunk(self.posts[-1]) + 1}')
+        for section in ('groups', 'profiles'):
+            self.assertContains(response, reverse(
+                'posts:sitemap_section', args=(section,)))
+
+    def test_sections_list_pages(self):
+        """Разделы перечисляют посты, группы и профили с постами."""
+        post = self.posts[0]
+        response = self.get_section('posts', self.get_chunk(post))
+        self.assertContains(response, post.get_absolute_url())
+        self.assertContains(response, '<lastmod>')
+        response = self.get_section('groups')
+        self.assertContains(
+            response, reverse('posts:group_list', args=('group',)))
+        self.assertNotContains(
+            response, reverse('posts:group_list', args=('empty',)))
+        response = self.get_section('profiles')
+        self.assertContains(
+            response, reverse('posts:profile', args=('author',)))
+        self.assertNotContains(
+            response, reverse('posts:profile', args=('reader',)))
+
+    def test_invalid_chunks_return_404(self):
+        """Несуществующие части и разделы карты сайта отдают 404."""
+        last_chunk = self.get_chunk(self.posts[-1])
+        for section, page in (('posts', last_chunk + 1), ('posts', 'x'),
+                              ('unknown', 1)):
+            with self.subTest(section=section, page=page):
+                response = self.get_section(section, page)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_new_posts_keep_older_chunks_cached(self):
+        """Новый пост меняет только последнюю часть карты сайта."""
+        first_chunk = self.get_chunk(self.posts[0])
+        self.get_section('posts', first_chunk)
+        post = Post.objects.create(text='Новый пост', author=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_section('posts', first_chunk)
+        self.assertEqual(len(queries), 0)
+        self.assertNotContains(response, post.get_absolute_url())
+        response = self.get_section('posts', self.get_chunk(post))
+        self.assertContains(response, post.get_absolute_url())
+        self.posts[0].text = 'Исправленный пост'
+        self.posts[0].save()
+        with CaptureQueriesContext(connection) as queries:
+            self.get_section('posts', first_chunk)
+        self.assertGreater(len(queries), 0)
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.other = User.objects.create(username='other')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание группы')
+        cls.group_post = Post.objects.create(
+            text='Пост в группе', author=cls.author, group=cls.group)
+        cls.author_post = Post.objects.create(
+            text='Пост без группы', author=cls.author)
+        cls.other_post = Post.objects.create(
+            text='Пост другого автора', author=cls.other)
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_feeds_list_newest_posts(self):
+        """Ленты RSS и Atom содержат посты сайта, группы и автора."""
+        cases = {
+            'posts:feed_rss': ((), [
+                self.other_post, self.author_post, self.group_post]),
+            'posts:feed_atom': ((), [
+                self.other_post, self.author_post, self.group_post]),
+            'posts:group_feed_rss': ((self.group.slug,), [self.group_post]),
+            'posts:group_feed_atom': ((self.group.slug,), [self.group_post]),
+            'posts:profile_feed_rss': ((self.author.username,), [
+                self.author_post, self.group_post]),
+            'posts:profile_feed_atom': ((self.author.username,), [
+                self.author_post, self.group_post]),
+        }
+        for url_name, (args, posts) in cases.items():
+            with self.subTest(url_name=url_name):
+                response = self.client.get(reverse(url_name, args=args))
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                content_type = 'atom' if url_name.endswith('atom') else 'rss'
+                self.assertIn(content_type, response['Content-Type'])
+                content = response.content.decode()
+                positions = [content.find(post.text) for post in posts]
+                self.assertNotIn(-1, positions)
+                self.assertEqual(positions, sorted(positions))
+                for post in {
+                        self.group_post, self.author_post, self.other_post,
+                } - set(posts):
+                    self.assertNotIn(post.text, content)
+
+    def test_unknown_group_and_author_return_404(self):
+        """Ленты несуществующих группы и автора отдают 404."""
+        for url in (
+            reverse('posts:group_feed_rss', args=('unknown',)),
+            reverse('posts:profile_feed_atom', args=('unknown',)),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_feeds_answer_conditional_requests(self):
+        """Неизмененная лента отдается ответом 304 без запросов к базе."""
+        url = reverse('posts:group_feed_rss', args=(self.group.slug,))
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(len(queries), 0)
+        Post.objects.create(
+            text='Новый пост', author=self.other, group=self.group)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'Новый пост')
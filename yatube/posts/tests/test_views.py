@@ -1,15 +1,25 @@
 import shutil
 import tempfile
+from io import BytesIO
 from math import ceil
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client
+from django.db import connection, transaction
+from django.test import (
+    TestCase, Client, TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from PIL import Image
 
-from posts.models import User, Group, Post
+from core.cache import bump_versions
+from core.querybudget import page_size, query_budget
+from posts import feed, timeline
+from posts.models import User, AuthorStats, Comment, Follow, Group, Post
+from posts.views import IndexView, GroupView, ProfileView
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -66,17 +76,57 @@ class PostViewTests(TestCase):
         cache.clear()
 
     def test_index_page_view_cache(self):
-        """Проверка кэширования на главной странице."""
+        """Главная страница кэшируется до изменения постов."""
         response1 = self.client.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post_with_group.pk).update(
+            text='Изменено в обход сигналов')
+        response2 = self.client.get(reverse('posts:index'))
+        self.assertEqual(response1.content, response2.content)
         Post.objects.create(
             text='test',
             author=self.user,
         )
-        response2 = self.client.get(reverse('posts:index'))
-        self.assertEqual(response1.content, response2.content)
-        cache.clear()
         response3 = self.client.get(reverse('posts:index'))
         self.assertNotEqual(response2.content, response3.content)
+        self.assertContains(response3, 'test')
+
+    def test_pages_cache_is_invalidated_by_writes(self):
+        """Изменения постов, комментариев и групп сбрасывают кэш страниц."""
+        post = self.post_with_group
+
+        def rename_group():
+            group = Group.objects.get(pk=self.main_group.pk)
+            group.title = 'Обновленная группа'
+            group.save()
+
+        urls_writes = {
+            reverse('posts:group_list', args=(self.main_group.slug,)):
+                rename_group,
+            reverse('posts:profile', args=(self.user.username,)):
+                lambda: Post.objects.create(
+                    text='Обновленный профиль', author=self.user),
+            reverse('posts:post_detail', args=(post.pk,)):
+                lambda: post.comments.create(
+                    author=self.user, text='Обновленный комментарий'),
+        }
+        for url, write in urls_writes.items():
+            with self.subTest(value=url):
+                response1 = self.client.get(url)
+                self.assertEqual(
+                    response1.content, self.client.get(url).content)
+                write()
+                response2 = self.client.get(url)
+                self.assertNotEqual(response1.content, response2.content)
+                self.assertContains(response2, 'Обновлен')
+
+    def test_anonymous_and_authorized_pages_cached_separately(self):
+        """Кэш страниц не смешивает гостя и пользователя."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        response = self.auth_client.get(url)
+        self.assertContains(response, self.user.username)
+        response = self.client.get(url)
+        self.assertNotContains(response, 'Новая запись')
 
     def test_pages_uses_correct_templates(self):
         """URL адреса используют соответствующий шаблон."""
@@ -199,6 +249,40 @@ class PostViewTests(TestCase):
         self.assertEqual(self.post_with_group.image.name,
                          response.context['post'].image.name)
 
+    def test_post_image_rendered_responsive(self):
+        """Картинка поста выводится в нескольких ширинах и форматах."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:post_detail', args=(self.post_with_group.pk,)),
+        ]
+        for url in urls:
+            with self.subTest(value=url):
+                response = self.client.get(url)
+                self.assertContains(response, '<source type="image/webp"')
+                self.assertContains(response, '.webp 480w')
+                self.assertContains(response, '.gif 960w')
+                self.assertNotContains(response, '.jpg 960w')
+                self.assertContains(response, 'width="960" height="339"')
+
+    def test_png_image_keeps_png_fallback(self):
+        """Запасная картинка сохраняет формат PNG-оригинала."""
+        content = BytesIO()
+        Image.new('RGBA', (2, 1)).save(content, 'PNG')
+        post = Post.objects.create(
+            text='Пост с прозрачной картинкой',
+            author=self.user,
+            image=SimpleUploadedFile(
+                name='small.png',
+                content=content.getvalue(),
+                content_type='image/png',
+            ),
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', args=(post.pk,)))
+        self.assertContains(response, '.webp 480w')
+        self.assertContains(response, '.png 960w')
+        self.assertNotContains(response, '.jpg 960w')
+
     def check_posts_are_same(self, post1, post2):
         fields_for_check = [
             'text',
@@ -261,3 +345,609 @@ class PaginatorViewTest(TestCase):
                         len(response.context['page_obj']),
                         posts_count_on_page,
                     )
+
+    def test_list_pages_queries_do_not_depend_on_page_length(self):
+        """Число запросов страницы списка не зависит от числа постов."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+        ]
+        for url in urls:
+            with self.subTest(value=url):
+                queries_per_page = []
+                for page in (1, 2):
+                    cache.clear()
+                    with CaptureQueriesContext(connection) as queries:
+                        self.client.get(url, {'page': page})
+                    queries_per_page.append(len(queries))
+                self.assertEqual(queries_per_page[0], queries_per_page[1])
+
+    def test_post_detail_loads_comment_authors_in_bulk(self):
+        """Авторы комментариев загружаются одним запросом."""
+        post = Post.objects.first()
+        url = reverse('posts:post_detail', args=(post.pk,))
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        for i in range(5):
+            commentator = User.objects.create(username=f'commentator{i}')
+            post.comments.create(author=commentator, text='Комментарий')
+        cache.clear()
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['comments']), 5)
+
+
+class CursorPaginatorViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='user')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            description='Для постов',
+        )
+        cls.posts_count_for_test = 23
+        for i in range(cls.posts_count_for_test):
+            Post.objects.create(
+                text='Длинный текст поста ' + str(i),
+                group=cls.group,
+                author=cls.user,
+            )
+        cls.views_urls = {
+            IndexView: reverse('posts:index'),
+            GroupView: reverse('posts:group_list', args=(cls.group.slug,)),
+            ProfileView: reverse('posts:profile', args=(cls.user.username,)),
+        }
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_cursor_pages_walk_forward_and_back(self):
+        """Курсорная пагинация проходит все посты вперед и назад."""
+        expected = list(
+            Post.objects.order_by('-created', '-pk').values_list(
+                'pk', flat=True)
+        )
+        for view, url in self.views_urls.items():
+            with self.subTest(value=url), \
+                    mock.patch.object(view, 'cursor_pagination', True):
+                pages = []
+                cursor = None
+                while True:
+                    cache.clear()
+                    response = self.client.get(
+                        url, {'cursor': cursor} if cursor else {})
+                    page = response.context['page_obj']
+                    self.assertTrue(page.is_cursor)
+                    pages.append([post.pk for post in page])
+                    if not page.has_next():
+                        break
+                    cursor = page.next_cursor
+                self.assertEqual(sum(pages, []), expected)
+                self.assertEqual(
+                    [len(ids) for ids in pages],
+                    [settings.POSTS_PER_PAGE] * 2 + [3],
+                )
+                cache.clear()
+                response = self.client.get(
+                    url, {'cursor': page.previous_cursor})
+                self.assertEqual(
+                    [post.pk for post in response.context['page_obj']],
+                    pages[-2],
+                )
+
+    def test_cursor_pagination_skips_count(self):
+        """Курсорная пагинация не выполняет COUNT(*)."""
+        with mock.patch.object(IndexView, 'cursor_pagination', True), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        for query in queries:
+            self.assertNotIn('COUNT(', query['sql'])
+        self.assertContains(response, '?cursor=')
+        self.assertNotContains(response, '?page=')
+
+    def test_invalid_cursor_returns_404(self):
+        """Некорректный курсор приводит к ошибке 404."""
+        # Второй курсор содержит некорректную дату.
+        for cursor in ('broken', 'eyJ2IjogWyJ4IiwgIjEiXX0'):
+            with mock.patch.object(IndexView, 'cursor_pagination', True):
+                response = self.client.get(
+                    reverse('posts:index'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+        cls.comments_count_for_test = settings.COMMENTS_PER_PAGE + 5
+        for i in range(cls.comments_count_for_test):
+            commentator = User.objects.create(username=f'commentator{i}')
+            Comment.objects.create(
+                post=cls.post, author=commentator, text=f'Комментарий {i}')
+        cls.detail_url = reverse('posts:post_detail', args=(cls.post.pk,))
+        cls.comments_url = reverse('posts:comments', args=(cls.post.pk,))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_first_page_is_embedded(self):
+        """Страница поста содержит только первую страницу комментариев."""
+        response = self.client.get(self.detail_url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), settings.COMMENTS_PER_PAGE)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        page = response.context['comments_page']
+        self.assertContains(
+            response,
+            f'{self.comments_url}?order=oldest&amp;cursor={page.next_cursor}')
+
+    def test_next_page_is_a_fragment(self):
+        """Следующая страница отдается фрагментом HTML без ссылки дальше."""
+        page = self.client.get(self.detail_url).context['comments_page']
+        response = self.client.get(
+            self.comments_url, {'cursor': page.next_cursor})
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            [f'Комментарий {i}' for i in range(
+                settings.COMMENTS_PER_PAGE, self.comments_count_for_test)],
+        )
+        self.assertNotContains(response, 'data-comments-more')
+
+    def test_newest_first(self):
+        """С order=newest первыми идут новые комментарии."""
+        response = self.client.get(self.detail_url, {'order': 'newest'})
+        self.assertEqual(
+            response.context['comments'][0].text,
+            f'Комментарий {self.comments_count_for_test - 1}')
+        self.assertContains(response, '?order=newest&amp;cursor=')
+
+    def test_json_pages(self):
+        """API комментариев отдает страницы со ссылкой на следующую."""
+        url = reverse('posts:api_comments', args=(self.post.pk,))
+        data = self.client.get(url, {'order': 'newest'}).json()
+        self.assertEqual(len(data['results']), settings.COMMENTS_PER_PAGE)
+        data = self.client.get(data['next']).json()
+        self.assertEqual(data['results'][-1]['text'], 'Комментарий 0')
+        self.assertIsNone(data['next'])
+
+    def test_invalid_requests_return_404(self):
+        """Некорректный курсор и несуществующий пост приводят к 404."""
+        responses = [
+            self.client.get(self.comments_url, {'cursor': 'broken'}),
+            self.client.get(reverse('posts:comments', args=(0,))),
+        ]
+        for response in responses:
+            self.assertEqual(response.status_code, 404)
+
+
+class TimelineViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='user')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            description='Для постов',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-group',
+            description='Для перенесенных постов',
+        )
+        for i in range(13):
+            Post.objects.create(
+                text='Длинный текст поста ' + str(i),
+                group=cls.group,
+                author=cls.user,
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.auth_client = Client()
+        self.auth_client.force_login(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def get_page_ids(self, url, page=1):
+        bump_versions('posts', 'groups', f'group:{self.group.slug}',
+                      f'group:{self.other_group.slug}')
+        response = self.client.get(url, {'page': page})
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_warm_timeline_page_is_one_query(self):
+        """Страница с прогретой лентой загружается одним запросом."""
+        url = reverse('posts:index')
+        expected = list(Post.objects.order_by('-created', '-pk').values_list(
+            'pk', flat=True))
+        self.assertEqual(self.get_page_ids(url), expected[:10])
+        bump_versions('posts')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'page': 2})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT(', queries[0]['sql'])
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            expected[10:],
+        )
+
+    def test_created_and_moved_posts_update_timelines(self):
+        """Новые и перенесенные в другую группу посты попадают в ленты."""
+        group_url = reverse('posts:group_list', args=(self.group.slug,))
+        other_url = reverse('posts:group_list', args=(self.other_group.slug,))
+        for url in (reverse('posts:index'), group_url, other_url):
+            self.get_page_ids(url)
+        self.auth_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Новый пост', 'group': self.group.pk},
+        )
+        post = Post.objects.get(text='Новый пост')
+        self.assertEqual(self.get_page_ids(reverse('posts:index'))[0],
+                         post.pk)
+        self.assertEqual(self.get_page_ids(group_url)[0], post.pk)
+        self.auth_client.post(
+            reverse('posts:post_edit', args=(post.pk,)),
+            data={'text': 'Новый пост', 'group': self.other_group.pk},
+        )
+        self.assertNotIn(post.pk, self.get_page_ids(group_url))
+        self.assertEqual(self.get_page_ids(other_url), [post.pk])
+
+    def test_stale_timeline_falls_back_to_database(self):
+        """Лента со ссылкой на несуществующий пост перестраивается."""
+        url = reverse('posts:index')
+        expected = self.get_page_ids(url)
+        backend = timeline.get_backend()
+        backend.add(timeline.GLOBAL_TIMELINE, 10 ** 6, 10 ** 10)
+        self.assertEqual(self.get_page_ids(url), expected)
+        self.assertEqual(
+            backend.get_total(timeline.GLOBAL_TIMELINE), None)
+        self.assertEqual(self.get_page_ids(url), expected)
+        self.assertEqual(
+            backend.get_total(timeline.GLOBAL_TIMELINE),
+            Post.objects.count(),
+        )
+
+
+class TimelineCommitTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='user')
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_rebuild_before_commit_does_not_lose_post(self):
+        """Перестроение ленты до фиксации записи не теряет новый пост."""
+        backend = timeline.get_backend()
+        old = Post.objects.create(text='Старый пост', author=self.user)
+        with transaction.atomic():
+            post = Post.objects.create(text='Новый пост', author=self.user)
+            # Читатель перестроил ленту, не видя незафиксированный пост.
+            backend.rebuild(
+                timeline.GLOBAL_TIMELINE,
+                [(timeline.get_score(old), old.pk)], 1)
+        self.assertEqual(
+            backend.get_ids(timeline.GLOBAL_TIMELINE, 0, 10),
+            [post.pk, old.pk])
+
+
+class FollowViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='reader')
+        cls.author = User.objects.create(username='author')
+        cls.popular = User.objects.create(username='popular')
+        cls.stranger = User.objects.create(username='stranger')
+        for i, author in enumerate(
+                (cls.author, cls.popular, cls.stranger) * 7):
+            Post.objects.create(text=f'Пост {i} {author}', author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.auth_client = Client()
+        self.auth_client.force_login(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def follow(self, author, user=None):
+        client = self.auth_client
+        if user is not None:
+            client = Client()
+            client.force_login(user)
+        return client.post(
+            reverse('posts:profile_follow', args=(author.username,)))
+
+    def get_feed_ids(self, page=1):
+        response = self.auth_client.get(
+            reverse('posts:follow_index'), {'page': page})
+        return [post.pk for post in response.context['page_obj']]
+
+    def get_expected_ids(self, *authors):
+        return list(Post.objects.filter(author__in=authors).order_by(
+            '-created', '-pk').values_list('pk', flat=True))
+
+    def test_follow_and_unfollow(self):
+        """Подписка и отписка меняют число подписчиков автора."""
+        response = self.follow(self.author)
+        self.assertRedirects(
+            response, reverse('posts:profile', args=(self.author.username,)))
+        self.follow(self.author)
+        self.assertEqual(
+            Follow.objects.filter(user=self.user, author=self.author).count(),
+            1)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).followers_count, 1)
+        response = self.auth_client.get(
+            reverse('posts:profile', args=(self.author.username,)))
+        self.assertContains(response, 'Отписаться')
+        self.auth_client.post(
+            reverse('posts:profile_unfollow', args=(self.author.username,)))
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).followers_count, 0)
+
+    def test_follow_creates_missing_author_stats(self):
+        """Подписка создает отсутствующую статистику автора."""
+        AuthorStats.objects.filter(user=self.author).delete()
+        self.follow(self.author)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).followers_count, 1)
+
+    def test_cannot_follow_self_or_anonymously(self):
+        """Нельзя подписаться на себя и без входа на сайт."""
+        self.follow(self.user)
+        self.client.post(
+            reverse('posts:profile_follow', args=(self.author.username,)))
+        self.assertFalse(Follow.objects.exists())
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_feed_shows_followed_authors_only(self):
+        """Лента подписок содержит посты только избранных авторов."""
+        self.assertEqual(self.get_feed_ids(), [])
+        self.follow(self.author)
+        self.follow(self.popular)
+        expected = self.get_expected_ids(self.author, self.popular)
+        self.assertEqual(self.get_feed_ids(), expected[:10])
+        self.assertEqual(self.get_feed_ids(2), expected[10:])
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(self.get_feed_ids()[0], post.pk)
+        self.auth_client.post(
+            reverse('posts:profile_unfollow', args=(self.popular.username,)))
+        self.assertEqual(
+            self.get_feed_ids(),
+            self.get_expected_ids(self.author)[:10])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_feed_merges_popular_authors(self):
+        """Посты популярных авторов подмешиваются в ленту при чтении."""
+        self.follow(self.author)
+        self.follow(self.popular)
+        self.follow(self.popular, user=self.stranger)
+        self.assertTrue(feed.is_popular(
+            AuthorStats.objects.get(user=self.popular).followers_count))
+        new_posts = [
+            Post.objects.create(text='Новый пост', author=author)
+            for author in (self.author, self.popular)
+        ]
+        inbox = timeline.get_backend().get_ids(
+            feed.inbox_timeline(self.user.pk), 0, 10)
+        self.assertNotIn(new_posts[1].pk, inbox or [])
+        expected = self.get_expected_ids(self.author, self.popular)
+        self.assertEqual(self.get_feed_ids(), expected[:10])
+        self.assertEqual(
+            self.get_feed_ids()[:2], [post.pk for post in new_posts[::-1]])
+        self.assertEqual(self.get_feed_ids(2), expected[10:])
+
+    def test_feed_queries_do_not_depend_on_follows(self):
+        """Число запросов ленты не зависит от числа подписок."""
+        url = reverse('posts:follow_index')
+        counts = []
+        for author in (self.author, self.popular, self.stranger):
+            self.follow(author)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.auth_client.get(url)
+            counts.append(len(queries))
+        self.assertEqual(len(set(counts)), 1)
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='user')
+        cls.post_match = Post.objects.create(
+            text='Рецепт <b>борща</b> со сметаной', author=cls.user)
+        cls.comment_match = Post.objects.create(
+            text='Обед в столовой', author=cls.user)
+        Comment.objects.create(
+            post=cls.comment_match, author=cls.user, text='Там был борщ')
+        Post.objects.create(text='Салат без свеклы', author=cls.user)
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params})
+        return response, list(response.context['page_obj'])
+
+    def test_search_ranks_posts_and_comments(self):
+        """Поиск находит посты по тексту и комментариям, текст выше."""
+        response, hits = self.search('борщ')
+        self.assertEqual(
+            [hit.post for hit in hits],
+            [self.post_match, self.comment_match],
+        )
+        self.assertContains(response, '<mark>борща</mark>')
+        self.assertContains(response, '&lt;b&gt;')
+        self.assertEqual(self.search('суп')[1], [])
+        self.assertEqual(self.search('"*)(')[1], [])
+
+    def test_search_index_follows_edits(self):
+        """Индекс обновляется при изменении и удалении постов."""
+        post = Post.objects.create(text='Пельмени', author=self.user)
+        self.assertEqual([hit.post for hit in self.search('пельмени')[1]],
+                         [post])
+        post.text = 'Вареники'
+        post.save()
+        self.assertEqual(self.search('пельмени')[1], [])
+        post.delete()
+        self.assertEqual(self.search('вареники')[1], [])
+
+    def test_search_cursor_pages(self):
+        """Результаты поиска листаются курсором."""
+        with mock.patch('posts.views.SearchMixin.paginate_by', 1):
+            response, first = self.search('борщ')
+            cursor = response.context['page_obj'].next_cursor
+            response, second = self.search('борщ', cursor=cursor)
+            self.assertFalse(response.context['page_obj'].has_next())
+            self.assertEqual(
+                [hit.post for hit in first + second],
+                [self.post_match, self.comment_match],
+            )
+            response = self.client.get(
+                reverse('posts:search'), {'q': 'борщ', 'cursor': 'broken'})
+            self.assertEqual(response.status_code, 404)
+
+    def test_search_api(self):
+        """API поиска отдает посты с подсветкой."""
+        response = self.client.get(
+            reverse('posts:api_search'), {'q': 'борщ'})
+        data = response.json()
+        self.assertEqual(
+            [post['id'] for post in data['results']],
+            [self.post_match.pk, self.comment_match.pk],
+        )
+        self.assertIn('<mark>', data['results'][0]['snippet'])
+        self.assertIsNone(data['next'])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке ищет по тексту постов в поисковом индексе."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('admin:posts_post_changelist'), {'q': 'борщ'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.post_match])
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertIn('MATCH', sql)
+        self.assertNotIn('LIKE', sql)
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='user')
+        cls.post = Post.objects.create(
+            text='Исходный текст',
+            author=cls.user,
+        )
+
+    def setUp(self):
+        self.auth_client = Client()
+        self.auth_client.force_login(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_post_card_fragment_reused_until_edit(self):
+        """Карточка поста берется из кэша до редактирования поста."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text='Скрытый текст')
+        Post.objects.create(text='Новый пост', author=self.user)
+        response = self.client.get(url)
+        self.assertContains(response, 'Новый пост')
+        self.assertContains(response, 'Исходный текст')
+        self.auth_client.post(
+            reverse('posts:post_edit', args=(self.post.pk,)),
+            data={'text': 'Отредактированный текст'},
+        )
+        response = self.client.get(url)
+        self.assertContains(response, 'Отредактированный текст')
+        self.assertNotContains(response, 'Исходный текст')
+
+
+class QueryBudgetTest(TestCase):
+    page_sizes = (1, 10, 100)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create(username=f'author{i}') for i in range(5)]
+        for author in cls.authors[:-1]:
+            Follow.objects.create(user=cls.authors[-1], author=author)
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        for i in range(max(cls.page_sizes)):
+            author = cls.authors[i % len(cls.authors)]
+            post = Post.objects.create(
+                text=f'Пост {i}', author=author, group=cls.group)
+            Comment.objects.create(
+                post=post, author=cls.authors[-1], text='Комментарий')
+        cls.post = post
+
+    def setUp(self):
+        self.client.force_login(self.authors[-1])
+
+    def test_views_stay_within_query_budget(self):
+        """Число запросов страниц не зависит от числа постов на странице."""
+        urls = {
+            'posts:index': reverse('posts:index'),
+            'posts:group_list': reverse(
+                'posts:group_list', args=(self.group.slug,)),
+            'posts:profile': reverse(
+                'posts:profile', args=(self.authors[0].username,)),
+            'posts:api_posts': reverse('posts:api_posts'),
+            'posts:comments': reverse('posts:comments', args=(self.post.pk,)),
+            'posts:api_comments': reverse(
+                'posts:api_comments', args=(self.post.pk,)),
+            'posts:api_group': reverse(
+                'posts:api_group', args=(self.group.slug,)),
+            'posts:api_profile': reverse(
+                'posts:api_profile', args=(self.authors[0].username,)),
+            'posts:follow_index': reverse('posts:follow_index'),
+        }
+        for url_name, url in urls.items():
+            for size in self.page_sizes:
+                with self.subTest(url_name=url_name, size=size):
+                    cache.clear()
+                    with page_size(url, size), query_budget(url_name):
+                        response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    page = (response.context or {}).get('page_obj')
+                    if page is not None and not getattr(
+                            page, 'is_cursor', False):
+                        self.assertEqual(
+                            len(page), min(size, page.paginator.count))
+
+    def test_post_detail_stays_within_query_budget(self):
+        """Страницы поста укладываются в бюджет запросов."""
+        urls = {
+            'posts:post_detail': reverse(
+                'posts:post_detail', args=(self.post.pk,)),
+            'posts:post_edit': reverse(
+                'posts:post_edit', args=(self.post.pk,)),
+            'posts:post_create': reverse('posts:post_create'),
+            'posts:search': reverse('posts:search') + '?q=пост',
+            'posts:api_post': reverse('posts:api_post', args=(self.post.pk,)),
+            'posts:api_groups': reverse('posts:api_groups'),
+        }
+        for url_name, url in urls.items():
+            with self.subTest(url_name=url_name):
+                cache.clear()
+                with query_budget(url_name):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
@@ -0,0 +1,81 @@
+"""Generation of post image thumbnails outside the request.
+
+Templates build thumbnails with sorl's ``{% thumbnail %}`` tag, which
+creates a missing one while the page renders. Saving a post queues the
+geometries the templates use as a ``core.tasks`` task instead, so pages
+find them in the key-value store already.
+"""
+import os
+
+from sorl.thumbnail import default, get_thumbnail
+
+from core import perf
+
+# Post images are cropped to this size and served at the widths below, in
+# the modern formats and in a fallback for browsers that support none of
+# them. The fallback keeps the format of the original, so PNGs keep their
+# transparency; originals in other formats fall back to JPEG.
+POST_IMAGE_SIZE = (960, 339)
+POST_IMAGE_WIDTHS = (480, 720, 960)
+POST_IMAGE_FORMATS = ('WEBP',)
+POST_IMAGE_FALLBACK_FORMATS = {
+    '.jpg': 'JPEG',
+    '.jpeg': 'JPEG',
+    '.png': 'PNG',
+    '.gif': 'GIF',
+}
+POST_IMAGE_OPTIONS = {'crop': 'center', 'upscale': True}
+
+
+def get_geometry(width):
+    full_width, full_height = POST_IMAGE_SIZE
+    return f'{width}x{round(full_height * width / full_width)}'
+
+
+def get_fallback_format(name):
+    extension = os.path.splitext(name)[1].lower()
+    return POST_IMAGE_FALLBACK_FORMATS.get(extension, 'JPEG')
+
+
+def get_image_formats(name):
+    """Formats of the thumbnails of an image, the fallback last."""
+    return (*POST_IMAGE_FORMATS, get_fallback_format(name))
+
+
+def get_thumbnail_options(name):
+    """Geometries and options of every thumbnail of an image in templates."""
+    return [
+        (get_geometry(width), {**POST_IMAGE_OPTIONS, 'format': image_format})
+        for image_format in get_image_formats(name)
+        for width in POST_IMAGE_WIDTHS
+    ]
+
+
+def generate_thumbnails(name):
+    """Build the missing thumbnails of an image, return how many exist."""
+    count = 0
+    for geometry, options in get_thumbnail_options(name):
+        thumbnail = get_thumbnail(name, geometry, **options)
+        if not thumbnail.exists():
+            # The key-value store remembers a thumbnail whose file is gone.
+            default.kvstore.delete(thumbnail)
+            thumbnail = get_thumbnail(name, geometry, **options)
+        if thumbnail.exists():
+            count += 1
+    return count
+
+
+def get_image_sources(image):
+    """Thumbnails of a post image as ``{format: [(width, thumbnail)]}``."""
+    image_formats = get_image_formats(image.name)
+    perf.count('thumbnail_count', len(image_formats) * len(POST_IMAGE_WIDTHS))
+    with perf.measure('thumbnail_time'):
+        return {
+            image_format: [
+                (width, get_thumbnail(
+                    image, get_geometry(width),
+                    **POST_IMAGE_OPTIONS, format=image_format))
+                for width in POST_IMAGE_WIDTHS
+            ]
+            for image_format in image_formats
+        }
@@ -0,0 +1,258 @@
+"""Precomputed timelines of post ids for the index and group feeds.
+
+A timeline is a capped list of ``(score, post_id)`` pairs ordered newest
+first, where the score is the post creation time. List views read a page
+of ids from it and hydrate the posts with a single ``in_bulk`` query
+instead of running an ordered scan and a count over ``Post``.
+"""
+import bisect
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.module_loading import import_string
+
+from core import perf
+
+GLOBAL_TIMELINE = 'posts'
+
+
+def group_timeline(group_id):
+    return f'group:{group_id}'
+
+
+class BaseTimelineBackend:
+    """Interface of a timeline store."""
+
+    def __init__(self, max_length=1000):
+        self.max_length = max_length
+
+    def add(self, name, post_id, score):
+        """Insert a post, keeping the timeline ordered and capped."""
+        raise NotImplementedError
+
+    def remove(self, name, post_id):
+        raise NotImplementedError
+
+    def rebuild(self, name, entries, total):
+        """Replace the timeline with ``(score, post_id)`` pairs newest first.
+
+        ``total`` is the length of the full list, which may exceed the cap.
+        """
+        raise NotImplementedError
+
+    def delete(self, name):
+        raise NotImplementedError
+
+    def get_total(self, name):
+        """Length of the full list, or ``None`` if the timeline is unknown."""
+        raise NotImplementedError
+
+    def get_entries(self, name, offset, limit):
+        """``(score, post_id)`` pairs of a page, or ``None`` if not stored."""
+        raise NotImplementedError
+
+    def get_ids(self, name, offset, limit):
+        """Ids of a page, or ``None`` if the page is not stored."""
+        entries = self.get_entries(name, offset, limit)
+        if entries is None:
+            return None
+        return [post_id for _, post_id in entries]
+
+
+class CacheTimelineBackend(BaseTimelineBackend):
+    """Keeps timelines in a Django cache, the SQLite file one by default.
+
+    Updates are read-modify-write, so with a cache shared between processes
+    a concurrent update, or a rebuild from a snapshot taken before a post
+    was committed, may be lost. Readers only notice posts that vanished,
+    not missing ones: timelines expire after ``timeout`` seconds, which
+    bounds how long a post may stay out of them.
+    """
+
+    def __init__(self, max_length=1000, cache_alias='default',
+                 key_prefix='timeline', timeout=600):
+        super().__init__(max_length)
+        self.cache_alias = cache_alias
+        self.key_prefix = key_prefix
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def make_key(self, name):
+        return f'{self.key_prefix}:{name}'
+
+    def _get(self, name):
+        timeline = self.cache.get(self.make_key(name))
+        perf.count('cache_misses' if timeline is None else 'cache_hits')
+        return timeline
+
+    def _set(self, name, entries, total):
+        self.cache.set(
+            self.make_key(name), {'entries': entries, 'total': total},
+            self.timeout)
+
+    def add(self, name, post_id, score):
+        timeline = self._get(name)
+        if timeline is None:
+            return
+        # Entries are stored as negated pairs so bisect keeps them sorted
+        # newest first. An id may already be there with another score if
+        # the transaction that created it was rolled back and the id reused.
+        entries = [entry for entry in timeline['entries']
+                   if entry[1] != -post_id]
+        total = timeline['total']
+        if len(entries) == len(timeline['entries']):
+            total += 1
+        bisect.insort(entries, (-score, -post_id))
+        self._set(name, entries[:self.max_length], total)
+
+    def remove(self, name, post_id):
+        timeline = self._get(name)
+        if timeline is None:
+            return
+        entries = [entry for entry in timeline['entries']
+                   if entry[1] != -post_id]
+        if len(entries) == len(timeline['entries']):
+            # Not among the stored entries: it may be past the cap, the
+            # total can no longer be trusted.
+            self.delete(name)
+            return
+        self._set(name, entries, max(timeline['total'] - 1, 0))
+
+    def rebuild(self, name, entries, total):
+        self._set(
+            name,
+            [(-score, -post_id) for score, post_id in entries][
+                :self.max_length],
+            total,
+        )
+
+    def delete(self, name):
+        self.cache.delete(self.make_key(name))
+
+    def get_total(self, name):
+        timeline = self._get(name)
+        return None if timeline is None else timeline['total']
+
+    def get_entries(self, name, offset, limit):
+        timeline = self._get(name)
+        if timeline is None:
+            return None
+        entries = timeline['entries']
+        end = min(offset + limit, timeline['total'])
+        if end > len(entries):
+            return None
+        return [(-score, -post_id) for score, post_id in entries[offset:end]]
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    config = settings.POSTS_TIMELINE
+    backend_class = import_string(config['BACKEND'])
+    return backend_class(**config.get('OPTIONS', {}))
+
+
+def get_score(post):
+    return post.created.timestamp()
+
+
+def repeat_on_commit(func):
+    """Apply a timeline change now and again once the transaction commits.
+
+    A reader rebuilding the timeline before the commit does not see the
+    post and may overwrite the first change, as with ``bump_versions()``.
+    """
+    @wraps(func)
+    def wrapper(*args):
+        func(*args)
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(lambda: func(*args))
+    return wrapper
+
+
+@repeat_on_commit
+def add_post(post):
+    backend = get_backend()
+    backend.add(GLOBAL_TIMELINE, post.pk, get_score(post))
+    if post.group_id is not None:
+        backend.add(group_timeline(post.group_id), post.pk, get_score(post))
+
+
+@repeat_on_commit
+def move_post(post, previous_group_id):
+    backend = get_backend()
+    if previous_group_id is not None:
+        backend.remove(group_timeline(previous_group_id), post.pk)
+    if post.group_id is not None:
+        backend.add(group_timeline(post.group_id), post.pk, get_score(post))
+
+
+def remove_post(post):
+    backend = get_backend()
+    backend.remove(GLOBAL_TIMELINE, post.pk)
+    if post.group_id is not None:
+        backend.remove(group_timeline(post.group_id), post.pk)
+
+
+class TimelineSequence:
+    """Lazy post list for ``Paginator`` backed by a timeline.
+
+    Slicing reads the page ids from the timeline and hydrates them from
+    ``queryset`` in one query. Pages past the cap, unknown timelines and
+    timelines pointing at vanished posts fall back to the queryset. Posts
+    a replica does not have yet are left out of the page.
+    """
+
+    def __init__(self, name, queryset):
+        self.name = name
+        self.queryset = queryset
+        self.backend = get_backend()
+
+    def count(self):
+        total = self.backend.get_total(self.name)
+        if total is None:
+            total = self.rebuild()
+        return total
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        stop = index.stop if index.stop is not None else self.count()
+        ids = self.backend.get_ids(self.name, start, stop - start)
+        if ids is None and self.backend.get_total(self.name) is None:
+            self.rebuild()
+            ids = self.backend.get_ids(self.name, start, stop - start)
+        if ids is None:
+            return list(self.queryset[start:stop])
+        posts = self.queryset.in_bulk(ids)
+        if len(posts) != len(ids):
+            if self.queryset.db != DEFAULT_DB_ALIAS:
+                # Timelines are rebuilt from the primary, a lagging replica
+                # does not have the newest posts yet.
+                return [posts[post_id] for post_id in ids if post_id in posts]
+            self.backend.delete(self.name)
+            return list(self.queryset[start:stop])
+        return [posts[post_id] for post_id in ids]
+
+    def rebuild(self):
+        # Read from the primary: a timeline built from a lagging replica
+        # would miss recent posts until the next rebuild.
+        queryset = self.queryset.using(DEFAULT_DB_ALIAS).order_by(
+            '-created', '-pk')
+        entries = [
+            (created.timestamp(), pk) for pk, created in queryset.values_list(
+                'pk', 'created')[:self.backend.max_length]
+        ]
+        total = len(entries)
+        if total == self.backend.max_length:
+            total = queryset.count()
+        self.backend.rebuild(self.name, entries, total)
+        return total
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, sitemaps, syndication, views
 
 app_name = 'posts'
 
@@ -20,11 +20,31 @@ urlpatterns = [
         views.ProfileView.as_view(),
         name='profile',
     ),
+    path(
+        'profile/<str:username>/follow/',
+        views.ProfileFollowView.as_view(),
+        name='profile_follow',
+    ),
+    path(
+        'profile/<str:username>/unfollow/',
+        views.ProfileUnfollowView.as_view(),
+        name='profile_unfollow',
+    ),
+    path(
+        'follow/',
+        views.FollowIndexView.as_view(),
+        name='follow_index',
+    ),
     path(
         'posts/<int:post_id>/',
         views.PostDetailView.as_view(),
         name='post_detail',
     ),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.CommentListView.as_view(),
+        name='comments',
+    ),
     path(
         'posts/<int:post_id>/edit/',
         views.PostEditView.as_view(),
@@ -40,4 +60,102 @@ urlpatterns = [
         views.PostCreateView.as_view(),
         name='post_create'
     ),
+    path(
+        'search/',
+        views.SearchView.as_view(),
+        name='search',
+    ),
+    path(
+        'sitemap.xml',
+        sitemaps.SitemapIndexView.as_view(),
+        name='sitemap',
+    ),
+    path(
+        'sitemap-<str:section>.xml',
+        sitemaps.SitemapSectionView.as_view(),
+        name='sitemap_section',
+    ),
+    path(
+        'feed/rss/',
+        syndication.FeedView.as_view(
+            feed_class=syndication.PostsFeed,
+            cache_scopes=('posts',),
+        ),
+        name='feed_rss',
+    ),
+    path(
+        'feed/atom/',
+        syndication.FeedView.as_view(
+            feed_class=syndication.PostsAtomFeed,
+            cache_scopes=('posts',),
+        ),
+        name='feed_atom',
+    ),
+    path(
+        'group/<slug:slug>/feed/rss/',
+        syndication.FeedView.as_view(
+            feed_class=syndication.GroupPostsFeed,
+            cache_scopes=('group:{slug}',),
+        ),
+        name='group_feed_rss',
+    ),
+    path(
+        'group/<slug:slug>/feed/atom/',
+        syndication.FeedView.as_view(
+            feed_class=syndication.GroupPostsAtomFeed,
+            cache_scopes=('group:{slug}',),
+        ),
+        name='group_feed_atom',
+    ),
+    path(
+        'profile/<str:username>/feed/rss/',
+        syndication.FeedView.as_view(
+            feed_class=syndication.AuthorPostsFeed,
+            cache_scopes=('profile:{username}',),
+        ),
+        name='profile_feed_rss',
+    ),
+    path(
+        'profile/<str:username>/feed/atom/',
+        syndication.FeedView.as_view(
+            feed_class=syndication.AuthorPostsAtomFeed,
+            cache_scopes=('profile:{username}',),
+        ),
+        name='profile_feed_atom',
+    ),
+    path(
+        'api/v1/posts/',
+        api.PostListApiView.as_view(),
+        name='api_posts',
+    ),
+    path(
+        'api/v1/posts/<int:post_id>/',
+        api.PostApiView.as_view(),
+        name='api_post',
+    ),
+    path(
+        'api/v1/posts/<int:post_id>/comments/',
+        api.CommentListApiView.as_view(),
+        name='api_comments',
+    ),
+    path(
+        'api/v1/groups/',
+        api.GroupListApiView.as_view(),
+        name='api_groups',
+    ),
+    path(
+        'api/v1/groups/<slug:slug>/',
+        api.GroupApiView.as_view(),
+        name='api_group',
+    ),
+    path(
+        'api/v1/profiles/<str:username>/',
+        api.ProfileApiView.as_view(),
+        name='api_profile',
+    ),
+    path(
+        'api/v1/search/',
+        api.SearchApiView.as_view(),
+        name='api_search',
+    ),
 ]
@@ -1,55 +1,258 @@
 from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.views.generic.detail import DetailView
+from django.views.generic.base import TemplateView, View
+from django.views.generic.detail import DetailView, SingleObjectMixin
 from django.views.generic.edit import FormMixin, CreateView
 from django.views.generic import UpdateView
 from django.views.generic.list import ListView
-from django.views.decorators.cache import cache_page
+from django.core.cache import cache
+from django.http import Http404
 from django.shortcuts import redirect
 from django.urls import reverse_lazy
-from django.utils.decorators import method_decorator
 
-from core.views import DetailListView
+from core import perf
+from core.pagination import CursorPaginator, InvalidCursor
+from core.views import (
+    CursorPaginationMixin,
+    DetailListView,
+    ImmediateTransactionMixin,
+    VersionedCacheMixin,
+)
+from .feed import FeedSequence
 from .forms import PostForm, CommentForm
-from .models import User, Group, Post
+from .models import User, Comment, Follow, Group, Post
+from .search import search_posts
+from .timeline import GLOBAL_TIMELINE, TimelineSequence, group_timeline
 
 
-@method_decorator(cache_page(20, key_prefix='index_page'), name='dispatch')
-class IndexView(ListView):
+class PostListMixin:
+    """Loads the relations rendered by every post card in bulk."""
+
+    def get_queryset(self):
+        return super().get_queryset().for_listing()
+
+
+class TimelineMixin:
+    """Paginates over a precomputed timeline instead of the queryset.
+
+    Numbered pages take their ids from the timeline and hydrate them in one
+    query; cursor pagination keeps reading the queryset directly.
+    """
+
+    def get_timeline_name(self):
+        raise NotImplementedError
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        return super().get_paginator(
+            TimelineSequence(self.get_timeline_name(), queryset), per_page,
+            **kwargs)
+
+
+def get_post_author_id(post_id):
+    """Author of a post, cached forever as it never changes."""
+    key = f'post_author:{post_id}'
+    author_id = cache.get(key)
+    perf.count('cache_misses' if author_id is None else 'cache_hits')
+    if author_id is None:
+        author_id = Post.objects.filter(pk=post_id).values_list(
+            'author_id', flat=True).first()
+        if author_id is not None:
+            cache.set(key, author_id, None)
+    return author_id
+
+
+class IndexView(VersionedCacheMixin, PostListMixin, TimelineMixin,
+                CursorPaginationMixin, ListView):
     model = Post
     template_name = 'posts/index.html'
     paginate_by = settings.POSTS_PER_PAGE
 
+    def get_cache_scopes(self):
+        return ('posts', 'groups')
 
-class GroupView(DetailListView):
+    def get_timeline_name(self):
+        return GLOBAL_TIMELINE
+
+
+class GroupView(VersionedCacheMixin, PostListMixin, TimelineMixin,
+                DetailListView):
     template_name = 'posts/group_list.html'
     general_object_model = Group
     general_object_context_name = 'group'
     relate_objects_name = 'posts'
+    relate_objects_count_name = 'posts_count'
+
+    def get_cache_scopes(self):
+        return (f'group:{self.kwargs["slug"]}',)
 
+    def get_timeline_name(self):
+        return group_timeline(self.object.pk)
 
-class ProfileView(DetailListView):
+
+class ProfileView(VersionedCacheMixin, PostListMixin, DetailListView):
     template_name = 'posts/profile.html'
     slug_url_kwarg = 'username'
     slug_field = 'username'
     general_object_model = User
     general_object_context_name = 'author'
     relate_objects_name = 'posts'
+    relate_objects_count_name = 'stats.posts_count'
+
+    def get_cache_scopes(self):
+        return (f'profile:{self.kwargs["username"]}', 'groups')
+
+    def get_general_queryset(self):
+        return super().get_general_queryset().select_related('stats')
+
+    # Whether the page shows the follow button of the user.
+    show_following = True
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if not self.show_following:
+            return context
+        user = self.request.user
+        context['following'] = (
+            user.is_authenticated and user != self.object
+            and Follow.objects.filter(user=user, author=self.object).exists()
+        )
+        return context
+
+
+class FollowIndexView(LoginRequiredMixin, PostListMixin, ListView):
+    """Posts of the authors the user follows, see ``posts.feed``."""
+
+    model = Post
+    template_name = 'posts/follow.html'
+    paginate_by = settings.POSTS_PER_PAGE
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        return super().get_paginator(
+            FeedSequence(self.request.user.pk, queryset), per_page, **kwargs)
+
+
+class FollowMixin(LoginRequiredMixin, SingleObjectMixin):
+    """Changes the subscription of the user to the author of a profile."""
+
+    model = User
+    slug_url_kwarg = 'username'
+    slug_field = 'username'
+
+    def change_follow(self, author):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        return redirect('posts:profile', kwargs['username'])
+
+    def post(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        self.change_follow(self.object)
+        return redirect('posts:profile', self.object.username)
+
 
+class ProfileFollowView(ImmediateTransactionMixin, FollowMixin, View):
+    def change_follow(self, author):
+        if author != self.request.user:
+            Follow.objects.get_or_create(user=self.request.user, author=author)
 
-class PostDetailView(FormMixin, DetailView):
+
+class ProfileUnfollowView(ImmediateTransactionMixin, FollowMixin, View):
+    def change_follow(self, author):
+        for follow in Follow.objects.filter(
+                user=self.request.user, author=author):
+            # The signal handlers need the author, already loaded.
+            follow.author = author
+            follow.delete()
+
+
+class CommentsMixin:
+    """Comments of a post in cursor pages with their authors.
+
+    ``?order=newest`` lists them newest first, oldest first otherwise.
+    """
+
+    paginate_by = settings.COMMENTS_PER_PAGE
+    comment_orderings = {
+        'oldest': ('created', 'pk'),
+        'newest': ('-created', '-pk'),
+    }
+
+    def get_comments_order(self):
+        order = self.request.GET.get('order')
+        return order if order in self.comment_orderings else 'oldest'
+
+    @property
+    def cursor_ordering(self):
+        return self.comment_orderings[self.get_comments_order()]
+
+    def get_comments_queryset(self):
+        return Comment.objects.filter(
+            post_id=self.kwargs['post_id']).select_related('author')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['post_id'] = self.kwargs['post_id']
+        context['comments_order'] = self.get_comments_order()
+        return context
+
+
+class PostDetailView(VersionedCacheMixin, CommentsMixin, FormMixin,
+                     DetailView):
     form_class = CommentForm
     model = Post
     slug_url_kwarg = 'post_id'
     slug_field = 'pk'
+    # Only the first page is embedded, the next ones are loaded from
+    # CommentListView.
+    embed_comments = True
+
+    def get_cache_scopes(self):
+        post_id = self.kwargs['post_id']
+        return (
+            f'post:{post_id}',
+            f'author:{get_post_author_id(post_id)}',
+            'groups',
+        )
+
+    def get_queryset(self):
+        return Post.objects.for_detail()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['comments'] = self.get_object().comments.all()
+        if not self.embed_comments:
+            return context
+        paginator = CursorPaginator(
+            self.get_comments_queryset(), self.paginate_by,
+            self.cursor_ordering)
+        context['comments_page'] = paginator.page()
+        context['comments'] = context['comments_page'].object_list
         return context
 
 
-class PostCreateView(LoginRequiredMixin, CreateView):
+class CommentListView(VersionedCacheMixin, CommentsMixin,
+                      CursorPaginationMixin, ListView):
+    """Next page of comments as an HTML fragment for the post page."""
+
+    template_name = 'posts/includes/comments.html'
+    context_object_name = 'comments'
+    cursor_pagination = True
+
+    def get_cache_scopes(self):
+        return (f'post:{self.kwargs["post_id"]}',)
+
+    def get_queryset(self):
+        if get_post_author_id(self.kwargs['post_id']) is None:
+            raise Http404('Пост не найден')
+        return self.get_comments_queryset()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['comments_page'] = context['page_obj']
+        return context
+
+
+class PostCreateView(LoginRequiredMixin, ImmediateTransactionMixin,
+                     CreateView):
     template_name = 'posts/create_post.html'
     model = Post
     form_class = PostForm
@@ -62,22 +265,25 @@ class PostCreateView(LoginRequiredMixin, CreateView):
         return reverse_lazy('posts:profile', args=(self.request.user,))
 
 
-class PostEditView(LoginRequiredMixin, UpdateView):
+class PostEditView(LoginRequiredMixin, ImmediateTransactionMixin,
+                   UpdateView):
     template_name = 'posts/create_post.html'
     model = Post
     form_class = PostForm
     pk_url_kwarg = 'post_id'
 
     def get(self, request, *args, **kwargs):
-        if self.get_object().author != self.request.user:
-            return redirect(self.get_object())
-        return super().get(request, *args, **kwargs)
+        self.object = self.get_object()
+        if self.object.author_id != self.request.user.pk:
+            return redirect(self.object)
+        return self.render_to_response(self.get_context_data())
 
     def get_success_url(self):
-        return reverse_lazy('posts:post_detail', args=(self.get_object().pk,))
+        return reverse_lazy('posts:post_detail', args=(self.object.pk,))
 
 
-class AddCommentView(LoginRequiredMixin, CreateView):
+class AddCommentView(LoginRequiredMixin, ImmediateTransactionMixin,
+                     CreateView):
     model = Post
     form_class = CommentForm
     pk_url_kwarg = 'post_id'
@@ -91,4 +297,33 @@ class AddCommentView(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
     def get_success_url(self):
-        return reverse_lazy('posts:post_detail', args=(self.get_object().pk,))
+        return reverse_lazy('posts:post_detail', args=(self.object.post_id,))
+
+
+class SearchMixin:
+    """Runs the full-text search given by the ``q`` and ``cursor`` params."""
+
+    paginate_by = settings.POSTS_PER_PAGE
+
+    def get_search_query(self):
+        return self.request.GET.get('q', '').strip()
+
+    def get_search_page(self):
+        try:
+            return search_posts(
+                self.get_search_query(),
+                self.paginate_by,
+                self.request.GET.get('cursor'),
+            )
+        except InvalidCursor as e:
+            raise Http404(str(e))
+
+
+class SearchView(SearchMixin, TemplateView):
+    template_name = 'posts/search.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.get_search_query()
+        context['page_obj'] = self.get_search_page()
+        return context
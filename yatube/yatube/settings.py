@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.sitemaps',
     'posts.apps.PostsConfig',
     'users.apps.UsersConfig',
     'about.apps.AboutConfig',
@@ -50,11 +51,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.RateLimitMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -85,20 +89,77 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# core.backends.sqlite3 applies the pragmas to every connection: WAL lets
+# readers run alongside the writer and busy_timeout makes writers wait for
+# the lock instead of failing. Write views open their transactions with
+# BEGIN IMMEDIATE when immediate_transactions is on.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'OPTIONS': {
+            'timeout': 20,
+            'pragmas': {
+                'journal_mode': 'wal',
+                'synchronous': 'normal',
+                'busy_timeout': 20000,
+                'mmap_size': 256 * 1024 * 1024,
+                'cache_size': -20000,
+                'temp_store': 'memory',
+            },
+            'immediate_transactions': True,
+        },
     }
 }
 
+# Aliases of read-only copies of the default database, e.g. a second SQLite
+# file kept in sync by replication. Reads of REPLICA_READ_VIEWS go there.
+DATABASE_REPLICAS = []
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+REPLICA_READ_VIEWS = [
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:search',
+    'posts:api_posts',
+    'posts:api_post',
+    'posts:api_comments',
+    'posts:api_groups',
+    'posts:api_group',
+    'posts:api_profile',
+    'posts:api_search',
+    'about:author',
+    'about:tech',
+]
+
+# Seconds a session reads from the primary after it wrote something.
+REPLICA_PIN_TIMEOUT = 15
 
+# Pages rendered from a replica are cached only briefly, as it may lag
+# behind the version bumps made on the primary.
+REPLICA_PAGE_CACHE_TIMEOUT = 60
+
+
+# Shared by all worker processes through an SQLite file: pages, version
+# keys, timelines and sorl-thumbnail's key-value store. Least recently read
+# entries are evicted past MAX_ENTRIES or MAX_SIZE bytes.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.backends.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 512 * 1024 * 1024,
+        },
     }
 }
 
+# Every test run starts with empty caches; see core.runner.
+TEST_RUNNER = 'core.runner.DiscoverRunner'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -137,6 +198,12 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
+STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
+# collectstatic hashes the names and writes gzip and brotli variants, which
+# core.wsgi.StaticFilesApplication serves; see core.storage.
+STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+# Seconds static files without a hash in their name may be cached.
+STATIC_MAX_AGE = 60
 
 
 # Static files (CSS, JavaScript, Images)
@@ -159,3 +226,92 @@ LOGIN_REDIRECT_URL = 'posts:index'
 
 
 POSTS_PER_PAGE = 10
+
+# Comments embedded in a post page and loaded per "show more" click.
+COMMENTS_PER_PAGE = 20
+
+# Rendered pages are invalidated through version keys, so they can live
+# much longer than a plain time-based cache would allow.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 4
+
+# Posts per RSS/Atom feed, see posts.syndication.
+FEED_ITEMS = 20
+
+# Objects per sitemap file, by ranges of primary keys; see posts.sitemaps.
+# Smaller chunks than the 50000 allowed keep the cached files cheap to
+# render again.
+SITEMAP_CHUNK_SIZE = 5000
+
+# Capped lists of post ids backing the index and group feeds, stored in the
+# cache named by 'cache_alias' and rebuilt from the database after
+# 'timeout' seconds.
+POSTS_TIMELINE = {
+    'BACKEND': 'posts.timeline.CacheTimelineBackend',
+    'OPTIONS': {
+        'max_length': 1000,
+        'timeout': 10 * 60,
+    },
+}
+
+# Work done after a write (search indexing, thumbnails) is queued in the
+# core.Task table and run by `manage.py run_workers`; see core.tasks.
+# TASKS_EAGER runs it at once in the writing thread instead, as the tests do.
+TASKS_EAGER = False
+TASKS_WORKERS = 2
+TASKS_MAX_ATTEMPTS = 5
+# Seconds before the first retry, doubled on every further one.
+TASKS_RETRY_DELAY = 10
+TASKS_RETRY_MAX_DELAY = 60 * 60
+# Seconds after which a task claimed by a worker that died runs again.
+TASKS_LEASE = 5 * 60
+
+# Authors with more followers have their posts merged into the feeds when
+# read instead of pushed into every follower's inbox; see posts.feed.
+FEED_FANOUT_MAX_FOLLOWERS = 1000
+
+# Full-text index of posts and comments, an FTS5 table on SQLite.
+POSTS_SEARCH_BACKEND = 'posts.search.SQLiteSearchBackend'
+
+# Most requests a client may make to a view, as '<count>/<period>' with
+# the period in s, m, h or d, optionally multiplied ('100/5m'). Clients are
+# users, or addresses for anonymous users and entries with 'key': 'ip'.
+# Only RATE_LIMIT_METHODS are counted unless an entry lists 'methods'.
+# Refused requests get 429 with Retry-After; see core.ratelimit.
+RATE_LIMITS = {
+    'posts:post_create': {'rate': '10/m'},
+    'posts:post_edit': {'rate': '30/m'},
+    'posts:add_comment': {'rate': '30/m'},
+    'posts:profile_follow': {'rate': '60/m'},
+    'users:signup': {'rate': '5/h', 'key': 'ip'},
+    'users:login': {'rate': '10/m', 'key': 'ip'},
+}
+RATE_LIMIT_METHODS = ('POST',)
+# The client address; behind a reverse proxy name a header it sets, such
+# as 'HTTP_X_REAL_IP'.
+RATE_LIMIT_IP_HEADER = 'REMOTE_ADDR'
+
+# Most queries a GET request may run per URL name, checked by the tests at
+# several page sizes; see core.querybudget.
+QUERY_BUDGETS = {
+    'posts:index': 4,
+    'posts:group_list': 5,
+    'posts:profile': 5,
+    'posts:follow_index': 6,
+    'posts:post_detail': 5,
+    'posts:comments': 4,
+    'posts:search': 5,
+    'posts:post_create': 3,
+    'posts:post_edit': 4,
+    'posts:api_posts': 4,
+    'posts:api_post': 4,
+    'posts:api_comments': 5,
+    'posts:api_groups': 4,
+    'posts:api_group': 5,
+    'posts:api_profile': 4,
+}
+
+# Share of requests measured by core.middleware.PerformanceMiddleware, from
+# 0 (off) to 1 (every request). Histograms are served at admin/perf/.
+PERF_SAMPLE_RATE = 0
+# Report the metrics of sampled requests in the Server-Timing header.
+PERF_SERVER_TIMING = True
@@ -11,6 +11,9 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from core.wsgi import StaticFilesApplication
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
-application = get_wsgi_application()
+# Collected static files are answered before Django; see core.wsgi.
+application = StaticFilesApplication(get_wsgi_application())